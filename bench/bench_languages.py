@@ -0,0 +1,62 @@
+""" Compares language detection backends on a fixture corpus of Swedish/English ads
+
+Run from the repository root:
+
+    python -m bench.bench_languages [repeats]
+"""
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from src.util.languages import LangdetectBackend, NgramBackend
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "ads_sv_en.json")
+
+
+def first_ten_words(text: str) -> str:
+    return " ".join(text.split()[:10])
+
+
+def run(
+    name: str,
+    make: Callable[[], object],
+    corpus: List[Dict],
+    repeats: int,
+    sample: Callable[[str], str] = lambda t: t) -> Tuple[str, float, float, float]:
+    """Loads a backend and detects the corpus `repeats` times
+
+    Returns:
+        Tuple[str, float, float, float]: name, load seconds, accuracy and ads/second
+    """
+    start = time.perf_counter()
+    backend = make()
+    backend.load()
+    loaded = time.perf_counter() - start
+    texts: Sequence[str] = [sample(ad["text"]) for ad in corpus] * repeats
+    start = time.perf_counter()
+    detected = backend.detect_scored(texts)
+    elapsed = time.perf_counter() - start
+    correct = sum(lang == ad["language"] for (lang, _), ad in zip(detected, corpus))
+    return name, loaded, correct / len(corpus), len(texts) / elapsed
+
+
+def main() -> None:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open(FIXTURE, encoding="utf-8") as f:
+        corpus = json.load(f)
+    # langdetect profiles load once per process, so only the first run shows the load time
+    results = [
+        run("langdetect, first ten words", LangdetectBackend, corpus, repeats, first_ten_words),
+        run("langdetect, full text", LangdetectBackend, corpus, repeats),
+        run("ngram sv/en, full text", lambda: NgramBackend(["sv", "en"]), corpus, repeats),
+    ]
+    print(f"{len(corpus)} ads x {repeats}")
+    print(f"{'backend':<30}{'load s':>10}{'accuracy':>10}{'ads/s':>12}")
+    for name, loaded, accuracy, rate in results:
+        print(f"{name:<30}{loaded:>10.3f}{accuracy:>10.1%}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Compares parsing raw hits into validated `Ad`s and `CompactAd`s
+
+Run from the repository root:
+
+    python -m bench.bench_parse [ads]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from src.client.fake import make_ad
+from src.schemas import Ad, CompactAd, Interner
+
+
+def corpus(size: int) -> List[Dict]:
+    """Ads with realistic repetition: few occupations and employers, long descriptions
+    """
+    hits = []
+    for i in range(size):
+        hit = make_ad(i)
+        concept = {'concept_id': f"c{i % 20}", 'label': f"occupation {i % 20}",
+                   'legacy_ams_taxonomy_id': str(i % 20)}
+        for field in ('occupation', 'occupation_field', 'occupation_group', 'employment_type'):
+            hit[field] = dict(concept)
+        hit['employer'] = {'name': f"employer {i % 200}"}
+        hit['workplace_address'] = {'municipality': f"municipality {i % 50}"}
+        text = f"ad {i} " + "lorem ipsum dolor sit amet " * 80
+        hit['description'] = {'text': text, 'text_formatted': f"<p>{text}</p>"}
+        hits.append(hit)
+    return hits
+
+
+def run(name: str, parse: Callable[[Dict], object], hits: List[str]) -> Tuple[str, float, float]:
+    """Decodes and parses every hit, keeping the results alive
+
+    Decoding is measured too, so raw hits kept by `CompactAd` count against it
+
+    Returns:
+        Tuple[str, float, float]: name, ads/second and peak MiB allocated
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    ads = [parse(json.loads(hit)) for hit in hits]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ads
+    return name, len(hits) / elapsed, peak / 2 ** 20
+
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    hits = [json.dumps(hit) for hit in corpus(size)]
+    interner = Interner()
+    results = [
+        run("Ad", lambda hit: Ad(**hit), hits),
+        run("CompactAd", lambda hit: CompactAd(hit, interner=interner), hits),
+        run("CompactAd, drop formatted",
+            lambda hit: CompactAd(hit, interner=interner, drop_formatted=True), hits),
+    ]
+    print(f"{size} ads")
+    print(f"{'parser':<30}{'ads/s':>12}{'peak MiB':>10}")
+    for name, rate, peak in results:
+        print(f"{name:<30}{rate:>12.0f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+""" Benchmarks fetching, parsing, filtering and writing against a local fake API
+
+Run from the repository root:
+
+    python -m bench.bench_suite [--ads N] [--latency S] [--error-rate R] [--only NAME,...] [--update]
+
+Every benchmark reports ads/second, p50/p99 latency of its unit of work
+(a request, an ad, a batch) and peak traced memory. Results are compared
+with bench/baselines.json, the run fails if throughput drops or memory
+grows by more than the tolerance. `--update` stores the results as the
+new baselines.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Sequence
+
+import httpx
+
+from src.client import JobGetClient
+from src.client.limits import TokenBucket
+from src.client.fake import FakeJobTech, synthetic_ad
+from src.client.metrics import Metrics
+from src.schemas.schemas import Ad
+from src.util.languages import LanguageDetector
+from src.util.ndjson import NdjsonWriter
+from src.util.pipeline import email_stage, keyword_stage, language_stage
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+# shared machines are noisy, only flag clear regressions
+TOLERANCE = {"rate": 0.3, "peak_mib": 0.3}
+
+
+class Result(NamedTuple):
+    name: str
+    items: int
+    rate: float
+    p50_ms: float
+    p99_ms: float
+    peak_mib: float
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    """Records how long every request took
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+        self.latencies: List[float] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answers every request with the body the wrapped transport gave it the first time
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+        self.bodies: Dict[str, bytes] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = str(request.url)
+        if key not in self.bodies:
+            response = await self.transport.handle_async_request(request)
+            self.bodies[key] = await response.aread()
+        return httpx.Response(200, content=self.bodies[key])
+
+
+def measure(name: str, items: int, work: Callable[[], List[float]]) -> Result:
+    """Runs `work` once for timing and once under tracemalloc for memory
+
+    `work` returns the latency of every unit of work it did
+    """
+    with contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        latencies = work()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        work()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return Result(name, items, items / elapsed, percentile(latencies, 0.5) * 1000,
+                  percentile(latencies, 0.99) * 1000, peak / 2 ** 20)
+
+
+def timed(fn: Callable[[Any], Any], units: Iterable[Any]) -> List[float]:
+    latencies = []
+    for unit in units:
+        start = time.perf_counter()
+        fn(unit)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_exec(ads: int, latency: float, error_rate: float) -> Result:
+    def work() -> List[float]:
+        api = FakeJobTech(ads, latency=latency, error_rate=error_rate)
+        # ads are generated on first request, not part of the client's work
+        api.hits(0, ads)
+        transport = TimedTransport(api.transport())
+        async def run():
+            # the shared bucket paces to what the real API allows, measure the client instead
+            bucket = TokenBucket(rate=10_000, burst=10_000)
+            async with JobGetClient(url="http://fake/search", transport=transport, bucket=bucket) as client:
+                client.set_params({"q": "python"})
+                data, _, e = await client.exec()
+                if e is not None:
+                    raise e
+        asyncio.run(run())
+        return transport.latencies
+    return measure("exec", ads, work)
+
+
+def bench_parse(ads: int, compact: bool) -> Result:
+    """Parsing as `JobGetClient.iter_ads` does it, latencies are per page
+
+    Pages are replayed from memory after a first run, so the fake API's
+    own work isn't measured
+    """
+    transport = ReplayTransport(FakeJobTech(ads).transport())
+
+    def work() -> List[float]:
+        metrics = Metrics()
+        async def run():
+            bucket = TokenBucket(rate=10_000, burst=10_000)
+            async with JobGetClient(
+                    url="http://fake/search", transport=transport, bucket=bucket, metrics=metrics) as client:
+                async for _ in client.iter_ads({"q": "python"}, compact=compact):
+                    pass
+        asyncio.run(run())
+        return [stage.wall for stage in metrics.stages if stage.name == "parse"]
+    work()
+    return measure("parse compact" if compact else "parse", ads, work)
+
+
+def bench_stage(name: str, make: Callable[[], Any], ads: List[Ad]) -> Result:
+    batches = [ads[i:i + 1000] for i in range(0, len(ads), 1000)]
+
+    def work() -> List[float]:
+        stage = make()
+        return timed(lambda batch: asyncio.run(stage(list(batch))), batches)
+    return measure(f"stage {name}", len(ads), work)
+
+
+def bench_write(ads: List[Ad], compression: str) -> Result:
+    def work() -> List[float]:
+        with tempfile.TemporaryDirectory() as tmp:
+            with NdjsonWriter(os.path.join(tmp, "res.ndjson"), compression) as writer:
+                return timed(writer.write, ads)
+    return measure(f"write_results {compression}", len(ads), work)
+
+
+def run_all(args: argparse.Namespace) -> List[Result]:
+    only = set(args.only.split(",")) if args.only else None
+    wanted = lambda name: only is None or any(name.startswith(o) for o in only)
+    hits = [synthetic_ad(i) for i in range(args.ads)]
+    ads = [Ad(**hit) for hit in hits]
+    results = []
+    if wanted("exec"):
+        results.append(bench_exec(args.ads, args.latency, args.error_rate))
+    if wanted("parse"):
+        results.append(bench_parse(args.ads, compact=False))
+        results.append(bench_parse(args.ads, compact=True))
+    if wanted("stage"):
+        results.append(bench_stage("email", email_stage, ads))
+        results.append(bench_stage("keywords", lambda: keyword_stage(["utveckla", "engelska", "-provanställning"]), ads))
+        detector = LanguageDetector(workers=1, languages=["sv", "en"])
+        results.append(bench_stage("language", lambda: language_stage(["sv", "en"], detector), ads))
+    if wanted("write_results"):
+        results.append(bench_write(ads, "none"))
+        results.append(bench_write(ads, "gzip"))
+    return results
+
+
+def compare(results: List[Result], baselines: Dict[str, Dict[str, float]]) -> List[str]:
+    """Regressions of `results` against `baselines`, empty if none
+    """
+    regressions = []
+    for r in results:
+        base = baselines.get(r.name)
+        if base is None:
+            continue
+        if r.rate < base["rate"] * (1 - TOLERANCE["rate"]):
+            regressions.append(f"{r.name}: {r.rate:.0f} ads/s, baseline {base['rate']:.0f}")
+        if r.peak_mib > base["peak_mib"] * (1 + TOLERANCE["peak_mib"]) + 1:
+            regressions.append(f"{r.name}: {r.peak_mib:.1f} MiB, baseline {base['peak_mib']:.1f}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--ads", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake API request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--only", help="comma separated benchmark name prefixes")
+    parser.add_argument("--update", action="store_true", help="store results as baselines")
+    args = parser.parse_args()
+    results = run_all(args)
+    baselines: Dict[str, Dict[str, float]] = {}
+    if os.path.isfile(BASELINES):
+        with open(BASELINES, encoding="utf-8") as f:
+            baselines = json.load(f)
+    print(f"{'benchmark':<24}{'ads/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak MiB':>10}{'baseline':>10}")
+    for r in results:
+        base = baselines.get(r.name, {}).get("rate")
+        print(f"{r.name:<24}{r.rate:>10.0f}{r.p50_ms:>10.2f}{r.p99_ms:>10.2f}{r.peak_mib:>10.1f}"
+              f"{'-' if base is None else f'{base:.0f}':>10}")
+    if args.update:
+        baselines.update({r.name: {"rate": round(r.rate, 1), "peak_mib": round(r.peak_mib, 1)} for r in results})
+        with open(BASELINES, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated {BASELINES}")
+        return 0
+    regressions = compare(results, baselines)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,257 +1,347 @@
+from __future__ import annotations
+
 import getopt
 import json
 import math
 import sys
-import asyncio
+from contextlib import ExitStack
 from datetime import datetime
 from io import open
-from typing import Dict, List, Callable, Tuple, Union, Any
+from typing import TYPE_CHECKING, Dict, List, Callable, Tuple, Union, Any, Iterable
+
+from src.util.help import print_all_opts
+from src.util.ndjson import COMPRESSIONS
 
-from langdetect import detect
-from tqdm import tqdm
+# pydantic, httpx, tqdm and the filters are imported by the functions that use
+# them, so --help and runs that skip a stage don't pay for loading them
+# (see test_startup.py for the budget)
+if TYPE_CHECKING:
+    from src.schemas import schemas
+    from src.client import JobGetClient, SyncStore
+    from src.client.metrics import Metrics
+    from src.store import AdStore, DerivedCache
 
-from src.schemas import schemas
-from src.util import print_all_opts
-from src.client import JobGetClient
 
+async def filter_ads(
+    ads: Iterable[schemas.Ad],
+    args: Dict[str, Any],
+    derived: Union[DerivedCache, None] = None,
+    store: Union[AdStore, None] = None,
+    compression: str = "none",
+    metrics: Union[Metrics, None] = None) -> List[schemas.Ad]:
+    """Runs the email, keyword and language filters selected in args as one lazy pipeline
 
-def get_languages(
-    q: List[schemas.Ad],
-    langs: List[str]) -> List[schemas.Ad]:
-    """Gets the probable language of the ad and filters for the specified languages
+    Cheap selective filters run first, so languages are only detected for
+    ads that have an email and match the keywords. With --write, the ads
+    passing each filter are streamed to results/res_{filter}.ndjson
 
     Args:
-        q (List[schemas.Ad]): _description_
-        langs (List[str]): _description_
+        ads (Iterable[schemas.Ad]): Ads, can be a list or a stream
+        args (Dict[str, Any]): Parsed command line arguments
+        derived (Union[DerivedCache, None]): Cache of detected languages, emails and keyword matches
+        store (Union[AdStore, None]): Store updated with the detected languages
+        compression (str): Compression of the --write files
+        metrics (Union[Metrics, None]): Receives the time spent in every filter
 
     Returns:
-        List[schemas.Ad]: _description_
+        List[schemas.Ad]: Ads passing every filter
     """
-    res = []
-    totals: Dict[str, int] = {}
-    pbar= tqdm(total=len(q), desc=f"Detecting languages")
-    for i in range(len(q)):
-        pbar.set_description(f"Detecting languages ({i+1}/{len(q)})")
-        o= q[i]
-        first_ten_words = ' '.join(o.description.text.split()[:10])
-        lang = str(detect(first_ten_words))
-        if lang in langs:
-            res.append(o)
-            totals[lang] = totals.get(lang, 0) + 1
-        o.language = lang
-        res.append(o)
-        pbar.update(1)
-    pbar.close()
-    print(f"Found {len(res)} ads with language in {langs}")
-    print(f"Totals: {totals}")
+    from tqdm import tqdm
+    from src.util import LanguageDetector
+    from src.util.pipeline import Pipeline, email_stage, keyword_stage, language_stage
+    from src.util.ndjson import NdjsonWriter, SUFFIXES
+    pipeline = Pipeline(metrics=metrics)
+    with ExitStack() as stack:
+        if args.get('email'):
+            pipeline.add(email_stage(derived, bool(args.get('email_text'))))
+        if args.get('filter'):
+            pipeline.add(keyword_stage(
+                args['filter'], bool(args.get('whole_words')), derived, bool(args.get('fold_diacritics'))))
+        if args.get('lang'):
+            detector = stack.enter_context(LanguageDetector(
+                args.get('workers'), backend=args.get('detector', 'ngram'), languages=args['lang']))
+            stage = language_stage(args['lang'], detector, derived)
+            if store:
+                stage.sinks.append(store.upsert)
+            pipeline.add(stage)
+        if args.get('write'):
+            for stage in pipeline.stages:
+                writer = stack.enter_context(NdjsonWriter(
+                    f"results/res_{stage.name}{SUFFIXES[compression]}", compression))
+                stage.sinks.append(writer.write_all)
+        res = [ad async for ad in pipeline.run(tqdm(ads, desc="Filtering ads"))]
+    for name, seen, passed in pipeline.summary():
+        print(f"{name}: {passed} of {seen} ads passed")
+    if args.get('lang'):
+        totals: Dict[str, int] = {}
+        for ad in res:
+            totals[ad.language] = totals.get(ad.language, 0) + 1
+        print(f"Languages: {totals}")
     return res
 
-def get_emails(q: List[schemas.Ad]) -> List[schemas.Ad]:
-    """Filters for ads with emails
+def write_results(res: Iterable[schemas.Ad], filename: str, compression: str = "none"):
+    """Writes ads to an NDJSON file one line at a time, replacing the file once complete
 
     Args:
-        q (List[schemas.Ad]): List of ads
+        res (Iterable[schemas.Ad]): Ads to write, can be a list or a stream
+        filename (str): Filename to write to (without suffix), writes to results/res_{filename}.ndjson
+        compression (str): "none", "gzip" (.ndjson.gz) or "zstd" (.ndjson.zst)
+    """
+    from src.util.ndjson import NdjsonWriter, SUFFIXES
+    with NdjsonWriter(f"results/res_{filename}{SUFFIXES[compression]}", compression) as writer:
+        count = writer.write_all(res)
+    print(f"Wrote {count} ads to {writer.path}")
+
+async def get_query(
+    client: JobGetClient,
+    refresh: bool = False,
+    compact: bool = False) -> Tuple[List[schemas.Ad], Union[Exception, None]]:
+    """Gets query 100 ads at a time (due to limit), parsing each page as it arrives
+
+    Args:
+        client (JobGetClient): Client with params set
+        refresh (bool): Ignore cached pages and fetch everything again
+        compact (bool): Keep ads as CompactAd without formatted descriptions, validated only when needed
 
     Returns:
-        List[schemas.Ad]: Filtered List of ads
+        Tuple[List[schemas.Ad], Union[Exception, None]]: Returned ads parsed to pydantic models and exception if any
     """
-    res = []
-    pbar= tqdm(total=len(q), desc=f"Filtering for ads with email")
-    for i in range(len(q)):
-        pbar.set_description(f"Filtering for ads with email ({i+1}/{len(q)})")
-        o= q[i]
-        if not o.application_details.email and not o.employer.email:
+    from tqdm import tqdm
+    ads = []
+    pbar = tqdm(desc="Fetching ads")
+    try:
+        async for ad in client.iter_ads(refresh=refresh, compact=compact, drop_formatted=compact):
+            ads.append(ad)
             pbar.update(1)
-            continue
-        res.append(o)
-        pbar.update(1)
-    pbar.close()
-    print(f"Found {len(res)} ads with email")
-    return res
+    except Exception as e:
+        return ads, e
+    finally:
+        pbar.close()
+    if client.status.missing:
+        print(f"Could not fetch pages at offsets {client.status.missing}")
+    print_missing_shards(client)
+    return ads, None
 
-def write_json(res:List[schemas.Ad], filename:str):
-    """Writes List of ads to json file
+def print_missing_shards(client: JobGetClient):
+    """Prints the pages sharded queries couldn't fetch, per shard
 
     Args:
-        res (List[schemas.Ad]): Ads to write
-        filename (str): Filename to write to (without .json), writes to results/res_{filename}.json
+        client (JobGetClient): Client after a fetch
     """
-    print(f"Writing {len(res)} ads to file...")
-    res_json = [ad.dict() for ad in res]
-    with open(f"results/res_{filename}.json", "w+", encoding="utf-8") as results_file:
-        json.dump(res_json, results_file, indent=4, ensure_ascii=False)
+    for shard, offsets in client.status.missing_shards:
+        print(f"Could not fetch pages of shard {shard.dict(exclude_none=True, by_alias=True)} at offsets {offsets}")
 
-async def expected_total(client:JobGetClient, query:str, remote:bool) -> int:
-    """Sends empty query to get expected total
+async def get_batch(
+    client: JobGetClient,
+    queries: List[Dict[str, Any]],
+    refresh: bool = False,
+    compact: bool = False) -> Tuple[List[schemas.Ad], Union[Exception, None]]:
+    """Gets many queries at once, every ad only once with the queries that found it in ad.matched_queries
 
     Args:
-        query (str): Query to search for
-        remote (bool): Remote or not
+        client (JobGetClient): Client to fetch with
+        queries (List[Dict[str, Any]]): Parameters of every query
+        refresh (bool): Ignore cached pages and fetch everything again
+        compact (bool): Keep ads as CompactAd without formatted descriptions, validated only when needed
 
     Returns:
-        int: Number of results
+        Tuple[List[schemas.Ad], Union[Exception, None]]: Unique ads parsed to pydantic models and exception if any
     """
-    params = {"q": query, "limit": 0}
-    if remote:
-        params['remote'] = True
-    client.set_params(params)
-    await client.exec()
-    while True:
-        if client.response:
-            return client.response.total.value
-
-async def get_query(client: JobGetClient) -> Tuple[List[schemas.Ad], Union[Exception, None]]:
-    """Gets query 100 ads at a time (due to limit)
+    from tqdm import tqdm
+    ads = []
+    pbar = tqdm(desc=f"Fetching ads for {len(queries)} queries")
+    try:
+        async for ad in client.iter_batch(queries, refresh=refresh, compact=compact, drop_formatted=compact):
+            ads.append(ad)
+            pbar.update(1)
+    except Exception as e:
+        return ads, e
+    finally:
+        pbar.close()
+    totals: Dict[str, int] = {}
+    for ad in ads:
+        for q in ad.matched_queries:
+            totals[q] = totals.get(q, 0) + 1
+    print(f"Found {len(ads)} unique ads in {sum(totals.values())} hits: {totals}")
+    for q, missing in client.status.missing_by_query.items():
+        print(f"Could not fetch pages of {q} at offsets {missing}")
+    print_missing_shards(client)
+    return ads, None
+
+async def get_brief(
+    client: JobGetClient,
+    queries: List[Dict[str, Any]],
+    keywords: Union[List[str], None] = None,
+    whole_words: bool = False,
+    refresh: bool = False,
+    compact: bool = False,
+    fold_diacritics: bool = False) -> Tuple[List[schemas.Ad], Union[Exception, None]]:
+    """Gets brief hits first and full ads only for those they can't rule out
+
+    Brief hits carry the headline but no description, so only removed ads
+    and ads with an excluded (-word) keyword in the headline are dropped
+    before the survivors are fetched one by one, cached by id.
+    With several queries, ad.matched_queries is set like in a batch
 
     Args:
-        params (schemas.QueryParams): Params for query
+        client (JobGetClient): Client to fetch with
+        queries (List[Dict[str, Any]]): Parameters of every query
+        keywords (Union[List[str], None]): --filter keywords, only the excluded ones are used here
+        whole_words (bool): Only match whole words
+        refresh (bool): Ignore cached pages and ads and fetch again
+        compact (bool): Keep ads as CompactAd without formatted descriptions, validated only when needed
+        fold_diacritics (bool): Ignore diacritics when matching
 
     Returns:
-        List[schemas.Ad]: Returned queries parsed to pydantic models
+        Tuple[List[schemas.Ad], Union[Exception, None]]: Full ads and exception if any
     """
-    await client.exec()
-    while True:
-        if client.status.code == 1:
-            continue
-        if client.status.code == 2:
-            return client.response.hits, None
-        if client.status.code == 3:
-            return client.response.hits, client.errors[0]
-
-def parse_ads(ads: List[dict]) -> List[schemas.Ad]:
-    """Parses ads to pydantic models
+    from tqdm import tqdm
+    from src.util.keywords import KeywordMatcher
+    excluded = KeywordMatcher(
+        [k for k in keywords or [] if k.strip().startswith("-")], whole_words, fold_diacritics)
+    matched: Dict[str, List[str]] = {}
+    ads = []
+    seen = 0
+    try:
+        for params in queries:
+            async for hit in client.iter_brief(params, refresh=refresh):
+                seen += 1
+                if hit.get('removed') or excluded.match(hit.get('headline') or "") is None:
+                    continue
+                matched.setdefault(hit['id'], []).append(params['q'])
+            if client.status.missing:
+                print(f"Could not fetch brief pages of {params['q']} at offsets {client.status.missing}")
+            print_missing_shards(client)
+        print(f"{len(matched)} of {seen} brief hits kept, fetching them in full")
+        pbar = tqdm(total=len(matched), desc="Fetching ads")
+        try:
+            async for ad in client.hydrate(matched, refresh=refresh, compact=compact, drop_formatted=compact):
+                if len(queries) > 1:
+                    ad.matched_queries = matched[ad.id]
+                ads.append(ad)
+                pbar.update(1)
+        finally:
+            pbar.close()
+    except Exception as e:
+        return ads, e
+    if client.status.missing_ids:
+        print(f"Could not fetch {len(client.status.missing_ids)} ads: {client.status.missing_ids[:10]}")
+    return ads, None
+
+async def get_facets(
+    client: JobGetClient,
+    queries: List[Dict[str, Any]],
+    dimensions: List[str],
+    filename: str,
+    refresh: bool = False,
+    limit: int = 25):
+    """Prints hit counts per value of every dimension for every query, without fetching ads
+
+    Counts are also written to results/facets_{filename}.csv
+
+    Args:
+        client (JobGetClient): Client to fetch with
+        queries (List[Dict[str, Any]]): Parameters of every query
+        dimensions (List[str]): Facets to count, e.g. region or occupation-field, or ["all"]
+        filename (str): Name of the CSV file
+        refresh (bool): Ignore cached responses and fetch again
+        limit (int): Values per dimension, the most common first
+    """
+    import asyncio
+    import csv
+    import os
+    from src.schemas.schemas import FACET_DIMENSIONS
+    if dimensions == ["all"]:
+        dimensions = FACET_DIMENSIONS
+    try:
+        results = await asyncio.gather(*(
+            client.facets(dimensions, params, limit=limit, refresh=refresh) for params in queries))
+    except ValueError as e:
+        print(e)
+        return
+    os.makedirs("results", exist_ok=True)
+    path = f"results/facets_{filename}.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        out = csv.writer(f)
+        out.writerow(["query", "dimension", "term", "code", "count"])
+        for params, (total, counts, missing) in zip(queries, results):
+            print(f"\n{params['q']}: {total} ads")
+            for dimension, values in counts.items():
+                width = max((len(v.term) for v in values), default=0)
+                print(f"  {dimension}")
+                for v in values:
+                    print(f"    {v.term:<{width}} {v.count:>7}")
+                    out.writerow([params['q'], dimension, v.term, v.code, v.count])
+            if missing:
+                print(f"  Could not fetch {missing}")
+    print(f"Wrote counts to {path}")
+
+def read_queries(path: str) -> List[str]:
+    """Reads one query per line, skipping blank lines and # comments
 
     Args:
-        ads (List[dict]): unparsed ads
+        path (str): File to read
 
     Returns:
-        List[Ad]: parsed ads
+        List[str]: Queries in file order
     """
-    from pydantic.error_wrappers import ValidationError
-    pbar = tqdm(total=len(ads), desc="Parsing ads")
-    parsed_ads = []
-    for i in range(len(ads)):
-        pbar.set_description(f"Parsing ads ({i+1}/{len(ads)})")
-        try:
-            parsed_ads.append(schemas.Ad(**ads[i]))
-        except ValidationError:
-            print(f"{[i]}: {ads[i]['driving_license']}")
-        pbar.update(1)
-    pbar.close()
-    return parsed_ads
-
-def build_html(ads: List[schemas.Ad]) -> str:
-    """Builds html to display results
-    
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+async def get_new(client: JobGetClient, store: SyncStore) -> Tuple[List[schemas.Ad], Union[Exception, None]]:
+    """Gets only ads published since the last run of the same query
+
     Args:
-        ads (List[schemas.Ad]): List of ads
+        client (JobGetClient): Client with params set
+        store (SyncStore): Store keeping ads from earlier runs
+
+    Returns:
+        Tuple[List[schemas.Ad], Union[Exception, None]]: New ads and exception if any
     """
-    html = ""
-    for ad in ads:
-        html += f"""<p>{ad.headline}</p>
-        <h2>{ad.employer.name}</h2>
-        <p>{ad.description.text}</p>
-        <p>{ad.application_details.url}</p>
-        <p>{ad.language}</p>
-        <hr>
-        """
-    return html
-
-def send_emails(ads: List[schemas.Ad]):
+    try:
+        new, removed, stored = await client.sync(store)
+    except Exception as e:
+        return [], e
+    if client.status.missing or client.status.missing_shards:
+        print(f"Could not fetch pages at offsets {client.status.missing}, nothing was synced")
+        print_missing_shards(client)
+    print(f"Found {len(new)} new ads, {len(removed)} removed, {stored} stored")
+    return new, None
+
+def write_report(ads: Iterable[schemas.Ad], name: str):
+    """Writes a paginated, searchable HTML report one ad at a time
+
+    Args:
+        ads (Iterable[schemas.Ad]): Ads to include, can be a list or a stream
+        name (str): Report name, writes to results/report_{name}/index.html
+    """
+    from src.util.report import HtmlReport
+    with HtmlReport(f"results/report_{name}", title=f"Jobs: {name}") as report:
+        count = report.write_all(ads)
+    print(f"Wrote report of {count} ads in {report.pages} pages to results/report_{name}/index.html")
+
+async def send_emails(ads: List[schemas.Ad]):
     """Automatically sends emails to employers
     Attaches cv and cover letter in language of the ad
 
+    Sends through the SMTP server in the JOBGET_SMTP_* environment variables,
+    or appends the messages to results/emails.txt if no host is set.
+    Outcomes are logged to results/outbox.ndjson and ads already sent to are skipped
+
     Args:
         ads (List[schemas.Ad]): Ads to send emails to
     """
-    import json
-    import mimetypes
-    import os
-    import re
-    import smtplib
-    import sys
-    from email import encoders
-    from email.headerregistry import Address
-    from email.message import EmailMessage
-    from email.mime.application import MIMEApplication
-    from email.mime.audio import MIMEAudio
-    from email.mime.base import MIMEBase
-    from email.mime.image import MIMEImage
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.text import MIMEText
-    from email.utils import make_msgid
-
-    def send_email(params: schemas.EmailParams):
-        msg = MIMEMultipart()
-        msg['Subject'] = params.subject
-        msg['From'] = ''
-        msg['To'] = params.recipient
-        msg.attach(MIMEText(body, 'html'))
-        a = params.attachments
-        with open(a.CV, 'r+b') as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(a.CV))
-            part['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(a.CV)
-            msg.attach(part)
-        with open(a.CoverLetter, 'r+b') as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(a.CoverLetter))
-            part['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(a.CoverLetter)
-            msg.attach(part)
-        # s = smtplib.SMTP('localhost')
-        # s.send_message(msg)
-        # s.quit()
-        #append email to file
-        with open('results/emails.txt', 'a') as f:
-            f.write(f"{datetime.utcnow()} - {params.recipient}{os.linesep}")
-            f.write(msg.as_string())
-            f.write(f"{os.linesep}{os.linesep}")
-    for ad in ads:
-        email = ad.application_details.email if (
-            ad.application_details) else (
-                ad.employer.email) if ad.employer else None
-        if not email:
-            continue
-        subject = f"Jobb: {ad.headline}"
-        lang = ad.language
-        cv = f"att/CV_{lang}.pdf"
-        if not os.path.isfile(cv):
-            print(f"Missing CV for {lang}")
-            print("using english CV instead")
-            cv = "att/CV_en.pdf"
-        cover_letter = f"att/CoverLetter_{lang}.pdf"
-        if not os.path.isfile(cover_letter):
-            print(f"Missing cover letter for {lang}")
-            print("using english cover letter instead")
-            cover_letter = "att/CoverLetter_en.pdf"
-        body = f"""
-        <h1>{ad.headline}</h1>
-        <p>{ad.description.text if ad.description else None}</p>
-        <p><a href="{ad.webpage_url}">{ad.webpage_url}</a></p>
-        """
-        attachments = schemas.EmailAttachments(CV=cv, CoverLetter=cover_letter)
-        params = schemas.EmailParams(recipient=email, subject=subject, body=body, attachments=attachments)
-        send_email(params)
+    from tqdm import tqdm
+    from src.mail import Outbox
+    deliveries = await Outbox().send_all(tqdm(ads, desc="Sending applications"))
+    totals: Dict[str, int] = {}
+    for d in deliveries:
+        totals[d.status] = totals.get(d.status, 0) + 1
+        if d.status == 'failed':
+            print(f"Could not send to {d.recipient} for ad {d.ad_id}: {d.error}")
+    print(f"Applications: {totals}")
     
-def filter_by_keywords(
-    ads: List[schemas.Ad],
-    keywords: List[str]
-    ) -> List[schemas.Ad]:
-    """Filter query based on keywords
-
-    Args:
-        ads (List[schemas.Ad]): List of ads
-        keywords (List[str]): List of keywords
-
-    Returns:
-        List[schemas.Ad]: filtered List of ads
-    """
-    print("Filtering ads...")
-    filtered_ads = []
-    for ad in ads:
-        if any((keyword in ad.description.text) or (
-                keyword in ad.headline) for keyword in keywords):
-            filtered_ads.append(ad)
-    print(f"Found {len(filtered_ads)} ads")
-    return filtered_ads
 def parse_args() -> Dict[str, Any]:
     """Parse command line arguments
 
@@ -261,8 +351,10 @@ def parse_args() -> Dict[str, Any]:
     try:
         opts, args = getopt.getopt(
             sys.argv[1:],
-            "hq:l:f:ersw",
-            ["help", "query=", "lang=","filter=","email", "remote", "send", "write"])
+            "hq:l:f:erswj:",
+            ["help", "query=", "queries=", "lang=","filter=","email", "remote", "send", "write",
+             "no-cache", "refresh", "sync", "store", "whole-words", "workers=", "detector=", "compact", "compress=", "report", "metrics=", "facets=", "brief", "daemon=", "port=", "email-text",
+             "fold-diacritics"])
     except getopt.GetoptError as err:
         print(err)
         print_all_opts()
@@ -273,14 +365,24 @@ def parse_args() -> Dict[str, Any]:
             print_all_opts()
             sys.exit(1)
         elif o in ("-q", "--query"):
-            parsed['query'] = a
+            parsed.setdefault('queries', []).append(a)
+        elif o == "--queries":
+            parsed.setdefault('queries', []).extend(read_queries(a))
         elif o in ("-l", "--lang"):
             if ',' in a:
                 parsed['lang'] = a.split(',')
             else:
                 parsed['lang'] = [a]
+            from src.util.languages import unknown_languages
+            unknown = unknown_languages(parsed['lang'])
+            if unknown:
+                print(f"Unknown language {', '.join(unknown)}, use codes like sv or en")
+                sys.exit(2)
         elif o in ("-e", "--email"):
             parsed['email'] = True
+        elif o == "--email-text":
+            parsed['email'] = True
+            parsed['email_text'] = True
         elif o in ("-r", "--remote"):
             parsed['remote'] = True
         elif o in ("-s", "--send"):
@@ -292,53 +394,199 @@ def parse_args() -> Dict[str, Any]:
                 parsed['filter'] = [a]
         elif o in ("-w", "--write"):
             parsed['write'] = True
+        elif o == "--no-cache":
+            parsed['cache'] = False
+        elif o == "--refresh":
+            parsed['refresh'] = True
+        elif o == "--sync":
+            parsed['sync'] = True
+        elif o == "--store":
+            parsed['store'] = True
+        elif o == "--whole-words":
+            parsed['whole_words'] = True
+        elif o == "--fold-diacritics":
+            parsed['fold_diacritics'] = True
+        elif o in ("-j", "--workers"):
+            parsed['workers'] = int(a)
+        elif o == "--detector":
+            parsed['detector'] = a
+        elif o == "--compact":
+            parsed['compact'] = True
+        elif o == "--metrics":
+            parsed['metrics'] = a
+        elif o == "--brief":
+            parsed['brief'] = True
+        elif o == "--facets":
+            parsed['facets'] = a.split(',')
+        elif o == "--report":
+            parsed['report'] = True
+        elif o == "--daemon":
+            parsed['daemon'] = a
+        elif o == "--port":
+            parsed['port'] = int(a)
+        elif o == "--compress":
+            if a not in COMPRESSIONS:
+                print(f"Unknown compression {a}, use one of {COMPRESSIONS}")
+                sys.exit(2)
+            parsed['compress'] = a
         else:
             assert False, "unhandled option"
     return parsed
 
-async def main():
-    client = JobGetClient()
-    args = parse_args()
+async def main(args: Union[Dict[str, Any], None] = None):
+    from src.client import JobGetClient, ResponseCache
+    from src.client.metrics import Metrics, JsonLinesExporter
+    args = parse_args() if args is None else args
+    if args.get('daemon'):
+        await run_daemon(args)
+        return
+    cache = ResponseCache() if args.get('cache', True) else None
+    metrics = Metrics()
+    path = args.get('metrics')
+    exporter = JsonLinesExporter(path) if path and not path.endswith(".prom") else None
+    if exporter:
+        metrics.hooks.append(exporter)
+    try:
+        async with JobGetClient(cache=cache, metrics=metrics) as client:
+            await run(client, args)
+    finally:
+        if cache:
+            cache.close()
+        if exporter:
+            exporter.close()
+        elif path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(metrics.prometheus())
+
+async def run_daemon(args: Dict[str, Any]):
+    """Runs the saved queries in args['daemon'] on their intervals until interrupted
+
+    Every run goes through `run` with one client kept open, so connections,
+    caches and the rate limit carry over between runs. Other options on the
+    command line apply to every saved query unless it sets them itself.
+    Serves the daemon's health and status on 127.0.0.1:args['port'].
+
+    Args:
+        args (Dict[str, Any]): Parsed arguments with 'daemon' set
+    """
+    from src.client import JobGetClient, ResponseCache
+    from src.client.daemon import Daemon, load_queries
+    from src.store import AdStore, DerivedCache
+    defaults = {k: v for k, v in args.items() if k not in ('daemon', 'port', 'queries', 'metrics')}
+    queries = load_queries(args['daemon'])
+    with ExitStack() as stack:
+        # opened once, runs on every tick would otherwise leave a connection each
+        cache = derived = store = None
+        if args.get('cache', True):
+            cache = ResponseCache()
+            stack.callback(cache.close)
+        if any({**defaults, **q.args}.get('cache', True) for q in queries):
+            derived = DerivedCache()
+            stack.callback(derived.close)
+        if any({**defaults, **q.args}.get('store') for q in queries):
+            store = AdStore()
+            stack.callback(store.close)
+        # no Metrics, it keeps every event and would grow for as long as the daemon runs,
+        # history keeps the newest entries in memory and older ones in results/history.ndjson
+        async with JobGetClient(cache=cache, history_path="results/history.ndjson") as client:
+            daemon = Daemon(queries, lambda saved: run(client, {**defaults, **saved}, derived, store))
+            server = await daemon.serve(port=args.get('port', 8765))
+            port = server.sockets[0].getsockname()[1]
+            print(f"Running {len(daemon.queries)} saved queries, status at http://127.0.0.1:{port}/status")
+            try:
+                await daemon.run_forever()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+async def run(
+    client: JobGetClient,
+    args: Dict[str, Any],
+    derived: Union[DerivedCache, None] = None,
+    store: Union[AdStore, None] = None):
+    """Fetches, filters and writes the queries in args
+
+    Args:
+        client (JobGetClient): Client to fetch with
+        args (Dict[str, Any]): Parsed command line arguments
+        derived (Union[DerivedCache, None]): Cache kept open by the caller, e.g. the daemon,
+            opened and closed by this run if None and caching is on
+        store (Union[AdStore, None]): Ad store kept open by the caller for --store,
+            opened and closed by this run if None
+    """
+    from src.client import SyncStore
+    from src.store import AdStore, DerivedCache
     client.set_args(args)
-    query = args.get('query')
+    queries = list(dict.fromkeys(args.get('queries') or []))
     lang = args.get('lang')
     email = args.get('email')
     remote = args.get('remote')
     send = args.get('send')
-    write = args.get('write')
-    if not query:
+    keywords = args.get('filter')
+    compression = args.get('compress', 'none')
+    if not queries:
         raise ValueError("Query is required")
-    await expected_total(client, query, remote)
-    #params=args minus send, write
-    response, err = await get_query(client)
+    if len(queries) > 1 and args.get('sync'):
+        raise ValueError("--sync takes a single query")
+    if args.get('sync') and args.get('brief'):
+        raise ValueError("--sync and --brief can't be combined")
+    query = queries[0] if len(queries) == 1 else "batch"
+    params = [{"q": q, **({'remote': True} if remote else {})} for q in queries]
+    client.set_params(params[0])
+    if args.get('facets'):
+        await get_facets(client, params, args['facets'], query, refresh=bool(args.get('refresh')))
+        if client.metrics:
+            print(client.metrics.summary())
+        print("Done!")
+        return
+    if args.get('sync'):
+        response, err = await get_new(client, SyncStore())
+    elif args.get('brief'):
+        response, err = await get_brief(
+            client, params, keywords, bool(args.get('whole_words')),
+            refresh=bool(args.get('refresh')), compact=bool(args.get('compact')),
+            fold_diacritics=bool(args.get('fold_diacritics')))
+    elif len(params) > 1:
+        response, err = await get_batch(
+            client, params, refresh=bool(args.get('refresh')), compact=bool(args.get('compact')))
+    else:
+        response, err = await get_query(
+            client, refresh=bool(args.get('refresh')), compact=bool(args.get('compact')))
     if err is not None:
         print(str(err))
-    if lang:
-        if write:
-            await client.detect_languages(lang)
-            write_json(client.response.hits, "languages")
-        else:
-            await client.detect_languages(response, lang)
-    if email:
-        await client.filter_emails()
-        if write:
-            if client.status.code == 2:
-                write_json(client.result, "emails")
-            elif client.result:
-                write_json(client.result, "emails")
-                err = client.errors[0]
-                if err:
-                    print(f"Error: {err}")
-                print(f"Status: {client.status.dict()}")
-        else:
-            if client.result:
-                response = client.result
-            else:
-                print(f"Status: {client.status.dict()}")
-    if send:
-        send_emails(response)
-    write_json(response, f"{query}_final")
+    with ExitStack() as stack:
+        if not args.get('cache', True):
+            derived = None
+        elif derived is None:
+            derived = DerivedCache()
+            stack.callback(derived.close)
+        if not args.get('store'):
+            store = None
+        elif store is None:
+            store = AdStore()
+            stack.callback(store.close)
+        if store:
+            store.upsert(response)
+        if lang or email or keywords:
+            response = await filter_ads(response, args, derived, store, compression, client.metrics)
+        if send:
+            await send_emails(response)
+        write_results(response, f"{query}_final", compression)
+        if args.get('report'):
+            write_report(response, query)
+        if derived:
+            derived.evict()
+    if client.metrics:
+        print(client.metrics.summary())
     print("Done!")
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    # --help and bad options exit here, before asyncio is imported
+    args = parse_args()
+    import asyncio
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        # the daemon's state is saved after every run, stopping it is normal
+        if not args.get('daemon'):
+            raise
\ No newline at end of file
@@ -1 +1,16 @@
-from .jobget import JobGetClient
\ No newline at end of file
+from typing import TYPE_CHECKING
+from ..util.lazy import lazy_exports
+
+__all__ = ["JobGetClient", "ResponseCache", "SyncStore", "Daemon"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "JobGetClient": ".jobget",
+    "ResponseCache": ".cache",
+    "SyncStore": ".sync",
+    "Daemon": ".daemon",
+})
+
+if TYPE_CHECKING:
+    from .jobget import JobGetClient
+    from .cache import ResponseCache
+    from .sync import SyncStore
+    from .daemon import Daemon
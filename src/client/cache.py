@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from ..schemas.schemas import *
+from typing import Dict, Any, Union
+
+
+class ResponseCache():
+    """Persistent cache for raw API pages with TTL and LRU eviction.
+
+        ...
+
+        Pages are stored zlib compressed in a SQLite file, keyed by a hash of
+        the endpoint and the normalized search parameters (offset and limit included).
+
+        Attributes
+        ----------
+        path : `str`
+            path to the SQLite file
+        ttl : `float`
+            seconds before an entry is considered stale
+        max_size : `int`
+            maximum total size in bytes of stored pages,
+            least recently used pages are evicted first
+        flush_every : `int`
+            pages hit whose access times are kept in memory before they're written
+
+        Methods
+        ----------
+        key : `(url: str, params: SearchParams) => str`
+            canonical key for a request
+        ad_key : `(url: str, id: str) => str`
+            key for a single ad fetched by id
+        get : `(key: str) => dict | None`
+            cached page if present and fresh
+        set : `(key: str, page: dict) => None`
+            store page and evict if over size
+        clear : `() => None`
+            remove all entries
+        flush : `() => None`
+            write the access times of recent hits
+        close : `() => None`
+            flush and close the file
+    """
+    def __init__(
+            self,
+            path: str = "results/cache.sqlite", *,
+            ttl: float = 3600,
+            max_size: int = 256 * 1024 * 1024,
+            flush_every: int = 100
+            ) -> None:
+        """Opens or creates the cache file
+
+        Parameters
+        ----------
+        path : `str`
+            path to the SQLite file, parent directories are created
+        ttl : `float`
+            seconds before an entry is considered stale, defaults to one hour
+        max_size : `int`
+            maximum total size in bytes, defaults to 256 MiB
+        flush_every : `int`
+            pages hit between writes of their access times, they're also
+            written before evicting and on close
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.flush_every = flush_every
+        # access times only order eviction, writing them on every hit would
+        # turn each read into a write transaction
+        self.__accessed: Dict[str, float] = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, created REAL, accessed REAL, size INTEGER, body BLOB)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+        self.db.commit()
+
+    @staticmethod
+    def key(url: str, params: SearchParams) -> str:
+        """Canonical key for a request .
+
+        Unset parameters are dropped and list values sorted,
+        so equivalent queries share a key
+
+        Parameters
+        ----------
+        url : `str`
+            API endpoint
+        params : `SearchParams`
+            parameters including offset and limit
+
+        Returns
+        ----------
+        key : `str`
+            hex digest of the normalized request
+        """
+        normalized = {k: sorted(v) if isinstance(v, list) else v
+                      for k, v in params.dict(exclude_none=True).items()}
+        canonical = json.dumps([url, normalized], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @staticmethod
+    def ad_key(url: str, id: str) -> str:
+        """Key for a single ad fetched by id .
+
+        Parameters
+        ----------
+        url : `str`
+            endpoint returning ads by id
+        id : `str`
+            id of the ad
+
+        Returns
+        ----------
+        key : `str`
+            hex digest of the endpoint and id
+        """
+        canonical = json.dumps([url, {"id": id}], separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> Union[Dict[str, Any], None]:
+        """Cached page if present and not older than `ttl` .
+
+        Parameters
+        ----------
+        key : `str`
+            key from `key`
+
+        Returns
+        ----------
+        page : `dict | None`
+            raw JSON page, None on a miss
+        """
+        now = time.time()
+        row = self.db.execute(
+            "SELECT created, body FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        created, body = row
+        if now - created > self.ttl:
+            self.__accessed.pop(key, None)
+            self.db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self.db.commit()
+            return None
+        self.__accessed[key] = now
+        if len(self.__accessed) >= self.flush_every:
+            self.flush()
+        return json.loads(zlib.decompress(body))
+
+    def set(self, key: str, page: Dict[str, Any]) -> None:
+        """Store a page and evict least recently used pages if over `max_size` .
+
+        Parameters
+        ----------
+        key : `str`
+            key from `key`
+        page : `dict`
+            raw JSON page
+        """
+        now = time.time()
+        body = zlib.compress(json.dumps(page, separators=(",", ":")).encode())
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (key, now, now, len(body), body))
+        self.__accessed.pop(key, None)
+        self.__touch()
+        self.__evict(now)
+        self.db.commit()
+
+    def clear(self) -> None:
+        """Remove all entries .
+        """
+        self.__accessed.clear()
+        self.db.execute("DELETE FROM pages")
+        self.db.commit()
+
+    def flush(self) -> None:
+        if self.__accessed:
+            self.__touch()
+            self.db.commit()
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    def __touch(self) -> None:
+        self.db.executemany(
+            "UPDATE pages SET accessed = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self.__accessed.items()])
+        self.__accessed.clear()
+
+    def __evict(self, now: float) -> None:
+        self.db.execute("DELETE FROM pages WHERE created < ?", (now - self.ttl,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in self.db.execute(
+                "SELECT key, size FROM pages ORDER BY accessed").fetchall():
+            self.db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_size:
+                break
@@ -0,0 +1,301 @@
+""" Runs saved queries on intervals in one long-lived process
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from ..schemas.schemas import *
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple, Union
+
+Runner = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def load_queries(path: str) -> List[SavedQuery]:
+    """Read saved queries from a JSON file .
+
+    Parameters
+    ----------
+    path : `str`
+        file holding a list of `SavedQuery` objects, e.g.
+        `[{"name": "python", "queries": ["python"], "interval": 3600, "args": {"lang": ["en"]}}]`
+
+    Returns
+    ----------
+    queries : `List[SavedQuery]`
+        saved queries in file order
+
+    Raises
+    ----------
+    ValueError
+        if two queries have the same name
+    """
+    with open(path, encoding="utf-8") as f:
+        queries = [SavedQuery(**q) for q in json.load(f)]
+    names = [q.name for q in queries]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Saved queries need unique names, found {duplicates} more than once")
+    return queries
+
+
+class Daemon():
+    """Runs saved queries on their intervals.
+
+        ...
+
+        `run` is called with the options of every run, the saved `args` with
+        `queries` and `refresh` added (responses are cached for an hour, a
+        query run more often would otherwise see the same pages). Queries due
+        within `coalesce` seconds of each other run in the same tick, and
+        those with the same `args` are merged into one batch, so an ad found
+        by several of them is fetched and processed once. The runs of a tick
+        go one after the other, they share one client. Every tick starts up
+        to `jitter` seconds late so daemons and cron jobs started together
+        don't hit the API at the same moment, while the schedule itself keeps
+        to the interval so coalesced queries stay together.
+
+        State is written to `state_path` after every run and read back on
+        start, a restarted daemon runs overdue queries once and then keeps
+        to their schedule.
+
+        Attributes
+        ----------
+        queries : `Dict[str, SavedQuery]`
+            saved queries by name
+        state : `Dict[str, JobState]`
+            last and next run of every saved query
+        running : `List[str]`
+            names of the queries running right now
+
+        Methods
+        ----------
+        run_forever : `() => Awaitable[None]`
+            run queries as they come due until `stop` is called
+        tick : `(now: datetime) => Awaitable[List[List[SavedQuery]]]`
+            run every query due at `now`, returns the groups that ran
+        groups : `(queries: Iterable[SavedQuery]) => List[List[SavedQuery]]`
+            queries that can run as one batch
+        health : `() => Tuple[bool, Dict[str, Any]]`
+            whether the daemon keeps up, and its status
+        status : `() => Dict[str, Any]`
+            queries, interval and state of every saved query
+        serve : `(host: str, port: int) => Awaitable[asyncio.AbstractServer]`
+            answer `GET /health` and `GET /status` with JSON
+        stop : `() => None`
+            stop after the current run
+    """
+    def __init__(
+            self,
+            queries: Iterable[SavedQuery],
+            run: Runner, *,
+            state_path: str = "results/daemon.json",
+            jitter: float = 30.0,
+            coalesce: float = 60.0,
+            seed: Union[int, None] = None
+            ) -> None:
+        """Inits the daemon and reads the state of earlier runs
+
+        Parameters
+        ----------
+        queries : `Iterable[SavedQuery]`
+            queries to run
+        run : `(args: Dict[str, Any]) => Awaitable[None]`
+            runs one query or batch, e.g. the CLI's `run` with a shared client
+        state_path : `str`
+            file keeping the state between restarts
+        jitter : `float`
+            most seconds a tick starts late
+        coalesce : `float`
+            queries due this many seconds apart run in the same tick
+        seed : `int | None`
+            seed of the jitter, for tests
+        """
+        self.queries: Dict[str, SavedQuery] = {q.name: q for q in queries}
+        self.run = run
+        self.state_path = state_path
+        self.jitter = jitter
+        self.coalesce = coalesce
+        self.running: List[str] = []
+        self.started = datetime.now()
+        self.__rng = random.Random(seed)
+        self.__stopped = asyncio.Event()
+        self.__alive = False
+        stored = self.__load()
+        self.state: Dict[str, JobState] = {
+            name: stored.get(name) or JobState(next_run=self.started) for name in self.queries}
+
+    async def run_forever(self) -> None:
+        self.__alive = True
+        try:
+            while not self.__stopped.is_set():
+                if self.state:
+                    due = min(s.next_run for s in self.state.values())
+                    wait = (due - datetime.now()).total_seconds() + self.__rng.uniform(0, self.jitter)
+                else:
+                    wait = None
+                try:
+                    await asyncio.wait_for(self.__stopped.wait(), wait if wait is None else max(0.0, wait))
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                await self.tick(datetime.now())
+        finally:
+            self.__alive = False
+
+    def stop(self) -> None:
+        self.__stopped.set()
+
+    async def tick(self, now: datetime) -> List[List[SavedQuery]]:
+        """Run every query due at `now` .
+
+        Parameters
+        ----------
+        now : `datetime`
+            queries due up to `coalesce` seconds after it run
+
+        Returns
+        ----------
+        groups : `List[List[SavedQuery]]`
+            queries that ran, one list per run
+        """
+        horizon = now + timedelta(seconds=self.coalesce)
+        due = [q for name, q in self.queries.items() if self.state[name].next_run <= horizon]
+        groups = self.groups(due)
+        for group in groups:
+            await self.__run_group(group, now)
+        return groups
+
+    def groups(self, queries: Iterable[SavedQuery]) -> List[List[SavedQuery]]:
+        groups: Dict[str, List[SavedQuery]] = {}
+        for q in queries:
+            # a sync follows one query, it can't be part of a batch
+            key = q.name if q.args.get('sync') else json.dumps(q.args, sort_keys=True)
+            groups.setdefault(key, []).append(q)
+        return list(groups.values())
+
+    def health(self) -> Tuple[bool, Dict[str, Any]]:
+        """Whether the daemon keeps up with its schedule .
+
+        Returns
+        ----------
+        ok, status : `Tuple[bool, Dict[str, Any]]`
+            ok : `bool`
+                the scheduler is running and no query is more than its interval overdue
+            status : `Dict[str, Any]`
+                uptime, running, overdue and failing queries
+        """
+        now = datetime.now()
+        overdue = [
+            name for name, s in self.state.items()
+            if name not in self.running
+            and (now - s.next_run).total_seconds() > self.queries[name].interval]
+        failing = [name for name, s in self.state.items() if s.last_error is not None]
+        ok = self.__alive and not overdue
+        return ok, {
+            'ok': ok,
+            'uptime': (now - self.started).total_seconds(),
+            'running': self.running,
+            'overdue': overdue,
+            'failing': failing,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {name: {
+            'queries': q.queries,
+            'interval': q.interval,
+            **json.loads(self.state[name].json()),
+        } for name, q in self.queries.items()}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        """Serve `GET /health` and `GET /status` .
+
+        `/health` answers 200 while the daemon keeps up and 503 when it
+        doesn't, `/status` has the state of every saved query.
+
+        Parameters
+        ----------
+        host : `str`
+            address to listen on, only this machine by default
+        port : `int`
+            port to listen on, 0 for any free port
+
+        Returns
+        ----------
+        server : `asyncio.AbstractServer`
+            close it to stop serving
+        """
+        return await asyncio.start_server(self.__handle, host, port)
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        parts = request.decode("latin-1").split()
+        path = parts[1].split("?")[0] if len(parts) > 1 else ""
+        if parts[:1] != ["GET"]:
+            code, body = 405, {'error': "only GET is supported"}
+        elif path == "/health":
+            ok, body = self.health()
+            code = 200 if ok else 503
+        elif path == "/status":
+            code, body = 200, self.status()
+        else:
+            code, body = 404, {'error': f"no such path {path}, try /health or /status"}
+        content = json.dumps(body).encode()
+        reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}[code]
+        writer.write(
+            f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode() + content)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def __run_group(self, group: List[SavedQuery], now: datetime) -> None:
+        args = {'refresh': True, **group[0].args, 'queries': [q for saved in group for q in saved.queries]}
+        self.running = [saved.name for saved in group]
+        started, start = datetime.now(), time.perf_counter()
+        error = None
+        try:
+            await self.run(args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            self.running = []
+        for saved in group:
+            state = self.state[saved.name]
+            state.last_run = started
+            state.last_duration = time.perf_counter() - start
+            state.last_error = error
+            state.runs += 1
+            state.failures += error is not None
+            # keep to the schedule, skipping runs missed while the daemon was down
+            state.next_run += timedelta(seconds=saved.interval)
+            if state.next_run <= now:
+                state.next_run = now + timedelta(seconds=saved.interval)
+        self.__save()
+
+    def __load(self) -> Dict[str, JobState]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {name: JobState(**state) for name, state in stored.items()}
+
+    def __save(self) -> None:
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("{")
+            f.write(", ".join(f"{json.dumps(name)}: {state.json()}" for name, state in self.state.items()))
+            f.write("}")
+        os.replace(tmp, self.state_path)
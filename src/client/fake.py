@@ -0,0 +1,264 @@
+""" Local stand-in for the JobTech /search endpoint, for tests and benchmarks
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Union
+import httpx
+
+OCCUPATIONS = [
+    ("Mjukvaruutvecklare", "Data/IT"), ("Undersköterska", "Hälso- och sjukvård"),
+    ("Lagerarbetare", "Transport, distribution, lager"), ("Förskollärare", "Pedagogik"),
+    ("Elektriker", "Installation, drift, underhåll"), ("Redovisningsekonom", "Ekonomi, administration"),
+    ("Kock", "Hotell, restaurang, storhushåll"), ("Säljare", "Försäljning, inköp, marknadsföring"),
+]
+MUNICIPALITIES = [
+    ("Stockholm", "Stockholms län"), ("Göteborg", "Västra Götalands län"), ("Malmö", "Skåne län"),
+    ("Uppsala", "Uppsala län"), ("Umeå", "Västerbottens län"), ("Linköping", "Östergötlands län"),
+]
+# fields of a hit with resdet=brief
+BRIEF_FIELDS = (
+    'id', 'headline', 'employer', 'workplace_address', 'occupation', 'publication_date',
+    'application_deadline', 'timestamp', 'removed', 'webpage_url',
+)
+# value of every `stats` dimension in a raw ad
+STATS_FIELDS = {
+    'occupation-name': ('occupation', 'label'), 'occupation-group': ('occupation_group', 'label'),
+    'occupation-field': ('occupation_field', 'label'), 'country': ('workplace_address', 'country'),
+    'municipality': ('workplace_address', 'municipality'), 'region': ('workplace_address', 'region'),
+}
+TEXTS = {
+    "sv": [
+        "Vi söker nu en engagerad medarbetare som vill vara med och utveckla vår verksamhet.",
+        "Du arbetar nära dina kollegor och har stort eget ansvar i det dagliga arbetet.",
+        "Tjänsten är en tillsvidareanställning på heltid med sex månaders provanställning.",
+        "Goda kunskaper i svenska och engelska i tal och skrift är ett krav.",
+        "Vi erbjuder kollektivavtal, friskvårdsbidrag och goda möjligheter till utveckling.",
+    ],
+    "en": [
+        "We are looking for a motivated colleague who wants to help us grow our business.",
+        "You will work closely with the team and take responsibility for your own projects.",
+        "The position is full time and permanent, starting with a six month probation.",
+        "Fluent English is required, Swedish is a merit but not a requirement.",
+        "We offer flexible hours, a wellness allowance and plenty of room to grow.",
+    ],
+}
+
+
+def make_ad(i: int) -> dict:
+    """Smallest valid raw ad, every optional field left out
+    """
+    concept = {'concept_id': None, 'label': None, 'legacy_ams_taxonomy_id': None}
+    return {
+        'access_to_own_car': False,
+        'application_contacts': [],
+        'application_deadline': '2026-12-01T23:59:59',
+        'application_details': {'email': None, 'via_af': False},
+        'description': {'text': f"ad {i}", 'text_formatted': f"ad {i}"},
+        'driving_license_required': False,
+        'duration': concept,
+        'employer': {'name': f"employer {i}"},
+        'employment_type': concept,
+        'experience_required': False,
+        'headline': f"headline {i}",
+        'id': str(i),
+        'last_publication_date': '2026-12-01T23:59:59',
+        'must_have': {},
+        'nice_to_have': {},
+        'number_of_vacancies': 1,
+        'occupation': concept,
+        'occupation_field': concept,
+        'occupation_group': concept,
+        'publication_date': '2026-10-01T08:00:00',
+        'relevance': 1.0,
+        'removed': False,
+        'salary_type': concept,
+        'scope_of_work': {},
+        'source_type': 'VIA_AF_FORMULAR',
+        'timestamp': 1790000000000,
+        'webpage_url': f"https://example.com/{i}",
+        'working_hours_type': concept,
+        'workplace_address': {},
+    }
+
+
+def synthetic_ad(i: int, seed: int = 0) -> dict:
+    """Realistic raw ad, the same for the same `i` and `seed`
+
+    Occupations, employers and municipalities repeat like in real results,
+    descriptions are a few hundred characters of Swedish or English, a
+    quarter of the ads have an application email and ads are numbered
+    newest first
+    """
+    rng = random.Random(seed * 1_000_003 + i)
+    ad = make_ad(i)
+    occupation, field = OCCUPATIONS[rng.randrange(len(OCCUPATIONS))]
+    municipality, region = MUNICIPALITIES[rng.randrange(len(MUNICIPALITIES))]
+    lang = "sv" if rng.random() < 0.7 else "en"
+    text = " ".join(rng.choice(TEXTS[lang]) for _ in range(rng.randint(3, 8)))
+    employer = f"Företag {rng.randrange(200)} AB"
+    published = datetime(2026, 10, 1) - timedelta(minutes=i)
+    ad.update({
+        'headline': f"{occupation} till {employer}",
+        'description': {'text': text, 'text_formatted': f"<p>{text}</p>"},
+        'employer': {'name': employer, 'organisation_number': f"556{rng.randrange(10**7):07d}"},
+        'occupation': {'concept_id': f"occ{occupation[:4]}", 'label': occupation, 'legacy_ams_taxonomy_id': None},
+        'occupation_field': {'concept_id': f"fld{field[:4]}", 'label': field, 'legacy_ams_taxonomy_id': None},
+        'workplace_address': {'municipality': municipality, 'region': region, 'country': "Sverige"},
+        'publication_date': published.isoformat(timespec="seconds"),
+        'application_deadline': (published + timedelta(days=30)).isoformat(timespec="seconds"),
+        'timestamp': int(published.timestamp() * 1000),
+    })
+    if rng.random() < 0.25:
+        ad['application_details'] = {'email': f"jobb{i}@example.com", 'via_af': False}
+    return ad
+
+
+class FakeJobTech():
+    """In-process /search endpoint serving synthetic ads.
+
+        ...
+
+        Serve it to `JobGetClient` through `transport()`. Every request is
+        answered after `latency` seconds, and fails with a 503 with
+        probability `error_rate`. Ads are generated once and numbered
+        newest first, so every sort order returns the same pages. `stats`
+        and `stats.limit` are answered with counts over the matching ads,
+        `resdet=brief` with only `BRIEF_FIELDS`, and `/ad/{id}` with one full
+        ad. `region`, `municipality` (concept ids from the stats),
+        `published-after`, `published-before` (inclusive) and
+        `sort=pubdate-asc` are supported, offsets past `max_offset` are
+        answered with 400 like the real API.
+
+        Attributes
+        ----------
+        total : `int`
+            number of ads matching every query
+        latency : `float`
+            seconds before answering a request
+        error_rate : `float`
+            share of requests answered with 503
+        max_offset : `int | None`
+            deepest offset allowed, no limit if None
+        requests : `int`
+            requests received
+        errors : `int`
+            requests answered with an error
+        bytes : `int`
+            size of the response bodies sent
+
+        Methods
+        ----------
+        transport : `() => httpx.MockTransport`
+            transport for `JobGetClient(transport=...)`
+        hits : `(offset: int, limit: int) => List[dict]`
+            raw ads of a page
+        stats : `(dimension: str, limit: int, ids: List[int] | None) => dict`
+            counts of the most common values of a dimension
+    """
+    def __init__(
+            self,
+            total: int = 1000, *,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            max_offset: Union[int, None] = None,
+            seed: int = 0) -> None:
+        self.total = total
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_offset = max_offset
+        self.seed = seed
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.__rng = random.Random(seed)
+        self.__ads: Dict[int, dict] = {}
+
+    def hits(self, offset: int, limit: int) -> List[dict]:
+        res = []
+        for i in range(offset, min(offset + limit, self.total)):
+            if i not in self.__ads:
+                self.__ads[i] = synthetic_ad(i, self.seed)
+            res.append(self.__ads[i])
+        return res
+
+    def stats(self, dimension: str, limit: int = 5, ids: Union[List[int], None] = None) -> Dict[str, Any]:
+        group, field = STATS_FIELDS[dimension]
+        counts: Dict[str, int] = {}
+        ads = self.hits(0, self.total)
+        for ad in ads if ids is None else (ads[i] for i in ids):
+            term = (ad.get(group) or {}).get(field)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + 1
+        top = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return {'type': dimension, 'values': [
+            {'term': term, 'concept_id': f"id-{term}", 'code': f"code-{term}", 'count': count}
+            for term, count in top]}
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.__rng.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(503, text="service unavailable")
+        if "/ad/" in request.url.path:
+            id = request.url.path.rsplit("/", 1)[1]
+            if not id.isdigit() or int(id) >= self.total:
+                return httpx.Response(404, text="ad not found")
+            return self.__respond(self.hits(int(id), 1)[0])
+        params = request.url.params
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 10))
+        if self.max_offset is not None and offset > self.max_offset:
+            return httpx.Response(400, text=f"offset must be at most {self.max_offset}")
+        ids = self.__matching(params)
+        total = self.total if ids is None else len(ids)
+        if ids is None and params.get('sort') != 'pubdate-asc':
+            hits = self.hits(offset, limit)
+        else:
+            ads = self.hits(0, self.total)
+            ordered = list(range(self.total)) if ids is None else ids
+            if params.get('sort') == 'pubdate-asc':
+                ordered = ordered[::-1]
+            hits = [ads[i] for i in ordered[offset:offset + limit]]
+        if params.get('resdet') == 'brief':
+            hits = [{k: hit[k] for k in BRIEF_FIELDS} for hit in hits]
+        body: Dict[str, Union[int, Dict[str, Any], List[dict]]] = {
+            'total': {'value': total}, 'positions': total,
+            'query_time_in_millis': 1, 'result_time_in_millis': 1,
+            'hits': hits,
+        }
+        dimensions = params.get_list('stats')
+        if dimensions:
+            stats_limit = int(params.get('stats.limit', 5))
+            body['stats'] = [self.stats(d, stats_limit, ids) for d in dimensions]
+        return self.__respond(body)
+
+    def __matching(self, params: httpx.QueryParams) -> Union[List[int], None]:
+        """Ids of the ads matching the filters, newest first, None if there are no filters"""
+        regions = params.get_list('region')
+        municipalities = params.get_list('municipality')
+        after = params.get('published-after')
+        before = params.get('published-before')
+        if not (regions or municipalities or after or before):
+            return None
+        res = []
+        for i, ad in enumerate(self.hits(0, self.total)):
+            workplace = ad['workplace_address']
+            if regions and f"id-{workplace.get('region')}" not in regions:
+                continue
+            if municipalities and f"id-{workplace.get('municipality')}" not in municipalities:
+                continue
+            if (after and ad['publication_date'] < after) or (before and ad['publication_date'] > before):
+                continue
+            res.append(i)
+        return res
+
+    def __respond(self, body: Dict[str, Any]) -> httpx.Response:
+        response = httpx.Response(200, json=body)
+        self.bytes += len(response.content)
+        return response
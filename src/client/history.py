@@ -0,0 +1,121 @@
+import os
+from collections import deque
+from ..schemas.schemas import *
+from typing import Deque, Iterator, List, Union
+
+
+class ClientHistory():
+    """Bounded history of a client's params, args, responses and errors.
+
+        ...
+
+        The newest `size` entries are kept in memory. Older ones are
+        appended to `path` as JSON lines, or dropped when there is no path,
+        so a client that lives for days holds the same number of entries
+        as one that just started. Once the log passes `max_bytes` it's
+        moved to `<path>.1`, replacing the one before, which bounds the
+        disk it takes too. Responses are kept as the `ResponseCache` key of
+        their first page and their counts, never with their hits; read the
+        pages back from the cache while they're fresh.
+
+        Attributes
+        ----------
+        size : `int`
+            entries kept in memory
+        path : `str | None`
+            log older entries are spilled to, dropped if None
+        max_bytes : `int`
+            size at which the log is rotated
+        entries : `Deque[HistoryEntry]`
+            newest entries, oldest first
+        spilled : `int`
+            entries moved out of memory so far
+
+        Methods
+        ----------
+        append : `(entry: HistoryEntry) => None`
+            record an entry, spilling the oldest if full
+        replay : `() => Iterator[HistoryEntry]`
+            every entry still on disk or in memory, oldest first
+        params : `List[SearchParams]`
+            params in memory, oldest first
+        args : `List[Args]`
+            args in memory, oldest first
+        responses : `List[HistoryEntry]`
+            responses in memory, oldest first
+        errors : `List[str]`
+            errors in memory, oldest first
+    """
+    def __init__(
+            self,
+            size: int = 100,
+            path: Union[str, None] = None, *,
+            max_bytes: int = 16 * 1024 * 1024
+            ) -> None:
+        """Inits an empty history
+
+        Parameters
+        ----------
+        size : `int`
+            entries kept in memory, at least 1
+        path : `str | None`
+            JSON lines log for older entries, parent directories are created
+        max_bytes : `int`
+            size at which the log is rotated, defaults to 16 MiB
+        """
+        if size < 1:
+            raise ValueError(f"History size must be at least 1, got {size}")
+        self.size = size
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries: Deque[HistoryEntry] = deque()
+        self.spilled = 0
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, entry: HistoryEntry) -> None:
+        if len(self.entries) >= self.size:
+            self.__spill(self.entries.popleft())
+        self.entries.append(entry)
+
+    def replay(self) -> Iterator[HistoryEntry]:
+        if self.path:
+            for path in (self.path + ".1", self.path):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        for line in f:
+                            yield HistoryEntry.parse_raw(line)
+                except FileNotFoundError:
+                    pass
+        yield from list(self.entries)
+
+    @property
+    def params(self) -> List[SearchParams]:
+        return [SearchParams(**e.value) for e in self.entries if e.kind == 'params']
+
+    @property
+    def args(self) -> List[Args]:
+        return [Args(**e.value) for e in self.entries if e.kind == 'args']
+
+    @property
+    def responses(self) -> List[HistoryEntry]:
+        return [e for e in self.entries if e.kind == 'response']
+
+    @property
+    def errors(self) -> List[str]:
+        return [e.error for e in self.entries if e.kind == 'error']
+
+    def __spill(self, entry: HistoryEntry) -> None:
+        self.spilled += 1
+        if not self.path:
+            return
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(entry.json(exclude_none=True) + "\n")
@@ -1,11 +1,23 @@
 import asyncio
 import httpx
-import requests
 import json
 import math
 from ..schemas.schemas import *
-from typing import Union, Literal, Dict, List, Any, ClassVar, Tuple, AsyncGenerator
-from pydantic import parse_obj_as
+from ..schemas.compact import CompactAd, Interner
+from .pages import PageScheduler, merge
+from .shards import ShardPlanner
+from .cache import ResponseCache
+from .sync import SyncStore
+from .history import ClientHistory
+from .metrics import Metrics
+from .limits import AdaptiveLimit, TokenBucket
+from contextlib import nullcontext
+from ..util.languages import LanguageDetector, detect_ad_languages
+from ..util.emails import extract_emails
+from ..store.derived import DerivedCache
+from datetime import datetime
+from typing import Union, Literal, Dict, List, Any, ClassVar, Tuple, AsyncGenerator, Iterable
+from pydantic import parse_obj_as, ValidationError
 
 class NoResponseFound(Exception):
     """Response was not found
@@ -29,6 +41,11 @@ class InsufficientArgs(Exception):
     pass
 
 
+def _has_module(name: str) -> bool:
+    from importlib.util import find_spec
+    return find_spec(name) is not None
+
+
 class JobGetClient():
     """Handles requests.s to jobs API and dealing with them.
 
@@ -45,7 +62,7 @@ class JobGetClient():
         args : `ClientArgs`
             arguments for different client functionality
         history : `ClientHistory`
-            keeps a list of previous values
+            previous params and args, responses and errors, the newest in memory and older ones on disk
         save : `bool `
             boolean indicating whether to save to history by default
         status : `int`
@@ -53,29 +70,58 @@ class JobGetClient():
 
         Methods
         ----------
-        exec : `() => Tuple[Union[QueryResponse, None], ClientStatus]`
+        exec : `(refresh: bool) => Tuple[Union[QueryResponse, None], ClientStatus]`
             execute query based on current attributes
+        iter_ads : `(params: SearchParams | None, refresh: bool, compact: bool, drop_formatted: bool) => AsyncGenerator[Ad | CompactAd, None]`
+            yield validated or compact ads page by page
+        iter_batch : `(queries: Iterable[SearchParams], refresh: bool, compact: bool, drop_formatted: bool) => AsyncGenerator[Ad | CompactAd, None]`
+            fetch many queries at once, yielding every ad once
+        iter_brief : `(params: SearchParams | None, refresh: bool) => AsyncGenerator[dict, None]`
+            yield brief raw hits, only the fields the API includes with `resdet=brief`
+        hydrate : `(ids: Iterable[str | dict], refresh: bool, compact: bool, drop_formatted: bool) => AsyncGenerator[Ad | CompactAd, None]`
+            fetch full ads by id
+        facets : `(dimensions: Iterable[str], params: SearchParams | None, limit: int, refresh: bool) => FacetResult`
+            count hits per value of each dimension without fetching any hits
+        sync : `(store: SyncStore, params: SearchParams | None) => SyncResult`
+            fetch only ads published since the last sync
         set_params : `(params: SearchParams) => None`
             set search parameters
         set_args : `(args: ClientArgs) => None`
             set client arguments
-        detect_languages `() => None`
+        detect_languages `(detector: LanguageDetector | None, cache: DerivedCache | None) => None`
             detect languages defined in `arglang` from response 
         save_response `(path: str) => None`
             save response to file
+        aclose `() => None`
+            close the pooled connections
             
         Notes
         ----------
+        The client keeps a pool of connections alive between queries,
+        use it as `async with JobGetClient() as client:` to close the pool when done
         Please don't set attributes directly, use set functions - the functions save history which setting attributes doesn't, and does additional formatting/validation
 
     """
     def __init__(
             self, *,
             save_by_default: bool = True,
-            url: str = 'https://jobsearch.api.jobtechdev.se/search'
+            url: str = 'https://jobsearch.api.jobtechdev.se/search',
+            max_connections: int = 10,
+            max_keepalive: int = 10,
+            keepalive_expiry: float = 30.0,
+            http2: bool = False,
+            transport: Union[httpx.AsyncBaseTransport, None] = None,
+            cache: Union[ResponseCache, None] = None,
+            metrics: Union[Metrics, None] = None,
+            bucket: Union[TokenBucket, None] = None,
+            ad_url: Union[str, None] = None,
+            max_offset: Union[int, None] = 2000,
+            planner: Union[ShardPlanner, bool, None] = True,
+            history_size: int = 100,
+            history_path: Union[str, None] = None
             ) -> None:
 
-        """Inits Client with default save behaviour and API endpoint
+        """Inits Client with default save behaviour, API endpoint and connection pool
 
         Parameters
         ----------
@@ -83,26 +129,78 @@ class JobGetClient():
             sets the client save attribute, defaults to True
         url : `str`
             sets the API endpoint
+        max_connections : `int`
+            maximum number of concurrent connections in the pool
+        max_keepalive : `int`
+            maximum number of idle connections kept alive
+        keepalive_expiry : `float`
+            seconds an idle connection is kept alive
+        http2 : `bool`
+            use HTTP/2 if the optional `h2` package is installed
+        transport : `httpx.AsyncBaseTransport | None`
+            custom transport, e.g. `httpx.MockTransport` for tests
+        cache : `ResponseCache | None`
+            on-disk cache for fetched pages, no caching if None
+        metrics : `Metrics | None`
+            receives request timings and the time spent parsing ads
+        bucket : `TokenBucket | None`
+            rate limit on requests, defaults to the one shared by every client in the process
+        ad_url : `str | None`
+            endpoint returning one ad by id, `/ad` next to `url` by default
+        max_offset : `int | None`
+            deepest offset the API pages to, queries with more hits are sharded
+        planner : `ShardPlanner | bool | None`
+            how queries past `max_offset` are split, by region, municipality and date if True,
+            None or False to fetch only what one query reaches and report the rest as truncated
+        history_size : `int`
+            history entries kept in memory
+        history_path : `str | None`
+            log older history entries are moved to, dropped if None
+
+        Notes
+        ----------
+        gzip responses are always accepted, brotli is accepted
+        when the optional `brotli` package is installed
         """
         self.url = url
+        self.ad_url = ad_url
+        self.max_offset = max_offset
+        self.planner = ShardPlanner() if planner is True else planner or None
         self.response: Union[QueryResponse, None] = None
         self.params: Union[SearchParams, None] = None
         self.args: Union[Args, None] = None
-        self.history: Union[ClientHistory, None] = None
+        self.history = ClientHistory(history_size, history_path)
         self.save: bool = save_by_default
         self.status: ClientStatus = ClientStatus(
-            ok = not self.status.errors,
-            message="No errors" if not self.status.errors else f"{self.status.errors} errors",
+            ok=True,
+            message="No errors",
             errors=[],
             progress=Progress(0,0)
         )
         self.error: Union[Exception, None] = None
-        self.session = requests.Session()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2: bool = http2 and _has_module("h2")
+        self.transport = transport
+        self.cache = cache
+        self.metrics = metrics
+        self.bucket = bucket or TokenBucket.shared()
+        # one limit for every query of the client, they share the connection pool
+        self.concurrency = AdaptiveLimit(min(4, max_connections), 1, max_connections)
+        self.__client: Union[httpx.AsyncClient, None] = None
         self.result: Union[List[Ad], None] = None
         self.in_progress = self.status.progress.received < self.status.progress.total
-        self.__http_error: Callable[[int,str], None] = lambda code, text: self.status.errors.append((code, text))
-    async def exec(self) -> DataStatus:
+        self.__http_error: Callable[[int,str], None] = lambda code, text: self.status.errors.append(ClientError(code, text))
+    async def exec(self, *, refresh: bool = False) -> DataStatus:
         """Execute the query based on the current attributes .
+
+        Parameters
+        ----------
+        refresh : `bool`
+            ignore cached pages and fetch everything again
         
         Returns
         ----------
@@ -135,46 +233,551 @@ class JobGetClient():
         Will not raise exceptions, 
         instead will return them in e
         errors in fetching data will be in status.errors
+        failed pages are retried with backoff, offsets of pages
+        that still failed will be in status.missing, or per shard in
+        status.missing_shards for queries too big to page through
         """
         try:
             if not self.params:
                 self.error = NoParameterFound("No parameters were found")
                 return None, self.status, self.error
-            headers = {'accept': 'application/json'}
-            self.params.offset = 0
-            def __no_limit(q: SearchParams) -> Dict[str,Any]:
-                q.limit = 0
-                return q.dict(exclude_none=True)
-            
-            async with httpx.AsyncClient(headers=headers) as client:
-                res_total = await client.get(self.url, params=__no_limit(self.params))
-                res_total.raise_for_status()
-                total = QueryResponse(**res_total.json()).total.value
-                expecting = math.ceil(total / 100)
-                self.status.progress = Progress(0,expecting,)
-                tasks: List[asyncio.Task] = []
-                self.params.limit = 100
-                for i in range(expecting):
-                    self.params.offset = i*100
-                    tasks.append(asyncio.create_task(client.get(self.url, params=self.params.dict(exclude_none=True))))
-                res: List[httpx.Response] = await asyncio.gather(*tasks, return_exceptions=True)
-                json_res = []
-                for r in res:
-                    if r.status_code != 200:
-                        self.__http_error(r.status_code, r.text)
-                    else:
-                        json_res.append(r.json())
-                    self.status.progress.received += 1
-                hits = []
-                for r in json_res:
-                    hits.extend(r['hits'])
-                resp = {**json_res[0], 'hits': hits}
-                self.response = QueryResponse(**resp)
+            self.status.errors = []
+            scheduler = self.__scheduler(refresh)
+            result = await scheduler.fetch(self.params)
+            self.status.progress = Progress(len(result.pages), math.ceil(result.total / scheduler.page_size))
+            self.__set_missing(result.missing, scheduler.truncated, scheduler.missing_shards)
+            self.__record(self.params, scheduler)
+            if not result.pages:
+                return None, self.status, None
+            hits = []
+            for page in result.pages.values():
+                hits.extend(page['hits'])
+            with self.__timed("parse", len(hits)):
+                self.response = QueryResponse(**{**result.pages[0], 'hits': hits})
             return self.response, self.status, None
         except Exception as e:
             self.error = e
             return None, self.status, self.error
     
+    async def iter_ads(
+            self,
+            params: Union[Dict[str, Any], SearchParams, None] = None, *,
+            refresh: bool = False,
+            compact: bool = False,
+            drop_formatted: bool = False
+            ) -> AsyncGenerator[Union[Ad, CompactAd], None]:
+        """Yield validated ads page by page as responses arrive .
+
+        Unlike `exec`, no pages are merged and no `QueryResponse` is built,
+        so only the current page is held in memory.
+        Pages arrive in completion order, not offset order.
+        With `compact`, ads are `CompactAd`s sharing one `Interner` and
+        are only validated when a field outside the compact set is read.
+
+        Parameters
+        ----------
+        params : `Dict[str, Any] | SearchParams | None`
+            parameters for this query, defaults to the client params
+        refresh : `bool`
+            ignore cached pages and fetch everything again
+        compact : `bool`
+            yield `CompactAd`s instead of validated `Ad`s
+        drop_formatted : `bool`
+            drop `description.text_formatted` from compact ads
+
+        Yields
+        ----------
+        ad : `Ad | CompactAd`
+            validated or compact ad
+
+        Raises
+        ----------
+        NoParameterFound
+            if no parameters are given or set on the client
+
+        Usage
+        ----------
+        ``` python
+        async for ad in client.iter_ads({"q": "python"}):
+            #do stuff with ad
+        if client.status.missing:
+            #handle missing pages
+        ```
+        """
+        params = parse_obj_as(SearchParams, params) if params is not None else self.params
+        if not params:
+            raise NoParameterFound("No parameters were found")
+        self.status.errors = []
+        scheduler = self.__scheduler(refresh)
+        interner = Interner() if compact else None
+        received = 0
+        async for _, page in scheduler.iter_pages(params):
+            received += 1
+            self.status.progress = Progress(received, math.ceil(scheduler.total / scheduler.page_size))
+            with self.__timed("parse", len(page['hits'])) as out:
+                ads = [self.__compact(hit, interner, drop_formatted) if interner else self.__parse(hit)
+                       for hit in page['hits']]
+                ads = [ad for ad in ads if ad is not None]
+                out.append(len(ads))
+            for ad in ads:
+                yield ad
+        self.__set_missing(scheduler.missing, scheduler.truncated, scheduler.missing_shards)
+        self.__record(params, scheduler)
+
+    async def iter_batch(
+            self,
+            queries: Iterable[Union[Dict[str, Any], SearchParams]], *,
+            refresh: bool = False,
+            compact: bool = False,
+            drop_formatted: bool = False
+            ) -> AsyncGenerator[Union[Ad, CompactAd], None]:
+        """Fetch many queries concurrently, yielding every ad once .
+
+        Queries share the connection pool, concurrency and rate limits of
+        the client. Hits are deduplicated by id before they are parsed, so
+        parsing and everything downstream scales with the unique ads, not
+        with the number of queries. `ad.matched_queries` lists the `q` of
+        every query that returned the ad, it keeps growing while later
+        queries arrive and is complete once the iteration ends.
+
+        Parameters
+        ----------
+        queries : `Iterable[Dict[str, Any] | SearchParams]`
+            parameters of every query, queries with the same parameters are fetched once
+        refresh : `bool`
+            ignore cached pages and fetch everything again
+        compact : `bool`
+            yield `CompactAd`s instead of validated `Ad`s
+        drop_formatted : `bool`
+            drop `description.text_formatted` from compact ads
+
+        Yields
+        ----------
+        ad : `Ad | CompactAd`
+            validated or compact ad, first seen in any query
+
+        Raises
+        ----------
+        NoParameterFound
+            if no queries are given
+
+        Usage
+        ----------
+        ``` python
+        ads = [ad async for ad in client.iter_batch([{"q": "python"}, {"q": "backend"}])]
+        for ad in ads:
+            #ad.matched_queries == ["python", "backend"], ...
+        for q, offsets in client.status.missing_by_query.items():
+            #handle missing pages
+        ```
+        """
+        # the same normalized key as the response cache, filters and all; `q` only labels ads
+        unique: Dict[str, SearchParams] = {}
+        for q in queries:
+            params = parse_obj_as(SearchParams, q)
+            unique.setdefault(ResponseCache.key(self.url, params.copy(update={'offset': None, 'limit': None})), params)
+        if not unique:
+            raise NoParameterFound("No queries were given")
+        self.status.errors = []
+        batch = list(unique.values())
+        labels = [params.q for params in batch]
+        schedulers = [self.__scheduler(refresh) for _ in batch]
+        interner = Interner() if compact else None
+        seen: Dict[str, List[str]] = {}
+        received = 0
+        # bounded, so fetching waits for parsing instead of piling up pages
+        pages = merge([s.iter_pages(params) for s, params in zip(schedulers, batch)], buffer=2 * len(batch))
+        async for i, (_, page) in pages:
+            received += 1
+            total = sum(math.ceil(s.total / s.page_size) for s in schedulers)
+            self.status.progress = Progress(received, total)
+            label = labels[i]
+            new = []
+            with self.__timed("dedup", len(page['hits'])) as out:
+                for hit in page['hits']:
+                    matched = seen.get(hit.get('id'))
+                    if matched is None:
+                        seen[hit.get('id')] = matched = []
+                        new.append((hit, matched))
+                    if label not in matched:
+                        matched.append(label)
+                out.append(len(new))
+            with self.__timed("parse", len(new)) as out:
+                ads = []
+                for hit, matched in new:
+                    ad = self.__compact(hit, interner, drop_formatted) if interner else self.__parse(hit)
+                    if ad is not None:
+                        ad.matched_queries = matched
+                        ads.append(ad)
+                out.append(len(ads))
+            for ad in ads:
+                yield ad
+        self.__set_missing([offset for s in schedulers for offset in s.missing],
+                           sum(s.truncated for s in schedulers),
+                           [shard for s in schedulers for shard in s.missing_shards])
+        self.status.missing_by_query = {}
+        for label, s in zip(labels, schedulers):
+            if s.missing:
+                self.status.missing_by_query.setdefault(label, []).extend(s.missing)
+        for params, s in zip(batch, schedulers):
+            self.__record(params, s)
+
+    async def iter_brief(
+            self,
+            params: Union[Dict[str, Any], SearchParams, None] = None, *,
+            refresh: bool = False
+            ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield brief raw hits page by page, the first phase of a two phase fetch .
+
+        Pages are requested with `resdet=brief`, a fraction of the size of
+        full ones. Brief hits aren't valid `Ad`s, filter them on the fields
+        they carry (id, headline, employer, workplace, occupation, dates)
+        and pass the ids to keep to `hydrate`.
+
+        Parameters
+        ----------
+        params : `Dict[str, Any] | SearchParams | None`
+            parameters for this query, defaults to the client params
+        refresh : `bool`
+            ignore cached pages and fetch everything again
+
+        Yields
+        ----------
+        hit : `dict`
+            brief raw hit
+
+        Raises
+        ----------
+        NoParameterFound
+            if no parameters are given or set on the client
+
+        Usage
+        ----------
+        ``` python
+        ids = [hit["id"] async for hit in client.iter_brief({"q": "python"})
+               if "senior" not in hit["headline"].lower()]
+        ads = [ad async for ad in client.hydrate(ids)]
+        ```
+        """
+        params = parse_obj_as(SearchParams, params) if params is not None else self.params
+        if not params:
+            raise NoParameterFound("No parameters were found")
+        self.status.errors = []
+        scheduler = self.__scheduler(refresh)
+        received = 0
+        async for _, page in scheduler.iter_pages(params.copy(update={'resdet': 'brief'})):
+            received += 1
+            self.status.progress = Progress(received, math.ceil(scheduler.total / scheduler.page_size))
+            for hit in page['hits']:
+                yield hit
+        self.__set_missing(scheduler.missing, scheduler.truncated, scheduler.missing_shards)
+        self.__record(params.copy(update={'resdet': 'brief'}), scheduler)
+
+    async def hydrate(
+            self,
+            ids: Iterable[Union[str, Dict[str, Any]]], *,
+            refresh: bool = False,
+            compact: bool = False,
+            drop_formatted: bool = False,
+            window: int = 50
+            ) -> AsyncGenerator[Union[Ad, CompactAd], None]:
+        """Fetch full ads by id, the second phase of a two phase fetch .
+
+        Every ad is one small request to the `/ad/{id}` endpoint, sent
+        concurrently within the client's concurrency and rate limits and
+        cached by id, so ads hydrated in an earlier run aren't fetched again.
+        Ads arrive in completion order. Ids that could not be fetched are
+        in `status.missing_ids`.
+
+        Parameters
+        ----------
+        ids : `Iterable[str | dict]`
+            ids, or hits with an "id", duplicates are fetched once
+        refresh : `bool`
+            ignore cached ads and fetch again
+        compact : `bool`
+            yield `CompactAd`s instead of validated `Ad`s
+        drop_formatted : `bool`
+            drop `description.text_formatted` from compact ads
+        window : `int`
+            most lookups scheduled at once, the concurrency limits apply on top
+
+        Yields
+        ----------
+        ad : `Ad | CompactAd`
+            validated or compact ad
+        """
+        self.status.errors = []
+        scheduler = self.__scheduler(refresh)
+        interner = Interner() if compact else None
+        pending = iter(dict.fromkeys(i if isinstance(i, str) else i['id'] for i in ids))
+        running: Dict[asyncio.Task, str] = {}
+        missing: List[str] = []
+
+        def schedule() -> None:
+            for id in pending:
+                running[asyncio.create_task(scheduler.fetch_ad(id))] = id
+                if len(running) >= window:
+                    return
+        try:
+            schedule()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                hits = []
+                for task in done:
+                    id = running.pop(task)
+                    hit = task.result()
+                    if hit is None:
+                        missing.append(id)
+                    else:
+                        hits.append(hit)
+                schedule()
+                with self.__timed("parse", len(hits)) as out:
+                    ads = [self.__compact(hit, interner, drop_formatted) if interner else self.__parse(hit)
+                           for hit in hits]
+                    ads = [ad for ad in ads if ad is not None]
+                    out.append(len(ads))
+                for ad in ads:
+                    yield ad
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        self.status.missing_ids = missing
+        self.status.ok = not missing
+        self.status.message = "No errors" if not missing else f"{len(missing)} ads missing"
+
+    async def facets(
+            self,
+            dimensions: Iterable[str] = FACET_DIMENSIONS,
+            params: Union[Dict[str, Any], SearchParams, None] = None, *,
+            limit: int = 10,
+            refresh: bool = False
+            ) -> FacetResult:
+        """Count hits per value of each dimension, without downloading any ad .
+
+        Sends one `limit=0` request with `stats` per dimension, all at once,
+        so an overview costs a few small responses however many ads match.
+        Responses are cached like pages.
+
+        Parameters
+        ----------
+        dimensions : `Iterable[str]`
+            any of `FACET_DIMENSIONS`, all of them by default
+        params : `Dict[str, Any] | SearchParams | None`
+            parameters for this query, defaults to the client params
+        limit : `int`
+            number of values per dimension, the most common first
+        refresh : `bool`
+            ignore cached responses and fetch again
+
+        Returns
+        ----------
+        result : `FacetResult`
+            total hits, counts per dimension and dimensions that failed
+
+        Raises
+        ----------
+        NoParameterFound
+            if no parameters are given or set on the client
+        ValueError
+            if a dimension isn't one of `FACET_DIMENSIONS`
+
+        Usage
+        ----------
+        ``` python
+        total, counts, missing = await client.facets(["region"], {"q": "python"})
+        for value in counts["region"]:
+            print(value.term, value.count)
+        ```
+        """
+        params = parse_obj_as(SearchParams, params) if params is not None else self.params
+        if not params:
+            raise NoParameterFound("No parameters were found")
+        dimensions = list(dict.fromkeys(dimensions))
+        unknown = [d for d in dimensions if d not in FACET_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown facets {unknown}, use any of {FACET_DIMENSIONS}")
+        self.status.errors = []
+        scheduler = self.__scheduler(refresh)
+        pages = await asyncio.gather(*(
+            scheduler.fetch_stats(params.copy(update={'stats': d, 'stats_limit': limit}))
+            for d in dimensions))
+        total, counts, missing = 0, {}, []
+        for dimension, page in zip(dimensions, pages):
+            if page is None:
+                missing.append(dimension)
+                continue
+            response = QueryResponse(**page)
+            total = response.total.value
+            stats = next((s for s in response.stats or [] if s.type == dimension), None)
+            counts[dimension] = sorted(stats.values, key=lambda v: -v.count) if stats else []
+        self.status.ok = not missing
+        self.status.message = "No errors" if not missing else f"Facets {missing} missing"
+        return FacetResult(total, counts, missing)
+
+    async def sync(
+            self,
+            store: SyncStore,
+            params: Union[Dict[str, Any], SearchParams, None] = None
+            ) -> SyncResult:
+        """Fetch only ads published since the last sync of the same query .
+
+        Pages are requested with `sort=pubdate-desc` one at a time and paging
+        stops at the first page containing an ad that is already stored or
+        not newer than the newest stored ad. The first sync of a query
+        fetches every page concurrently.
+        New ads are merged into the store, stored ads the API now marks
+        as `removed` are updated and reported.
+        If any page can't be fetched nothing is stored, so the next sync
+        starts from the same point.
+
+        Parameters
+        ----------
+        store : `SyncStore`
+            store holding ads and state from earlier syncs
+        params : `Dict[str, Any] | SearchParams | None`
+            parameters for this query, defaults to the client params
+
+        Returns
+        ----------
+        result : `SyncResult`
+            new ads, ids of removed ads and number of stored ads
+
+        Raises
+        ----------
+        NoParameterFound
+            if no parameters are given or set on the client
+        """
+        params = parse_obj_as(SearchParams, params) if params is not None else self.params
+        if not params:
+            raise NoParameterFound("No parameters were found")
+        params = params.copy(update={'sort': 'pubdate-desc'})
+        key = store.key(self.url, params)
+        state, ads = store.load(key)
+        self.status.errors = []
+        scheduler = self.__scheduler(refresh=True)
+        if state is None:
+            pages = scheduler.iter_pages(params)
+        else:
+            def known(page: Dict[str, Any]) -> bool:
+                return any(hit['id'] in ads or not self.__newer(state, hit)
+                           for hit in page['hits'])
+            pages = scheduler.iter_until(params, known)
+        fresh: Dict[str, Dict[str, Any]] = {}
+        async for _, page in pages:
+            for hit in page['hits']:
+                fresh[hit['id']] = hit
+        if state is not None and scheduler.truncated:
+            # more new ads than one query reaches, fetch the whole query in shards
+            async for _, page in scheduler.iter_pages(params):
+                for hit in page['hits']:
+                    fresh[hit['id']] = hit
+        self.__set_missing(scheduler.missing, scheduler.truncated, scheduler.missing_shards)
+        self.__record(params, scheduler)
+        if scheduler.missing or scheduler.missing_shards:
+            return SyncResult([], [], len(ads))
+        new, removed = [], []
+        state = state or SyncState(params=params)
+        for id, hit in fresh.items():
+            if hit.get('removed'):
+                if id in ads and not ads[id].get('removed'):
+                    removed.append(id)
+            elif id not in ads:
+                ad = self.__parse(hit)
+                if ad is not None:
+                    new.append(ad)
+            ads[id] = hit
+            if self.__newer(state, hit):
+                state.newest_publication = datetime.fromisoformat(hit['publication_date'])
+            if hit['timestamp'] > (state.newest_timestamp or 0):
+                state.newest_timestamp = hit['timestamp']
+        state.last_run = datetime.now()
+        store.save(key, state, ads)
+        return SyncResult(new, removed, len(ads))
+
+    @staticmethod
+    def __newer(state: Union[SyncState, None], hit: Dict[str, Any]) -> bool:
+        if state is None or state.newest_publication is None:
+            return True
+        return datetime.fromisoformat(hit['publication_date']) > state.newest_publication
+
+    def __parse(self, hit: Dict[str, Any]) -> Union[Ad, None]:
+        try:
+            return Ad(**hit)
+        except ValidationError as e:
+            self.__http_error(0, f"invalid ad {hit.get('id')}: {e}")
+            return None
+
+    def __compact(self, hit: Dict[str, Any], interner: Interner, drop_formatted: bool) -> Union[CompactAd, None]:
+        try:
+            return CompactAd(hit, interner=interner, drop_formatted=drop_formatted)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            self.__http_error(0, f"invalid ad {hit.get('id')}: {e!r}")
+            return None
+
+    async def __aenter__(self) -> "JobGetClient":
+        self.__http_client()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the pooled connections .
+
+        Called automatically when used as `async with JobGetClient() as client:`,
+        a new pool is opened if the client is used again afterwards
+        """
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
+
+    def __scheduler(self, refresh: bool) -> PageScheduler:
+        return PageScheduler(
+            self.__http_client(), self.url,
+            on_error=self.__http_error,
+            cache=self.cache,
+            refresh=refresh,
+            metrics=self.metrics,
+            concurrency=self.concurrency,
+            bucket=self.bucket,
+            ad_url=self.ad_url,
+            max_offset=self.max_offset,
+            planner=self.planner
+        )
+
+    def __timed(self, name: str, items: int):
+        return self.metrics.stage(name, items) if self.metrics else nullcontext([])
+
+    def __http_client(self) -> httpx.AsyncClient:
+        if self.__client is None or self.__client.is_closed:
+            self.__client = httpx.AsyncClient(
+                headers={'accept': 'application/json'},
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport
+            )
+        return self.__client
+
+    def __set_missing(
+            self,
+            missing: List[int],
+            truncated: int = 0,
+            missing_shards: List[Tuple[SearchParams, List[int]]] = []
+            ) -> None:
+        self.status.missing = missing
+        self.status.missing_shards = missing_shards
+        self.status.truncated = truncated
+        self.status.ok = not missing and not missing_shards and not truncated
+        problems = [f"{len(missing)} pages missing"] if missing else []
+        if missing_shards:
+            problems.append(f"{sum(len(offsets) for _, offsets in missing_shards)} pages missing "
+                            f"in {len(missing_shards)} shards")
+        if truncated:
+            problems.append(f"{truncated} hits out of reach")
+        self.status.message = ", ".join(problems) or "No errors"
+
     def set_params(
             self,
             params: Dict[str,Union[str, List[str], bool, int]],
@@ -193,15 +796,10 @@ class JobGetClient():
         try:
             new_params = parse_obj_as(SearchParams, params)
             if self.__save(save, self.params):
-                if not self.history:
-                    self.history = ClientHistory(
-                        params=self.params,
-                    )
-                self.history.params.append(self.params)
+                self.history.append(HistoryEntry(kind='params', value=self.params.dict(exclude_none=True, by_alias=True)))
             self.params = new_params
         except Exception as e:
-            self.status.exceptions.append(e)
-            self.status.code = 2
+            self.__invalid(e)
 
     def set_args(
             self,
@@ -220,14 +818,10 @@ class JobGetClient():
         try:
             new_args = parse_obj_as(Args, args)
             if self.__save(save, self.args):
-                if not self.history:
-                    self.history = ClientHistory(
-                        args=[self.args],
-                    )
-                self.history.args.append(self.args)
+                self.history.append(HistoryEntry(kind='args', value=self.args.dict(exclude_none=True)))
             self.args = new_args
         except Exception as e:
-            self.status.exceptions.append(e)
+            self.__invalid(e)
     def initiate(self, *,
                  args: Dict[str,
                             Union[str,
@@ -250,9 +844,33 @@ class JobGetClient():
         self.set_params(params)
     def __save(self, save: bool, param: Any = None) -> bool:
         return param is not None and ((self.save and save) or save)
-    def detect_languages(self) -> None:
+    def __invalid(self, e: Exception) -> None:
+        self.status.errors.append(ClientError(2, str(e)))
+        self.history.append(HistoryEntry(kind='error', error=str(e)))
+    def __record(self, params: SearchParams, scheduler: PageScheduler) -> None:
+        # the key of the first page, the response itself stays in the cache
+        if self.save:
+            first = params.copy(update={'offset': 0, 'limit': scheduler.page_size})
+            self.history.append(HistoryEntry(
+                kind='response', key=ResponseCache.key(self.url, first),
+                total=scheduler.total,
+                missing=len(scheduler.missing) + sum(len(offsets) for _, offsets in scheduler.missing_shards)))
+    async def detect_languages(
+            self,
+            detector: Union[LanguageDetector, None] = None,
+            cache: Union[DerivedCache, None] = None
+            ) -> None:
         """Detect languages based on the search query .
 
+        Detection runs in a process pool, so it doesn't block the event loop
+
+        Parameters
+        ----------
+        detector : `LanguageDetector | None`
+            detector to reuse, a temporary one is used if None
+        cache : `DerivedCache | None`
+            languages of cached ads are taken from here, new ones are added
+
         Raises
         ----------
         NoArgsGiven
@@ -268,9 +886,11 @@ class JobGetClient():
             raise InsufficientArgs("No languages defined")
         if not self.response:
             raise NoResponseFound("No response found")
-        from langdetect import detect
-        for ad in self.response.hits:
-            ad.language = detect(" ".join(ad.description.text.split()[:10]))
+        if detector is None:
+            with LanguageDetector(languages=self.args.lang) as detector:
+                await detect_ad_languages(self.response.hits, detector, cache)
+        else:
+            await detect_ad_languages(self.response.hits, detector, cache)
     
     def filter_emails(self) -> None:
         """Filter out adas withou emails .
@@ -280,14 +900,9 @@ class JobGetClient():
         NoResponseFound
             if no response is found in client
         """
-        self.status.code = 1
         if not self.response:
-            self.status.code = 3
             raise NoResponseFound("No response found")
-        self.result = [(ad for ad in self.response.hits
-                           if ad.application_details.email
-                           or ad.employer.email)]
-        self.status.code = 2
+        self.result = [ad for ad in self.response.hits if extract_emails(ad)]
     
     def clear_errors(self):
         self.status.code = 0
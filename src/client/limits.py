@@ -0,0 +1,223 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Hashable, Union
+
+
+def retry_after(value: Union[str, None], now: Union[datetime, None] = None) -> Union[float, None]:
+    """Seconds to wait from a Retry-After header, seconds or an HTTP date .
+
+    Parameters
+    ----------
+    value : `str | None`
+        header value
+    now : `datetime | None`
+        time to compare dates with, defaults to now
+
+    Returns
+    ----------
+    seconds : `float | None`
+        seconds to wait, None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+class TokenBucket():
+    """Rate limit shared by every request that uses it.
+
+        ...
+
+        Allows `burst` requests at once and `rate` per second after that.
+        Tokens are reserved synchronously and waited for outside any lock,
+        so one bucket works across event loops and threads. `pause` stops
+        everyone until a time, e.g. when the API answers with Retry-After.
+
+        Attributes
+        ----------
+        rate : `float`
+            tokens added per second
+        burst : `float`
+            most tokens the bucket holds
+
+        Methods
+        ----------
+        acquire : `() => Awaitable[None]`
+            wait for a token
+        pause : `(seconds: float) => None`
+            hand out no tokens for `seconds`
+        shared : `() => TokenBucket`
+            bucket shared by every client in the process
+    """
+    __shared: Union["TokenBucket", None] = None
+
+    def __init__(self, rate: float = 25.0, burst: float = 25.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+        self.__paused_until = 0.0
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "TokenBucket":
+        if cls.__shared is None:
+            cls.__shared = cls()
+        return cls.__shared
+
+    def reserve(self) -> float:
+        """Take a token, returns seconds to wait before using it
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            wait = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+            return max(wait, self.__paused_until - now)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimit():
+    """Concurrency limit adjusted with additive increase, multiplicative decrease.
+
+        ...
+
+        Until the first decrease every successful request adds one, doubling
+        the limit per round of requests. After that it adds `1 / limit`, about
+        one per round. A 429 or 503, or a latency above `tolerance` times
+        the baseline, multiplies it by `decrease`, at most once per round
+        trip so one burst of errors counts once.
+
+        The baseline is the lowest of the last `window` latencies of the
+        same kind of request, so a `limit=0` count doesn't make every full
+        page look slow, and a fast spell long ago doesn't either.
+
+        Attributes
+        ----------
+        limit : `float`
+            current number of requests allowed at once
+        latency : `float | None`
+            smoothed latency, the length of a round
+        min_limit : `int`
+            lowest limit
+        max_limit : `int`
+            highest limit, e.g. the connection pool size
+        in_flight : `int`
+            requests currently holding a slot
+        window : `int`
+            latencies per kind of request the baseline is taken from
+
+        Methods
+        ----------
+        acquire : `() => Awaitable[None]`
+            wait for a slot
+        release : `(latency: float | None, overloaded: bool, kind: Hashable) => None`
+            free a slot and adjust the limit
+        baseline : `(kind: Hashable) => float | None`
+            lowest recent latency of a kind of request
+    """
+    def __init__(
+            self,
+            initial: int = 4,
+            min_limit: int = 1,
+            max_limit: int = 10, *,
+            decrease: float = 0.5,
+            tolerance: float = 3.0,
+            window: int = 50
+            ) -> None:
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.window = window
+        self.latency: Union[float, None] = None
+        self.__last_decrease = 0.0
+        self.__slow_start = True
+        self.__waiters: Deque[asyncio.Future] = deque()
+        self.__recent: Dict[Hashable, Deque[float]] = {}
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.__waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # pass a wakeup this waiter got on to the next one
+                if waiter in self.__waiters:
+                    self.__waiters.remove(waiter)
+                self.__wake()
+                raise
+        self.in_flight += 1
+
+    def release(
+            self,
+            latency: Union[float, None] = None,
+            overloaded: bool = False,
+            kind: Hashable = None
+            ) -> None:
+        """Free a slot and adjust the limit .
+
+        Parameters
+        ----------
+        latency : `float | None`
+            seconds the request took, None if it failed without a response
+        overloaded : `bool`
+            the API asked to slow down (429, 503)
+        kind : `Hashable`
+            kind of request, e.g. its page size, latencies are only compared within a kind
+        """
+        self.in_flight -= 1
+        slow = False
+        if latency is not None:
+            recent = self.__recent.setdefault(kind, deque(maxlen=self.window))
+            recent.append(latency)
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            slow = latency > min(recent) * self.tolerance
+        if overloaded or slow:
+            now = time.monotonic()
+            if now - self.__last_decrease > (self.latency or 0.0):
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.__last_decrease = now
+                self.__slow_start = False
+        elif latency is not None:
+            step = 1.0 if self.__slow_start else 1 / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+        self.__wake()
+
+    def baseline(self, kind: Hashable = None) -> Union[float, None]:
+        recent = self.__recent.get(kind)
+        return min(recent) if recent else None
+
+    def __wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
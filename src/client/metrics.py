@@ -0,0 +1,241 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from ..schemas.schemas import *
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
+
+Event = Union[RequestTiming, StageTiming]
+
+
+class RequestTrace():
+    """Collects httpcore trace events of one request into phase durations.
+
+        ...
+
+        Passed as the `trace` request extension. DNS lookup is part of
+        `connect`, which is None when a pooled connection was reused or the
+        transport doesn't report connections (e.g. `httpx.MockTransport`).
+
+        Attributes
+        ----------
+        connect : `float | None`
+            seconds spent opening the connection, TLS included
+        ttfb : `float | None`
+            seconds from sending the request headers to receiving the response headers
+        download : `float | None`
+            seconds spent receiving the response body
+    """
+    def __init__(self) -> None:
+        self.__started: Dict[str, float] = {}
+        self.__ended: Dict[str, float] = {}
+
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        # "http11.receive_response_body.complete" -> "receive_response_body", "complete"
+        name, state = event.rsplit(".", 1)
+        name = name.split(".", 1)[1]
+        if state == "started":
+            self.__started[name] = now
+        elif state == "complete":
+            self.__ended[name] = now
+
+    @property
+    def connect(self) -> Union[float, None]:
+        parts = [self.__between(p, p) for p in ("connect_tcp", "start_tls")]
+        parts = [p for p in parts if p is not None]
+        return sum(parts) if parts else None
+
+    @property
+    def ttfb(self) -> Union[float, None]:
+        return self.__between("send_request_headers", "receive_response_headers")
+
+    @property
+    def download(self) -> Union[float, None]:
+        return self.__between("receive_response_body", "receive_response_body")
+
+    def __between(self, start: str, end: str) -> Union[float, None]:
+        if start not in self.__started or end not in self.__ended:
+            return None
+        return self.__ended[end] - self.__started[start]
+
+
+class Metrics():
+    """Timing and size of every request and processing stage.
+
+        ...
+
+        Pass one to `JobGetClient(metrics=...)` and `Pipeline(metrics=...)`.
+        Every event is kept and passed to the hooks as it happens, so a hook
+        can stream events (see `JsonLinesExporter`) while `prometheus` and
+        `summary` aggregate everything seen so far.
+
+        Attributes
+        ----------
+        hooks : `List[Callable[[RequestTiming | StageTiming], None]]`
+            called with every event
+        requests : `List[RequestTiming]`
+            every request attempt and cache hit
+        stages : `List[StageTiming]`
+            every timed stage run
+
+        Methods
+        ----------
+        request : `(timing: RequestTiming) => None`
+            record a request attempt
+        stage : `(name: str, items_in: int) => ContextManager[List[int]]`
+            time a block of work, append the number of items out to the yielded list
+        prometheus : `() => str`
+            aggregates in the Prometheus text format
+        summary : `() => str`
+            where the time of the run went, for people
+    """
+    def __init__(self, hooks: Iterable[Callable[[Event], None]] = ()) -> None:
+        self.hooks: List[Callable[[Event], None]] = list(hooks)
+        self.requests: List[RequestTiming] = []
+        self.stages: List[StageTiming] = []
+
+    def request(self, timing: RequestTiming) -> None:
+        self.requests.append(timing)
+        self.__emit(timing)
+
+    @contextmanager
+    def stage(self, name: str, items_in: int) -> Iterator[List[int]]:
+        """Time a block of work .
+
+        Parameters
+        ----------
+        name : `str`
+            stage name, e.g. "parse" or "filter:language"
+        items_in : `int`
+            number of items the block works on
+
+        Yields
+        ----------
+        out : `List[int]`
+            append the number of items the block produced, `items_in` if left empty
+
+        Usage
+        ----------
+        ``` python
+        with metrics.stage("filter:email", len(batch)) as out:
+            batch = [ad for ad in batch if ad.emails]
+            out.append(len(batch))
+        ```
+        """
+        out: List[int] = []
+        cpu, wall = time.process_time(), time.perf_counter()
+        try:
+            yield out
+        finally:
+            timing = StageTiming(
+                name, items_in, out[-1] if out else items_in,
+                time.process_time() - cpu, time.perf_counter() - wall, datetime.now())
+            self.stages.append(timing)
+            self.__emit(timing)
+
+    def prometheus(self) -> str:
+        fetched = [r for r in self.requests if not r.cached]
+        statuses: Dict[int, int] = {}
+        for r in fetched:
+            statuses[r.status] = statuses.get(r.status, 0) + 1
+        lines = [
+            "# HELP jobget_requests_total Requests sent to the API by status, 0 for transport errors",
+            "# TYPE jobget_requests_total counter",
+            *(f'jobget_requests_total{{status="{s}"}} {n}' for s, n in sorted(statuses.items())),
+            "# HELP jobget_retries_total Request attempts after the first for the same page",
+            "# TYPE jobget_retries_total counter",
+            f"jobget_retries_total {sum(1 for r in fetched if r.attempt > 0)}",
+            "# HELP jobget_cache_hits_total Pages served from the response cache",
+            "# TYPE jobget_cache_hits_total counter",
+            f"jobget_cache_hits_total {len(self.requests) - len(fetched)}",
+            "# HELP jobget_response_bytes_total Response bytes received from the API",
+            "# TYPE jobget_response_bytes_total counter",
+            f"jobget_response_bytes_total {sum(r.bytes for r in fetched)}",
+        ]
+        for phase, text in (
+                ("total", "Seconds per request"),
+                ("connect", "Seconds opening connections, DNS and TLS included"),
+                ("ttfb", "Seconds to the first response byte"),
+                ("download", "Seconds receiving response bodies"),
+                ("server_query", "Query time reported by the API")):
+            values = [v for v in (self.__phase(r, phase) for r in fetched) if v is not None]
+            lines += [
+                f"# HELP jobget_request_{phase}_seconds {text}",
+                f"# TYPE jobget_request_{phase}_seconds summary",
+                f"jobget_request_{phase}_seconds_sum {sum(values):.6f}",
+                f"jobget_request_{phase}_seconds_count {len(values)}",
+            ]
+        lines += [
+            "# HELP jobget_stage_cpu_seconds CPU seconds spent in this process per stage",
+            "# TYPE jobget_stage_cpu_seconds counter",
+        ]
+        by_stage: Dict[str, List[StageTiming]] = {}
+        for s in self.stages:
+            by_stage.setdefault(s.name, []).append(s)
+        for name, runs in sorted(by_stage.items()):
+            lines.append(f'jobget_stage_cpu_seconds{{stage="{name}"}} {sum(s.cpu for s in runs):.6f}')
+        lines += ["# HELP jobget_stage_wall_seconds Wall clock seconds per stage",
+                  "# TYPE jobget_stage_wall_seconds counter"]
+        for name, runs in sorted(by_stage.items()):
+            lines.append(f'jobget_stage_wall_seconds{{stage="{name}"}} {sum(s.wall for s in runs):.6f}')
+        lines += ["# HELP jobget_stage_items_total Items in and out per stage",
+                  "# TYPE jobget_stage_items_total counter"]
+        for name, runs in sorted(by_stage.items()):
+            lines.append(f'jobget_stage_items_total{{stage="{name}",direction="in"}} {sum(s.items_in for s in runs)}')
+            lines.append(f'jobget_stage_items_total{{stage="{name}",direction="out"}} {sum(s.items_out for s in runs)}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        fetched = [r for r in self.requests if not r.cached]
+        lines = []
+        if self.requests:
+            total = sum(r.total for r in fetched)
+            server = sum(r.query_ms or 0 for r in fetched) / 1000
+            lines.append(
+                f"API: {len(fetched)} requests ({sum(1 for r in fetched if r.attempt > 0)} retries, "
+                f"{len(self.requests) - len(fetched)} cached), {sum(r.bytes for r in fetched) / 2 ** 20:.1f} MiB, "
+                f"{total:.2f}s in requests of which {server:.2f}s reported by the API as query time")
+        by_stage: Dict[str, List[StageTiming]] = {}
+        for s in self.stages:
+            by_stage.setdefault(s.name, []).append(s)
+        for name, runs in by_stage.items():
+            lines.append(
+                f"{name}: {sum(s.items_in for s in runs)} in, {sum(s.items_out for s in runs)} out, "
+                f"{sum(s.cpu for s in runs):.2f}s CPU, {sum(s.wall for s in runs):.2f}s wall")
+        return "\n".join(lines)
+
+    @staticmethod
+    def __phase(r: RequestTiming, phase: str) -> Union[float, None]:
+        if phase == "server_query":
+            return r.query_ms / 1000 if r.query_ms is not None else None
+        return getattr(r, phase)
+
+    def __emit(self, event: Event) -> None:
+        for hook in self.hooks:
+            hook(event)
+
+
+class JsonLinesExporter():
+    """Hook appending every event to a file as a JSON line.
+
+        ...
+
+        Lines have a "type" of "request" or "stage" and the fields of the
+        event, times as ISO strings.
+    """
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.__file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event: Event) -> None:
+        kind = "request" if isinstance(event, RequestTiming) else "stage"
+        record = {"type": kind, **event._asdict(), "time": event.time.isoformat()}
+        self.__file.write(json.dumps(record) + "\n")
+        self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
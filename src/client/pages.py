@@ -0,0 +1,489 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+import httpx
+from ..schemas.schemas import *
+from .cache import ResponseCache
+from .metrics import Metrics, RequestTrace
+from .limits import AdaptiveLimit, TokenBucket, retry_after
+from .shards import ShardPlanner
+from typing import Dict, List, Any, Callable, Union, Tuple, AsyncGenerator, AsyncIterator, Sequence, TypeVar, Hashable
+
+T = TypeVar("T")
+
+
+async def merge(iterators: Sequence[AsyncIterator[T]], buffer: int = 0) -> AsyncGenerator[Tuple[int, T], None]:
+    """Yield the items of all iterators as they arrive, consumed concurrently .
+
+    Parameters
+    ----------
+    iterators : `Sequence[AsyncIterator[T]]`
+        iterators to consume, e.g. `iter_pages` of several schedulers
+    buffer : `int`
+        items read ahead before waiting for the consumer, unbounded if 0
+
+    Yields
+    ----------
+    index, item : `Tuple[int, T]`
+        index of the iterator and its item
+
+    Notes
+    ----------
+    The first exception raised by an iterator is raised here,
+    the other iterators are cancelled when the consumer stops
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    done = object()
+
+    async def drain(i: int, iterator: AsyncIterator[T]) -> None:
+        try:
+            async for item in iterator:
+                await queue.put((i, item, None))
+        except Exception as e:
+            await queue.put((i, done, e))
+            return
+        await queue.put((i, done, None))
+
+    tasks = [asyncio.create_task(drain(i, it)) for i, it in enumerate(iterators)]
+    finished = 0
+    try:
+        while finished < len(tasks):
+            i, item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                finished += 1
+                continue
+            yield i, item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class PageScheduler():
+    """Fetches every page of a query with retries.
+
+        ...
+
+        The first page is requested with the full page size and used both
+        for its hits and for the total, so no separate count request is sent.
+        Remaining pages are fetched concurrently, each retried with jittered
+        exponential backoff on transport errors, 429 and 5xx responses.
+        How many requests run at once is set by `concurrency`, how many
+        start per second by `bucket`. A Retry-After header pauses the bucket,
+        so every query sharing it waits.
+        The API pages no deeper than `max_offset`. Queries with more hits
+        are split by `planner` into shards that fit, fetched concurrently
+        and merged without duplicates; without a planner the hits out of
+        reach are counted in `truncated`.
+
+        Attributes
+        ----------
+        client : `httpx.AsyncClient`
+            client used to send requests
+        url : `str`
+            url for API endpoint
+        page_size : `int`
+            number of hits per page, the API allows at most 100
+        retries : `int`
+            number of retries per page after the first attempt
+        backoff : `float`
+            base delay in seconds for the backoff
+        max_backoff : `float`
+            upper bound in seconds for a single backoff delay
+        on_error : `Callable[[int, str], None] | None`
+            called with status code (0 for transport errors) and text
+            for every failed attempt
+        cache : `ResponseCache | None`
+            cache consulted before and filled after every request
+        refresh : `bool`
+            skip cache lookups but still store fresh pages
+        metrics : `Metrics | None`
+            receives the timing of every request attempt and cache hit
+        concurrency : `AdaptiveLimit | None`
+            limit on requests at once, adjusted to latency and 429/503 responses
+        bucket : `TokenBucket | None`
+            rate limit on requests started
+        max_retry_after : `float`
+            upper bound in seconds for honouring a Retry-After header
+        ad_url : `str`
+            url of the endpoint returning one ad by id, `/ad` next to `url` by default
+        max_offset : `int | None`
+            deepest offset the API allows, no limit if None
+        planner : `ShardPlanner | None`
+            splits queries with more hits than `reachable` into shards
+        reachable : `int | None`
+            most hits one query can page through
+        total : `int`
+            total reported by the API in the last fetch
+        missing : `List[int]`
+            offsets that could not be fetched in the last fetch,
+            only the first page for sharded queries
+        missing_shards : `List[Tuple[SearchParams, List[int]]]`
+            shards of the last fetch with pages that could not be fetched,
+            and their offsets within the shard
+        truncated : `int`
+            hits out of reach in the last fetch
+        shards : `List[SearchParams]`
+            shards of the last fetch, empty if it wasn't sharded
+
+        Methods
+        ----------
+        fetch : `(params: SearchParams) => PageResult`
+            fetch all pages for the given parameters
+        iter_pages : `(params: SearchParams) => AsyncGenerator[Tuple[int, dict], None]`
+            yield pages as they arrive
+        iter_until : `(params: SearchParams, stop: Callable[[dict], bool]) => AsyncGenerator[Tuple[int, dict], None]`
+            yield pages in order until `stop` is True
+        fetch_head : `(params: SearchParams, limit: int | None) => dict | None`
+            fetch the first page only
+        fetch_stats : `(params: SearchParams) => dict | None`
+            fetch the total and stats of a query without hits
+        fetch_ad : `(id: str) => dict | None`
+            fetch one full ad by id
+    """
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            url: str, *,
+            page_size: int = 100,
+            retries: int = 3,
+            backoff: float = 0.5,
+            max_backoff: float = 8.0,
+            on_error: Union[Callable[[int, str], None], None] = None,
+            cache: Union[ResponseCache, None] = None,
+            refresh: bool = False,
+            metrics: Union[Metrics, None] = None,
+            concurrency: Union[AdaptiveLimit, None] = None,
+            bucket: Union[TokenBucket, None] = None,
+            max_retry_after: float = 60.0,
+            ad_url: Union[str, None] = None,
+            max_offset: Union[int, None] = 2000,
+            planner: Union[ShardPlanner, None] = None
+            ) -> None:
+        self.client = client
+        self.url = url
+        self.page_size = page_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_error = on_error
+        self.cache = cache
+        self.refresh = refresh
+        self.metrics = metrics
+        self.concurrency = concurrency
+        self.bucket = bucket
+        self.max_retry_after = max_retry_after
+        self.ad_url = ad_url or f"{url.rstrip('/').rsplit('/', 1)[0]}/ad"
+        self.max_offset = max_offset
+        self.planner = planner
+        self.total: int = 0
+        self.missing: List[int] = []
+        self.missing_shards: List[Tuple[SearchParams, List[int]]] = []
+        self.truncated: int = 0
+        self.shards: List[SearchParams] = []
+
+    @property
+    def reachable(self) -> Union[int, None]:
+        return None if self.max_offset is None else self.max_offset + self.page_size
+
+    async def fetch(self, params: SearchParams) -> PageResult:
+        """Fetch all pages for the given parameters .
+
+        Parameters
+        ----------
+        params : `SearchParams`
+            parameters for the query, offset and limit are overridden
+
+        Returns
+        ----------
+        result : `PageResult`
+            fetched pages and the offsets that are still missing
+        """
+        pages = {offset: page async for offset, page in self.iter_pages(params)}
+        return PageResult(self.total, dict(sorted(pages.items())), self.missing)
+
+    async def iter_pages(self, params: SearchParams) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+        """Yield pages as soon as each response arrives .
+
+        The first page is always yielded first, the rest in completion order.
+        `total` and `missing` are updated while iterating. Pages of sharded
+        queries only hold hits not yielded before and get consecutive
+        offsets after the first page, pages their shards couldn't fetch are
+        in `missing_shards` rather than `missing`.
+
+        Parameters
+        ----------
+        params : `SearchParams`
+            parameters for the query, offset and limit are overridden
+
+        Yields
+        ----------
+        offset, page : `Tuple[int, dict]`
+            offset of the page and its raw JSON
+        """
+        self.total = 0
+        self.missing = []
+        self.missing_shards = []
+        self.truncated = 0
+        self.shards = []
+        first = await self._get(params, 0)
+        if first is None:
+            self.missing.append(0)
+            return
+        self.total = first['total']['value']
+        end = self.total
+        if self.reachable is not None and self.total > self.reachable:
+            if self.planner is not None:
+                async for item in self.__iter_shards(params, first):
+                    yield item
+                return
+            self.truncated = self.total - self.reachable
+            end = self.reachable
+        offsets = [i * self.page_size
+                   for i in range(1, math.ceil(end / self.page_size))]
+        tasks = [asyncio.ensure_future(self._page(params, o)) for o in offsets]
+        try:
+            yield 0, first
+            del first
+            for task in asyncio.as_completed(tasks):
+                offset, page = await task
+                if page is None:
+                    self.missing.append(offset)
+                else:
+                    yield offset, page
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.missing.sort()
+
+    async def iter_until(
+            self,
+            params: SearchParams,
+            stop: Callable[[Dict[str, Any]], bool]
+            ) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+        """Yield pages one at a time in offset order until `stop` is True .
+
+        Used when later pages are only needed if earlier ones didn't
+        contain what was looked for, e.g. with `sort=pubdate-desc`.
+        `total` and `missing` are updated while iterating,
+        iteration ends at the first page that could not be fetched.
+
+        Parameters
+        ----------
+        params : `SearchParams`
+            parameters for the query, offset and limit are overridden
+        stop : `Callable[[dict], bool]`
+            called with every page after it is yielded,
+            no more pages are fetched once it returns True
+
+        Yields
+        ----------
+        offset, page : `Tuple[int, dict]`
+            offset of the page and its raw JSON
+        """
+        self.total = 0
+        self.missing = []
+        self.missing_shards = []
+        self.truncated = 0
+        offset = 0
+        while True:
+            page = await self._get(params, offset)
+            if page is None:
+                self.missing.append(offset)
+                return
+            self.total = page['total']['value']
+            yield offset, page
+            offset += self.page_size
+            if offset >= self.total or stop(page):
+                return
+            if self.max_offset is not None and offset > self.max_offset:
+                self.truncated = self.total - offset
+                return
+
+    async def __iter_shards(
+            self,
+            params: SearchParams,
+            first: Dict[str, Any]
+            ) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+        self.shards, unreachable = await self.planner.plan(self, params, self.total)
+        children = [self.__child() for _ in self.shards]
+        seen = {hit['id'] for hit in first['hits']}
+        yield 0, first
+        offset = 0
+        async for _, (_, page) in merge(
+                [child.iter_pages(shard) for child, shard in zip(children, self.shards)],
+                buffer=2 * len(children)):
+            hits = [hit for hit in page['hits'] if hit['id'] not in seen]
+            seen.update(hit['id'] for hit in hits)
+            offset += self.page_size
+            yield offset, {**page, 'hits': hits}
+        # offsets only mean something within their shard, keep them together
+        self.missing_shards = [(shard, child.missing) for child, shard in zip(children, self.shards) if child.missing]
+        # both date orders of one window each miss what the other reaches, the planner counted the rest
+        windows = [shard.copy(update={'sort': None}).json() for shard in self.shards]
+        self.truncated = unreachable + sum(
+            child.truncated for child, window in zip(children, windows) if windows.count(window) == 1)
+
+    def __child(self) -> "PageScheduler":
+        return PageScheduler(
+            self.client, self.url,
+            page_size=self.page_size, retries=self.retries, backoff=self.backoff,
+            max_backoff=self.max_backoff, on_error=self.on_error, cache=self.cache,
+            refresh=self.refresh, metrics=self.metrics, concurrency=self.concurrency,
+            bucket=self.bucket, max_retry_after=self.max_retry_after, ad_url=self.ad_url,
+            max_offset=self.max_offset)
+
+    async def fetch_head(self, params: SearchParams, limit: Union[int, None] = None) -> Union[Dict[str, Any], None]:
+        """Fetch only the first page of a query .
+
+        Parameters
+        ----------
+        params : `SearchParams`
+            parameters for the query, offset is overridden
+        limit : `int | None`
+            hits on the page, `page_size` if None
+
+        Returns
+        ----------
+        page : `dict | None`
+            raw JSON page, None if it could not be fetched
+        """
+        return await self._get(params, 0, limit=limit)
+
+    async def fetch_stats(self, params: SearchParams) -> Union[Dict[str, Any], None]:
+        """Fetch the total and stats of a query without any hits .
+
+        Sent with `limit=0`, so the response is a few hundred bytes
+        whatever the number of hits. Retried and cached like pages.
+
+        Parameters
+        ----------
+        params : `SearchParams`
+            parameters for the query, set `stats` and `stats_limit` for counts per value
+
+        Returns
+        ----------
+        page : `dict | None`
+            raw JSON response with no hits, None if it could not be fetched
+        """
+        return await self._get(params, 0, limit=0)
+
+    async def fetch_ad(self, id: str) -> Union[Dict[str, Any], None]:
+        """Fetch one full ad by id .
+
+        Retried, rate limited and cached like pages, the cache is keyed by id.
+
+        Parameters
+        ----------
+        id : `str`
+            id of the ad
+
+        Returns
+        ----------
+        ad : `dict | None`
+            raw ad, None if it could not be fetched or no longer exists
+        """
+        url = f"{self.ad_url}/{id}"
+        key = self.cache.ad_key(self.ad_url, id) if self.cache is not None else None
+        return await self._send(url, None, key, 0, 'ad')
+
+    async def _page(self, params: SearchParams, offset: int) -> Tuple[int, Union[Dict[str, Any], None]]:
+        return offset, await self._get(params, offset)
+
+    async def _get(
+            self,
+            params: SearchParams,
+            offset: int,
+            limit: Union[int, None] = None) -> Union[Dict[str, Any], None]:
+        query = params.copy(update={'offset': offset, 'limit': self.page_size if limit is None else limit})
+        key = self.cache.key(self.url, query) if self.cache is not None else None
+        # a count or a probe is much faster than a full page, their latencies aren't compared
+        return await self._send(self.url, query.dict(exclude_none=True, by_alias=True), key, offset, query.limit)
+
+    async def _send(
+            self,
+            url: str,
+            query: Union[Dict[str, Any], None],
+            key: Union[str, None],
+            offset: int,
+            kind: Hashable = None) -> Union[Dict[str, Any], None]:
+        if key is not None:
+            page = None if self.refresh else self.cache.get(key)
+            if page is not None:
+                self._record(offset, 0, 200, 0.0, None, 0, page, cached=True)
+                return page
+        wait = 0.0
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(max(self._delay(attempt), wait))
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            if self.concurrency is not None:
+                await self.concurrency.acquire()
+            trace = RequestTrace() if self.metrics else None
+            start = time.perf_counter()
+            elapsed, overloaded = None, False
+            try:
+                r = await self.client.get(
+                    url, params=query,
+                    extensions={'trace': trace} if trace else None)
+                elapsed = time.perf_counter() - start
+                overloaded = r.status_code in (429, 503)
+                page = r.json() if r.status_code == 200 else None
+            except httpx.HTTPError as e:
+                self._record(offset, attempt, 0, time.perf_counter() - start, trace, 0, None)
+                self._error(0, f"offset {offset}: {e!r}")
+                continue
+            except ValueError as e:
+                # a 200 with a cut off or garbled body, e.g. from a proxy, is worth another try
+                self._record(offset, attempt, r.status_code, elapsed, trace, len(r.content), None)
+                self._error(0, f"offset {offset}: invalid JSON: {e}")
+                continue
+            finally:
+                if self.concurrency is not None:
+                    self.concurrency.release(elapsed, overloaded, kind)
+            wait = min(retry_after(r.headers.get('retry-after')) or 0.0, self.max_retry_after)
+            if wait and self.bucket is not None:
+                self.bucket.pause(wait)
+            self._record(offset, attempt, r.status_code, elapsed, trace, r.num_bytes_downloaded or len(r.content), page)
+            if page is not None:
+                if key is not None:
+                    self.cache.set(key, page)
+                return page
+            self._error(r.status_code, r.text)
+            if r.status_code < 500 and r.status_code != 429:
+                return None
+        return None
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _record(
+            self,
+            offset: int,
+            attempt: int,
+            status: int,
+            elapsed: float,
+            trace: Union[RequestTrace, None],
+            size: int,
+            page: Union[Dict[str, Any], None],
+            cached: bool = False) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.request(RequestTiming(
+            offset, attempt, status, elapsed,
+            trace.connect if trace else None,
+            trace.ttfb if trace else None,
+            trace.download if trace else None,
+            size,
+            page.get('query_time_in_millis') if page else None,
+            page.get('result_time_in_millis') if page else None,
+            cached, datetime.now()))
+
+    def _error(self, code: int, text: str) -> None:
+        if self.on_error:
+            self.on_error(code, text)
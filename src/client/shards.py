@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta
+from ..schemas.schemas import *
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from .pages import PageScheduler
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class ShardPlanner():
+    """Splits a query into shards small enough to page through completely.
+
+        ...
+
+        The API only pages to a maximum offset, so a query with more hits
+        than `PageScheduler.reachable` can't be fetched in one go. The query
+        is split along `dimensions` first, using the counts of one `stats`
+        request per dimension, as long as the values add up to the total
+        (every ad has exactly one). Shards still too big, or queries with
+        ads outside every value, are split into publication date windows
+        by bisection, counted with `limit=0` requests. A window that can't
+        be split any more is fetched in both date orders, which reaches
+        twice as deep. Windows overlap by a second, hits are deduplicated
+        by id when merged.
+
+        Attributes
+        ----------
+        dimensions : `Sequence[str]`
+            facets to split along before dates, in order
+        stats_limit : `int`
+            values requested per dimension, must cover all of them
+        min_window : `timedelta`
+            shortest publication date window that is split further
+
+        Methods
+        ----------
+        plan : `(scheduler: PageScheduler, params: SearchParams, total: int) => Tuple[List[SearchParams], int]`
+            shards covering every hit of the query, and the hits windows read in both orders miss
+    """
+    def __init__(
+            self,
+            dimensions: Sequence[str] = ("region", "municipality"),
+            stats_limit: int = 500,
+            min_window: timedelta = timedelta(seconds=2)
+            ) -> None:
+        self.dimensions = dimensions
+        self.stats_limit = stats_limit
+        self.min_window = min_window
+
+    async def plan(
+            self,
+            scheduler: "PageScheduler",
+            params: SearchParams,
+            total: int
+            ) -> Tuple[List[SearchParams], int]:
+        """Shards covering every hit of the query .
+
+        Parameters
+        ----------
+        scheduler : `PageScheduler`
+            scheduler sending the count requests, its `reachable` is the shard size
+        params : `SearchParams`
+            parameters of the query
+        total : `int`
+            total hits of the query
+
+        Returns
+        ----------
+        shards, unreachable : `Tuple[List[SearchParams], int]`
+            shards : `List[SearchParams]`
+                parameters of every shard, each with at most `reachable` hits where possible
+            unreachable : `int`
+                hits neither date order of a window too short to split reaches,
+                other shards report what they can't reach when fetched
+
+        Notes
+        ----------
+        Keeps no state between calls, one planner can plan many queries at once
+        """
+        return await self.__split(scheduler, params, total, list(self.dimensions), None)
+
+    async def __split(
+            self,
+            s: "PageScheduler",
+            params: SearchParams,
+            total: int,
+            dimensions: List[str],
+            span: Union[Tuple[datetime, datetime], None]
+            ) -> Tuple[List[SearchParams], int]:
+        if s.reachable is None or total <= s.reachable:
+            return [params], 0
+        for i, dimension in enumerate(dimensions):
+            if getattr(params, dimension):
+                continue
+            values = await self.__values(s, params, dimension)
+            if values and sum(v.count for v in values) == total:
+                rest = dimensions[i + 1:]
+                parts = await asyncio.gather(*(
+                    self.__split(s, params.copy(update={dimension: [v.concept_id]}), v.count, rest, None)
+                    for v in values))
+                return self.__join(parts)
+        span = span or await self.__span(s, params)
+        if span is None:
+            # fetched whole, its scheduler reports what it can't reach
+            return [params], 0
+        lo, hi = span
+        if hi - lo <= self.min_window:
+            return ([params.copy(update={'sort': 'pubdate-desc'}), params.copy(update={'sort': 'pubdate-asc'})],
+                    max(0, total - 2 * s.reachable))
+        mid = lo + (hi - lo) / 2
+        halves = [(lo, mid), (mid, hi)]
+        windows = [self.__window(params, a, b) for a, b in halves]
+        counts = await asyncio.gather(*(s.fetch_stats(w) for w in windows))
+        parts = await asyncio.gather(*(
+            self.__split(s, w, page['total']['value'], [], half) if page is not None else self.__failed(w)
+            for w, half, page in zip(windows, halves, counts)))
+        return self.__join(parts)
+
+    @staticmethod
+    def __join(parts: List[Tuple[List[SearchParams], int]]) -> Tuple[List[SearchParams], int]:
+        return [shard for shards, _ in parts for shard in shards], sum(unreachable for _, unreachable in parts)
+
+    @staticmethod
+    async def __failed(params: SearchParams) -> Tuple[List[SearchParams], int]:
+        # not counted, fetch it whole and let the scheduler report what it can't reach
+        return [params], 0
+
+    async def __values(self, s: "PageScheduler", params: SearchParams, dimension: str) -> List[QStatDetail]:
+        page = await s.fetch_stats(params.copy(update={'stats': dimension, 'stats_limit': self.stats_limit}))
+        if page is None:
+            return []
+        stats = next((st for st in QueryResponse(**page).stats or [] if st.type == dimension), None)
+        return stats.values if stats else []
+
+    @staticmethod
+    async def __span(s: "PageScheduler", params: SearchParams) -> Union[Tuple[datetime, datetime], None]:
+        newest, oldest = await asyncio.gather(
+            s.fetch_head(params.copy(update={'sort': 'pubdate-desc'}), limit=1),
+            s.fetch_head(params.copy(update={'sort': 'pubdate-asc'}), limit=1))
+        if not newest or not oldest or not newest['hits'] or not oldest['hits']:
+            return None
+        return (datetime.fromisoformat(oldest['hits'][0]['publication_date']),
+                datetime.fromisoformat(newest['hits'][0]['publication_date']))
+
+    @staticmethod
+    def __window(params: SearchParams, start: datetime, end: datetime) -> SearchParams:
+        # a second of overlap on both sides, whether the API bounds are inclusive or not
+        return params.copy(update={
+            'published_after': (start - timedelta(seconds=1)).strftime(DATE_FORMAT),
+            'published_before': (end + timedelta(seconds=1)).strftime(DATE_FORMAT),
+        })
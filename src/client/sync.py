@@ -0,0 +1,65 @@
+import json
+import os
+from ..schemas.schemas import *
+from .cache import ResponseCache
+from typing import Dict, Any, Tuple, Iterator, Union
+
+
+class SyncStore():
+    """Stores synced ads and sync state per query on disk.
+
+        ...
+
+        Each query is kept in `<path>/<key>.json` holding its `SyncState`
+        and the raw ads seen so far keyed by `Ad.id`.
+
+        Attributes
+        ----------
+        path : `str`
+            directory holding one file per query
+
+        Methods
+        ----------
+        key : `(url: str, params: SearchParams) => str`
+            key for a query, independent of offset, limit and sort
+        load : `(key: str) => Tuple[SyncState | None, Dict[str, dict]]`
+            stored state and raw ads for a query
+        save : `(key: str, state: SyncState, ads: Dict[str, dict]) => None`
+            atomically replace stored state and ads
+        iter_ads : `(key: str) => Iterator[Ad]`
+            validated stored ads for a query
+    """
+    def __init__(self, path: str = "results/sync") -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params: SearchParams) -> str:
+        return ResponseCache.key(url, params.copy(update={'offset': None, 'limit': None, 'sort': None}))
+
+    def load(self, key: str) -> Tuple[Union[SyncState, None], Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self.__file(key), encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return None, {}
+        return SyncState(**stored['state']), stored['ads']
+
+    def save(self, key: str, state: SyncState, ads: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self.__file(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write('{"state": ')
+            f.write(state.json())
+            f.write(', "ads": ')
+            json.dump(ads, f, ensure_ascii=False)
+            f.write('}')
+        os.replace(tmp, self.__file(key))
+
+    def iter_ads(self, key: str) -> Iterator[Ad]:
+        _, ads = self.load(key)
+        for hit in ads.values():
+            yield Ad(**hit)
+
+    def __file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
@@ -0,0 +1,66 @@
+import asyncio
+import httpx
+from .jobget import JobGetClient
+from .fake import make_ad
+from .metrics import Metrics
+
+# every query returns 300 ads, "b" overlaps "a" by 100 and "c" by 200
+STARTS = {'a': 0, 'b': 200, 'c': 100}
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    total = 300
+    start = STARTS[request.url.params['q']]
+    offset = int(request.url.params['offset'])
+    limit = int(request.url.params['limit'])
+    if request.url.params['q'] == 'c' and offset == 200:
+        return httpx.Response(404, text="not found")
+    hits = [make_ad(start + i) for i in range(offset, min(offset + limit, total))]
+    return httpx.Response(200, json={
+        'total': {'value': total}, 'positions': total,
+        'query_time_in_millis': 1, 'result_time_in_millis': 1, 'hits': hits})
+
+
+def run(client, queries, **kwargs):
+    async def go():
+        async with client:
+            return [ad async for ad in client.iter_batch(queries, **kwargs)]
+    return asyncio.run(go())
+
+
+class TestBatch:
+    def test_dedup_and_matched_queries(self):
+        metrics = Metrics()
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(handler), metrics=metrics)
+        ads = run(client, [{'q': 'a'}, {'q': 'b'}, {'q': 'c'}, {'q': 'a'}])
+        assert sorted(int(ad.id) for ad in ads) == list(range(500))
+        by_id = {int(ad.id): sorted(ad.matched_queries) for ad in ads}
+        assert by_id[0] == ['a']
+        assert by_id[150] == ['a', 'c']
+        assert by_id[250] == ['a', 'b', 'c']
+        # page 200-299 of "c" is missing
+        assert by_id[350] == ['b']
+        # only unique ads are parsed
+        assert sum(s.items_in for s in metrics.stages if s.name == 'parse') == 500
+        assert client.status.missing_by_query == {'c': [200]}
+        assert not client.status.ok
+
+    def test_same_q_with_other_filters(self):
+        regions = []
+
+        def filtered(request):
+            regions.append(tuple(request.url.params.get_list('region')))
+            return handler(request)
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(filtered))
+        ads = run(client, [{'q': 'a'}, {'q': 'a', 'region': ['01']}, {'q': 'a', 'region': ['01']}])
+        # both queries are fetched once, ads are labelled by q
+        assert sorted(regions) == [()] * 3 + [('01',)] * 3
+        assert len(ads) == 300 and all(ad.matched_queries == ['a'] for ad in ads)
+
+    def test_compact(self):
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(handler))
+        ads = run(client, [{'q': 'a'}, {'q': 'b'}], compact=True)
+        assert len(ads) == 500
+        ad = next(ad for ad in ads if ad.id == '250')
+        assert sorted(ad.matched_queries) == ['a', 'b']
+        assert sorted(ad.dict()['matched_queries']) == ['a', 'b']
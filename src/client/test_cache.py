@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+import httpx
+from .cache import ResponseCache
+from .pages import PageScheduler
+from ..schemas.schemas import SearchParams
+
+
+URL = 'http://test/search'
+
+
+class TestResponseCache:
+    def test_key_normalized(self):
+        a = SearchParams(q="python", municipality=["b", "a"], offset=0, limit=100)
+        b = SearchParams(q="python", municipality=["a", "b"], offset=0, limit=100)
+        c = SearchParams(q="python", municipality=["a", "b"], offset=100, limit=100)
+        assert ResponseCache.key(URL, a) == ResponseCache.key(URL, b)
+        assert ResponseCache.key(URL, a) != ResponseCache.key(URL, c)
+
+    def test_ttl(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "c.sqlite"), ttl=-1)
+        cache.set("k", {"a": 1})
+        assert cache.get("k") is None
+
+    def test_lru_eviction(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "c.sqlite"))
+        cache.set("a", {"v": "x" * 100})
+        cache.max_size = cache.db.execute("SELECT size FROM pages").fetchone()[0] * 2
+        cache.set("b", {"v": "y" * 100})
+        cache.get("a")
+        cache.set("c", {"v": "z" * 100})
+        assert cache.get("a") == {"v": "x" * 100}
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_access_times_batched(self, tmp_path):
+        path = str(tmp_path / "c.sqlite")
+        cache = ResponseCache(path, flush_every=3)
+        for key in "abc":
+            cache.set(key, {"v": key})
+        reader = sqlite3.connect(path)
+        reader.execute("UPDATE pages SET accessed = 0")
+        reader.commit()
+        accessed = lambda: dict(reader.execute("SELECT key, accessed FROM pages").fetchall())
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")
+        # a hit is a read, nothing is written until enough pages were hit
+        assert not cache.db.in_transaction and accessed() == {"a": 0, "b": 0, "c": 0}
+        cache.get("c")
+        assert min(accessed().values()) > 0
+        reader.execute("UPDATE pages SET accessed = 0")
+        reader.commit()
+        cache.get("b")
+        cache.close()
+        assert accessed() == {"a": 0, "b": accessed()["b"], "c": 0} and accessed()["b"] > 0
+
+    def test_scheduler_uses_cache(self, tmp_path):
+        calls = []
+        def handler(request):
+            calls.append(request.url.params['offset'])
+            return httpx.Response(200, json={'total': {'value': 150}, 'hits': []})
+        cache = ResponseCache(str(tmp_path / "c.sqlite"))
+        async def run(refresh):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                scheduler = PageScheduler(client, URL, cache=cache, refresh=refresh)
+                return await scheduler.fetch(SearchParams(q="python"))
+        first = asyncio.run(run(False))
+        assert asyncio.run(run(False)) == first
+        assert len(calls) == 2
+        asyncio.run(run(True))
+        assert len(calls) == 4
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import httpx
+import pytest
+from datetime import datetime, timedelta
+from .daemon import Daemon, load_queries
+from ..schemas.schemas import SavedQuery
+
+
+def saved(name, interval=60, **args):
+    return SavedQuery(name=name, queries=[name], interval=interval, args=args)
+
+
+class TestDaemon:
+    def test_coalesce_and_state(self, tmp_path):
+        runs = []
+
+        async def run(args):
+            runs.append(args)
+            if 'fail' in args['queries']:
+                raise ValueError("bad query")
+
+        queries = [saved('python'), saved('rust'), saved('java', lang=['en']), saved('fail', 120, sync=True)]
+        path = str(tmp_path / "daemon.json")
+        daemon = Daemon(queries, run, state_path=path, coalesce=5)
+        now = datetime.now()
+        groups = asyncio.run(daemon.tick(now))
+
+        assert [[q.name for q in g] for g in groups] == [['python', 'rust'], ['java'], ['fail']]
+        assert runs[0] == {'refresh': True, 'queries': ['python', 'rust']}
+        assert runs[1]['lang'] == ['en']
+        assert daemon.state['python'].runs == 1 and daemon.state['python'].last_error is None
+        assert daemon.state['fail'].failures == 1 and "bad query" in daemon.state['fail'].last_error
+        assert daemon.state['fail'].next_run > daemon.state['python'].next_run
+
+        # nothing is due until the interval has passed, restarts keep the schedule
+        assert asyncio.run(daemon.tick(now + timedelta(seconds=30))) == []
+        restarted = Daemon(queries, run, state_path=path, coalesce=5)
+        assert restarted.state == daemon.state
+        assert len(asyncio.run(restarted.tick(now + timedelta(seconds=61)))) == 2
+        assert restarted.state['python'].runs == 2
+
+    def test_run_forever_and_endpoint(self, tmp_path):
+        runs = []
+
+        async def run(args):
+            runs.append(args)
+
+        daemon = Daemon(
+            [saved('python', 0.05)], run,
+            state_path=str(tmp_path / "daemon.json"), jitter=0.01, coalesce=0)
+
+        async def go():
+            server = await daemon.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            task = asyncio.create_task(daemon.run_forever())
+            while len(runs) < 3:
+                await asyncio.sleep(0.01)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+                health = await http.get("/health")
+                status = await http.get("/status")
+                missing = await http.get("/metrics")
+            daemon.stop()
+            await task
+            stopped = daemon.health()
+            server.close()
+            await server.wait_closed()
+            return health, status, missing, stopped
+        health, status, missing, stopped = asyncio.run(go())
+
+        assert health.status_code == 200 and health.json()['ok']
+        assert status.json()['python']['runs'] >= 3
+        assert missing.status_code == 404
+        assert stopped[0] is False
+
+    def test_load_queries(self, tmp_path):
+        path = tmp_path / "queries.json"
+        path.write_text(json.dumps([
+            {'name': 'python', 'queries': ['python', 'django'], 'interval': 3600, 'args': {'lang': ['en']}}]))
+        assert load_queries(str(path))[0].queries == ['python', 'django']
+        path.write_text(json.dumps([{'name': 'a', 'queries': ['a'], 'interval': 1}] * 2))
+        with pytest.raises(ValueError):
+            load_queries(str(path))
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from .jobget import JobGetClient
+from .cache import ResponseCache
+from .fake import FakeJobTech
+from .metrics import Metrics
+
+
+def run(client, *args, **kwargs):
+    async def go():
+        async with client:
+            return await client.facets(*args, **kwargs)
+    return asyncio.run(go())
+
+
+class TestFacets:
+    def test_counts_without_hits(self, tmp_path):
+        api = FakeJobTech(600)
+        metrics = Metrics()
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        client = JobGetClient(url='http://test/search', transport=api.transport(), cache=cache, metrics=metrics)
+        total, counts, missing = run(client, ["region", "occupation-field"], {'q': 'python'}, limit=3)
+        assert total == 600 and missing == []
+        assert list(counts) == ["region", "occupation-field"]
+        assert [v.term for v in counts["region"]] == [v['term'] for v in api.stats("region", 3)['values']]
+        assert [v.count for v in counts["region"]] == sorted((v.count for v in counts["region"]), reverse=True)
+        # one request per dimension, every one without hits
+        assert api.requests == 2
+        assert sorted(r.bytes for r in metrics.requests)[-1] < 2000
+        run(client, ["region"], {'q': 'python'}, limit=3)
+        assert api.requests == 2
+
+    def test_all_and_unknown(self):
+        api = FakeJobTech(100)
+        client = JobGetClient(url='http://test/search', transport=api.transport())
+        total, counts, _ = run(client, params={'q': 'python'})
+        assert len(counts) == 6
+        assert sum(v.count for v in counts["country"]) == total == 100
+        with pytest.raises(ValueError):
+            run(client, ["salary"], {'q': 'python'})
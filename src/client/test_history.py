@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from .cache import ResponseCache
+from .fake import FakeJobTech
+from .history import ClientHistory
+from .jobget import JobGetClient
+from ..schemas.schemas import HistoryEntry
+
+
+class TestHistory:
+    def test_spill_and_replay(self, tmp_path):
+        path = str(tmp_path / "history.ndjson")
+        history = ClientHistory(3, path, max_bytes=400)
+        for i in range(20):
+            history.append(HistoryEntry(kind='params', value={'q': f"q{i}"}))
+
+        assert len(history) == 3 and history.spilled == 17
+        assert [p.q for p in history.params] == ['q17', 'q18', 'q19']
+        # rotation keeps the log and the one before, older entries are gone
+        replayed = [e.value['q'] for e in history.replay()]
+        assert replayed[-3:] == ['q17', 'q18', 'q19']
+        assert replayed == [f"q{i}" for i in range(20 - len(replayed), 20)]
+        assert len(replayed) < 20
+        assert (tmp_path / "history.ndjson.1").exists()
+
+    def test_without_path_drops_oldest(self):
+        history = ClientHistory(2)
+        for error in "abc":
+            history.append(HistoryEntry(kind='error', error=error))
+        assert history.errors == ['b', 'c']
+        assert [e.error for e in history.replay()] == ['b', 'c']
+        with pytest.raises(ValueError):
+            ClientHistory(0)
+
+    def test_client_keeps_cache_keys(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        client = JobGetClient(
+            url='http://test/search', transport=FakeJobTech(250).transport(), cache=cache, history_size=5)
+
+        async def go():
+            for i in range(10):
+                client.set_params({'q': f"python {i}"})
+                await client.exec()
+        asyncio.run(go())
+
+        assert len(client.history) == 5
+        assert client.history.spilled == 14
+        response = client.history.responses[-1]
+        assert response.total == 250 and response.missing == 0
+        assert cache.get(response.key)['total']['value'] == 250
+        assert client.history.params[-1].q == "python 8"
@@ -0,0 +1,40 @@
+import asyncio
+from .jobget import JobGetClient
+from .cache import ResponseCache
+from .fake import FakeJobTech, BRIEF_FIELDS
+
+
+def run(client, gen):
+    async def go():
+        async with client:
+            return [x async for x in gen()]
+    return asyncio.run(go())
+
+
+class TestBriefAndHydrate:
+    def test_two_phase(self, tmp_path):
+        api = FakeJobTech(500)
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        client = JobGetClient(url='http://test/search', transport=api.transport(), cache=cache)
+        hits = run(client, lambda: client.iter_brief({'q': 'python'}))
+        assert len(hits) == 500 and set(hits[0]) == set(BRIEF_FIELDS)
+        brief_bytes = api.bytes
+        keep = [hit for hit in hits if hit['headline'].startswith("Kock")]
+        ads = run(client, lambda: client.hydrate(keep))
+        assert sorted(ad.id for ad in ads) == sorted(hit['id'] for hit in keep)
+        assert ads[0].description.text
+        assert api.requests == 5 + len(keep)
+        # only the kept ads were downloaded in full
+        assert api.bytes - brief_bytes < brief_bytes
+
+    def test_cached_by_id_and_missing(self, tmp_path):
+        api = FakeJobTech(100)
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        client = JobGetClient(url='http://test/search', transport=api.transport(), cache=cache)
+        ads = run(client, lambda: client.hydrate(["1", "2", "2", "999"], window=2))
+        assert sorted(ad.id for ad in ads) == ["1", "2"]
+        assert client.status.missing_ids == ["999"]
+        requests = api.requests
+        assert len(run(client, lambda: client.hydrate(["2", "1"], compact=True))) == 2
+        assert api.requests == requests
+        assert client.status.missing_ids == []
@@ -1,9 +1,48 @@
-import jobget
-import nose
+import asyncio
+from .jobget import JobGetClient, NoParameterFound
+from .fake import FakeJobTech
+
 
 class TestJobget:
     def test_get(self):
-        client = jobget.Client()
-        client.exec()
-        #should raise error since no params
-        assert client.status.code == 3
+        client = JobGetClient()
+        data, status, e = asyncio.run(client.exec())
+        #should return error since no params
+        assert data is None
+        assert isinstance(e, NoParameterFound)
+
+    def test_exec(self):
+        api = FakeJobTech(total=250)
+        client = JobGetClient(url='http://test/search', transport=api.transport())
+        client.set_params({'q': 'python'})
+        async def run():
+            async with client:
+                return await client.exec()
+        data, status, e = asyncio.run(run())
+        assert e is None and status.ok
+        assert [hit.id for hit in data.hits] == [str(i) for i in range(250)]
+        assert api.requests == 3
+
+    def test_filter_emails(self):
+        api = FakeJobTech(total=100)
+        client = JobGetClient(url='http://test/search', transport=api.transport())
+        client.set_params({'q': 'python'})
+        async def run():
+            async with client:
+                return await client.exec()
+        data, _, _ = asyncio.run(run())
+        client.filter_emails()
+        expected = [hit.id for hit in data.hits if hit.application_details.email]
+        assert 0 < len(expected) < 100
+        assert [ad.id for ad in client.result] == expected
+
+    def test_retries_errors(self):
+        api = FakeJobTech(total=500, error_rate=0.3, seed=1)
+        client = JobGetClient(url='http://test/search', transport=api.transport())
+        client.set_params({'q': 'python'})
+        async def run():
+            async with client:
+                return await client.exec()
+        data, status, e = asyncio.run(run())
+        assert api.errors > 0
+        assert len(data.hits) == 500 - 100 * len(status.missing)
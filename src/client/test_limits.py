@@ -0,0 +1,115 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import httpx
+from .jobget import JobGetClient
+from .fake import FakeJobTech
+from .limits import AdaptiveLimit, TokenBucket, retry_after
+
+
+def test_retry_after():
+    now = datetime(2026, 10, 1, 12, tzinfo=timezone.utc)
+    assert retry_after("3") == 3.0
+    assert retry_after(format_datetime(now + timedelta(seconds=30), usegmt=True), now) == 30.0
+    assert retry_after(format_datetime(now - timedelta(seconds=30), usegmt=True), now) == 0.0
+    assert retry_after(None) is None
+    assert retry_after("soon") is None
+
+
+def test_bucket_pacing_and_pause():
+    bucket = TokenBucket(rate=100, burst=2)
+    assert bucket.reserve() == bucket.reserve() == 0.0
+    assert 0.005 < bucket.reserve() <= 0.01
+    bucket.pause(1.0)
+    assert bucket.reserve() > 0.9
+
+
+def test_aimd():
+    limit = AdaptiveLimit(2, 1, 8)
+
+    async def cycle(latency, overloaded=False):
+        await limit.acquire()
+        limit.release(latency, overloaded)
+    for _ in range(3):
+        asyncio.run(cycle(0.01))
+    assert limit.limit == 5
+    before = limit.limit
+    asyncio.run(cycle(0.01, overloaded=True))
+    assert limit.limit == before / 2
+    # one burst of errors only halves once
+    asyncio.run(cycle(0.01, overloaded=True))
+    assert limit.limit == before / 2
+    time.sleep(0.05)
+    asyncio.run(cycle(0.01, overloaded=True))
+    assert limit.limit == before / 4
+    # additive increase after the first decrease
+    asyncio.run(cycle(0.01))
+    assert limit.limit == before / 4 + 1 / (before / 4)
+    # far above the lowest latency counts as overloaded
+    time.sleep(0.05)
+    limit.limit = 4.0
+    asyncio.run(cycle(0.05))
+    assert limit.limit == 2.0
+
+
+def test_baseline_per_kind_and_window():
+    limit = AdaptiveLimit(4, 1, 8, window=3)
+
+    async def cycle(latency, kind=None):
+        await limit.acquire()
+        limit.release(latency, kind=kind)
+    asyncio.run(cycle(0.001, kind=0))
+    before = limit.limit
+    # a full page is slower than a count without being slow
+    asyncio.run(cycle(0.02, kind=100))
+    assert limit.limit > before
+    assert limit.baseline(0) == 0.001 and limit.baseline(100) == 0.02
+    # the baseline follows the last `window` latencies, a fast spell is forgotten
+    for latency in (0.001, 0.01, 0.01, 0.01):
+        asyncio.run(cycle(latency, kind=100))
+    assert limit.baseline(100) == 0.01
+
+
+def test_fast_request_before_full_pages():
+    # a facets count, then a fetch, pages take far longer than the count without being slow
+    limit = AdaptiveLimit(4, 1, 10)
+
+    async def go():
+        await limit.acquire()
+        limit.release(0.001, kind=0)
+        for _ in range(20):
+            await limit.acquire()
+            limit.release(0.02, kind=100)
+    asyncio.run(go())
+    assert limit.limit == 10
+
+
+def test_concurrency_capped_and_429_retried():
+    api = FakeJobTech(1000)
+    state = {"in_flight": 0, "max": 0, "throttled": 0}
+
+    async def handler(request):
+        state["in_flight"] += 1
+        state["max"] = max(state["max"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+            if state["throttled"] < 3:
+                state["throttled"] += 1
+                return httpx.Response(429, headers={"Retry-After": "0"}, text="slow down")
+            return await api.handler(request)
+        finally:
+            state["in_flight"] -= 1
+
+    async def go():
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(handler),
+                              max_connections=3, bucket=TokenBucket(rate=1000, burst=10))
+        async with client:
+            ads = [ad async for ad in client.iter_ads({'q': 'python'})]
+        return client, ads
+    client, ads = asyncio.run(go())
+    assert len(ads) == 1000
+    assert state["throttled"] == 3
+    assert state["max"] <= 3
+    assert client.concurrency.in_flight == 0
+    assert client.concurrency.limit < 3
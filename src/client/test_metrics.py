@@ -0,0 +1,63 @@
+import asyncio
+import json
+from .jobget import JobGetClient
+from .cache import ResponseCache
+from .fake import FakeJobTech
+from .metrics import JsonLinesExporter, Metrics, RequestTrace
+
+
+def run(client):
+    async def go():
+        async with client:
+            return [ad async for ad in client.iter_ads({'q': 'python'})]
+    return asyncio.run(go())
+
+
+class TestMetrics:
+    def test_requests_and_parse(self):
+        metrics = Metrics()
+        run(JobGetClient(url='http://test/search', transport=FakeJobTech(250).transport(), metrics=metrics))
+        assert sorted(r.offset for r in metrics.requests) == [0, 100, 200]
+        assert all(r.status == 200 and r.bytes > 0 and r.query_ms == 1 for r in metrics.requests)
+        parse = [s for s in metrics.stages if s.name == "parse"]
+        assert sum(s.items_in for s in parse) == sum(s.items_out for s in parse) == 250
+
+    def test_retries_and_cache(self, tmp_path):
+        metrics = Metrics()
+        api = FakeJobTech(500, error_rate=0.3, seed=1)
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        client = JobGetClient(url='http://test/search', transport=api.transport(), cache=cache, metrics=metrics)
+        client_ads = run(client)
+        assert sum(1 for r in metrics.requests if r.status == 503) == api.errors > 0
+        assert any(r.attempt > 0 for r in metrics.requests)
+        metrics.requests.clear()
+        assert len(run(client)) == len(client_ads)
+        assert all(r.cached for r in metrics.requests if r.status == 200)
+        assert "jobget_cache_hits_total" in metrics.prometheus()
+
+    def test_stage_and_exporters(self, tmp_path):
+        exporter = JsonLinesExporter(str(tmp_path / "metrics.ndjson"))
+        metrics = Metrics([exporter])
+        with metrics.stage("filter:email", 10) as out:
+            out.append(4)
+        exporter.close()
+        with open(tmp_path / "metrics.ndjson") as f:
+            [record] = [json.loads(line) for line in f]
+        assert record['type'] == "stage"
+        assert (record['name'], record['items_in'], record['items_out']) == ("filter:email", 10, 4)
+        text = metrics.prometheus()
+        assert 'jobget_stage_items_total{stage="filter:email",direction="out"} 4' in text
+        assert "filter:email: 10 in, 4 out" in metrics.summary()
+
+    def test_trace(self):
+        trace = RequestTrace()
+        events = ["connection.connect_tcp.started", "connection.connect_tcp.complete",
+                  "http11.send_request_headers.started", "http11.send_request_headers.complete",
+                  "http11.receive_response_headers.started", "http11.receive_response_headers.complete",
+                  "http11.receive_response_body.started", "http11.receive_response_body.complete"]
+        async def feed():
+            for event in events:
+                await trace(event, {})
+        asyncio.run(feed())
+        assert trace.connect >= 0 and trace.ttfb >= 0 and trace.download >= 0
+        assert RequestTrace().connect is None
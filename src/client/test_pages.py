@@ -0,0 +1,73 @@
+import asyncio
+import httpx
+from .pages import PageScheduler
+from ..schemas.schemas import SearchParams
+
+
+def make_handler(total, fail=None):
+    fail = fail or {}
+    calls = []
+    def handler(request: httpx.Request) -> httpx.Response:
+        offset = int(request.url.params['offset'])
+        limit = int(request.url.params['limit'])
+        calls.append(offset)
+        if fail.get(offset):
+            fail[offset] -= 1
+            return httpx.Response(503, text="unavailable")
+        hits = [{'id': str(i)} for i in range(offset, min(offset + limit, total))]
+        return httpx.Response(200, json={'total': {'value': total}, 'hits': hits})
+    return handler, calls
+
+
+def fetch(handler, **kwargs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            scheduler = PageScheduler(client, 'http://test/search', backoff=0, **kwargs)
+            return await scheduler.fetch(SearchParams(q="python"))
+    return asyncio.run(run())
+
+
+class TestPageScheduler:
+    def test_no_count_request(self):
+        handler, calls = make_handler(250)
+        result = fetch(handler)
+        assert sorted(calls) == [0, 100, 200]
+        assert result.total == 250
+        assert result.missing == []
+        assert sum(len(p['hits']) for p in result.pages.values()) == 250
+
+    def test_retries_server_errors(self):
+        handler, calls = make_handler(250, fail={100: 2})
+        result = fetch(handler)
+        assert result.missing == []
+        assert calls.count(100) == 3
+
+    def test_reports_missing_offsets(self):
+        errors = []
+        handler, _ = make_handler(350, fail={100: 10, 300: 10})
+        result = fetch(handler, retries=1, on_error=lambda c, t: errors.append(c))
+        assert result.missing == [100, 300]
+        assert list(result.pages) == [0, 200]
+        assert errors == [503] * 4
+
+    def test_retries_invalid_json(self):
+        handler, calls = make_handler(250)
+        broken = {100: 1, 200: 10}
+
+        def truncating(request):
+            offset = int(request.url.params['offset'])
+            response = handler(request)
+            if broken.get(offset):
+                broken[offset] -= 1
+                return httpx.Response(200, content=response.content[:20])
+            return response
+        errors = []
+        result = fetch(truncating, retries=2, on_error=lambda c, t: errors.append(t))
+        assert result.missing == [200]
+        assert list(result.pages) == [0, 100]
+        assert len(errors) == 4 and all("invalid JSON" in e for e in errors)
+
+    def test_first_page_failure(self):
+        handler, _ = make_handler(50, fail={0: 10})
+        result = fetch(handler, retries=0)
+        assert result == (0, {}, [0])
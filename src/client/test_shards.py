@@ -0,0 +1,79 @@
+import asyncio
+import httpx
+from datetime import timedelta
+from .jobget import JobGetClient
+from .pages import PageScheduler
+from ..schemas.schemas import SearchParams
+from .fake import FakeJobTech
+from .shards import ShardPlanner
+
+
+def run(client, params):
+    async def go():
+        async with client:
+            return [ad async for ad in client.iter_ads(params)]
+    return asyncio.run(go())
+
+
+class TestShards:
+    def test_by_region(self):
+        api = FakeJobTech(5000, max_offset=2000)
+        client = JobGetClient(url='http://test/search', transport=api.transport())
+        ads = run(client, {'q': 'python'})
+        assert len({ad.id for ad in ads}) == len(ads) == 5000
+        assert client.status.ok and client.status.truncated == 0
+
+    def test_by_date(self):
+        api = FakeJobTech(3000, max_offset=200)
+
+        async def go():
+            async with httpx.AsyncClient(transport=api.transport()) as http:
+                scheduler = PageScheduler(http, 'http://test/search', max_offset=200, planner=ShardPlanner(dimensions=()))
+                pages = [page async for _, page in scheduler.iter_pages(SearchParams(q='python'))]
+                return scheduler, pages
+        scheduler, pages = asyncio.run(go())
+        ids = [hit['id'] for page in pages for hit in page['hits']]
+        assert len(set(ids)) == len(ids) == 3000
+        assert scheduler.missing == [] and scheduler.truncated == 0
+        assert len(scheduler.shards) >= 3000 / 300
+        assert all(shard.published_after and shard.published_before for shard in scheduler.shards)
+
+    def test_without_planner_reports_truncation(self):
+        api = FakeJobTech(500, max_offset=200)
+        client = JobGetClient(url='http://test/search', transport=api.transport(), max_offset=200, planner=False)
+        ads = run(client, {'q': 'python'})
+        assert len(ads) == 300
+        assert client.status.truncated == 200 and not client.status.ok
+
+    def test_shared_planner_counts_per_query(self):
+        # a window too short to split is read in both orders, 600 of 1000 hits
+        planner = ShardPlanner(dimensions=(), min_window=timedelta(days=365))
+        client = JobGetClient(
+            url='http://test/search', transport=FakeJobTech(1000, max_offset=200).transport(),
+            max_offset=200, planner=planner)
+
+        async def go():
+            async with client:
+                return [ad async for ad in client.iter_batch([{'q': 'python'}, {'q': 'java'}, {'q': 'rust'}])]
+        asyncio.run(go())
+        assert client.status.truncated == 3 * 400
+
+    def test_missing_pages_per_shard(self):
+        api = FakeJobTech(3000, max_offset=2000)
+
+        async def handler(request):
+            if request.url.params.get('offset') == '100' and 'id-Skåne län' in request.url.params.get_list('region'):
+                return httpx.Response(503, text="unavailable")
+            return await api.handler(request)
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+                scheduler = PageScheduler(
+                    http, 'http://test/search', retries=0, max_offset=1000, planner=ShardPlanner(dimensions=('region',)))
+                [page async for page in scheduler.iter_pages(SearchParams(q='python'))]
+                return scheduler
+        scheduler = asyncio.run(go())
+        assert scheduler.missing == []
+        [(shard, offsets)] = scheduler.missing_shards
+        assert shard.region == ['id-Skåne län'] and offsets == [100]
+
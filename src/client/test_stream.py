@@ -0,0 +1,48 @@
+import asyncio
+import httpx
+from .jobget import JobGetClient
+from .fake import make_ad
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    total = 230
+    offset = int(request.url.params['offset'])
+    limit = int(request.url.params['limit'])
+    if offset == 100:
+        return httpx.Response(404, text="not found")
+    hits = [make_ad(i) for i in range(offset, min(offset + limit, total))]
+    return httpx.Response(200, json={
+        'total': {'value': total}, 'positions': total,
+        'query_time_in_millis': 1, 'result_time_in_millis': 1, 'hits': hits})
+
+
+class TestIterAds:
+    def test_iter_ads(self):
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(handler))
+        async def run():
+            async with client:
+                return [ad async for ad in client.iter_ads({'q': 'python'})]
+        ads = asyncio.run(run())
+        assert sorted(int(ad.id) for ad in ads) == list(range(100)) + list(range(200, 230))
+        assert client.status.missing == [100]
+        assert not client.status.ok
+
+    def test_pool_reused(self):
+        async def run():
+            async with JobGetClient(url='http://test/search',
+                                    transport=httpx.MockTransport(handler)) as client:
+                first = client._JobGetClient__http_client()
+                [ad async for ad in client.iter_ads({'q': 'a'})]
+                [ad async for ad in client.iter_ads({'q': 'b'})]
+                assert client._JobGetClient__http_client() is first
+            assert first.is_closed
+        asyncio.run(run())
+
+    def test_iter_ads_compact(self):
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(handler))
+        async def run():
+            async with client:
+                return [ad async for ad in client.iter_ads({'q': 'python'}, compact=True)]
+        ads = asyncio.run(run())
+        assert len(ads) == 130
+        assert all(ad.occupation is ads[0].occupation for ad in ads)
@@ -0,0 +1,59 @@
+import asyncio
+import httpx
+from datetime import datetime, timedelta
+from .jobget import JobGetClient
+from .sync import SyncStore
+from .fake import make_ad
+
+
+class FakeFeed:
+    def __init__(self, count):
+        self.ads = []
+        self.offsets = []
+        self.publish(count)
+
+    def publish(self, count):
+        start = len(self.ads)
+        for i in range(start, start + count):
+            ad = make_ad(i)
+            ad['publication_date'] = (datetime(2026, 1, 1) + timedelta(minutes=i)).isoformat()
+            self.ads.append(ad)
+
+    def handler(self, request):
+        offset = int(request.url.params['offset'])
+        limit = int(request.url.params['limit'])
+        assert request.url.params['sort'] == 'pubdate-desc'
+        self.offsets.append(offset)
+        hits = sorted(self.ads, key=lambda a: a['publication_date'], reverse=True)
+        return httpx.Response(200, json={
+            'total': {'value': len(hits)}, 'positions': len(hits),
+            'query_time_in_millis': 1, 'result_time_in_millis': 1,
+            'hits': hits[offset:offset + limit]})
+
+
+class TestSync:
+    def test_incremental(self, tmp_path):
+        feed = FakeFeed(450)
+        store = SyncStore(str(tmp_path))
+        client = JobGetClient(url='http://test/search', transport=httpx.MockTransport(feed.handler))
+        sync = lambda: asyncio.run(client.sync(store, {'q': 'python'}))
+
+        first = sync()
+        assert len(first.new) == 450
+        assert len(feed.offsets) == 5
+
+        feed.offsets.clear()
+        feed.publish(30)
+        feed.ads[10]['removed'] = True
+        second = sync()
+        assert sorted(int(ad.id) for ad in second.new) == list(range(450, 480))
+        assert second.removed == []
+        assert second.stored == 480
+        assert feed.offsets == [0]
+
+        feed.offsets.clear()
+        feed.ads[479]['removed'] = True
+        third = sync()
+        assert third.new == []
+        assert third.removed == ['479']
+        assert feed.offsets == [0]
@@ -0,0 +1,11 @@
+from typing import TYPE_CHECKING
+from ..util.lazy import lazy_exports
+
+__all__ = ["Outbox", "Attachments"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "Outbox": ".outbox",
+    "Attachments": ".outbox",
+})
+
+if TYPE_CHECKING:
+    from .outbox import Outbox, Attachments
@@ -0,0 +1,313 @@
+""" Outbox sending applications over a pool of reused SMTP connections
+"""
+import asyncio
+import json
+import os
+import random
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple, Union
+from ..schemas.schemas import *
+
+
+class Attachments():
+    """CV and cover letter parts per language.
+
+        ...
+
+        Files are read and base64 encoded once per language, every message
+        in that language reuses the same parts. Missing files fall back to
+        the `fallback` language.
+
+        Attributes
+        ----------
+        directory : `str`
+            directory with CV_{lang}.pdf and CoverLetter_{lang}.pdf
+        fallback : `str`
+            language used when a file is missing
+
+        Methods
+        ----------
+        paths : `(lang: str | None) => EmailAttachments`
+            files used for a language
+        parts : `(lang: str | None) => Tuple[MIMEApplication, ...]`
+            encoded parts for a language
+    """
+    def __init__(self, directory: str = "att", fallback: str = "en") -> None:
+        self.directory = directory
+        self.fallback = fallback
+        self.__parts: Dict[Union[str, None], Tuple[MIMEApplication, ...]] = {}
+
+    def paths(self, lang: Union[str, None]) -> EmailAttachments:
+        """Files used for a language, warning about fallbacks .
+        """
+        files = {}
+        for name, label in (("CV", "CV"), ("CoverLetter", "cover letter")):
+            path = os.path.join(self.directory, f"{name}_{lang}.pdf")
+            if not os.path.isfile(path):
+                print(f"Missing {label} for {lang}, using {self.fallback} instead")
+                path = os.path.join(self.directory, f"{name}_{self.fallback}.pdf")
+            files[name] = path
+        return EmailAttachments(**files)
+
+    def parts(self, lang: Union[str, None]) -> Tuple[MIMEApplication, ...]:
+        """Encoded parts for a language, built on first use .
+
+        Raises
+        ----------
+        FileNotFoundError
+            if the fallback file is missing too
+        """
+        if lang not in self.__parts:
+            paths = self.paths(lang)
+            self.__parts[lang] = tuple(self.__part(p) for p in (paths.CV, paths.CoverLetter))
+        return self.__parts[lang]
+
+    @staticmethod
+    def __part(path: str) -> MIMEApplication:
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            part = MIMEApplication(f.read(), Name=name)
+        part['Content-Disposition'] = f'attachment; filename="{name}"'
+        return part
+
+
+class FileConnection():
+    """Stand-in for an SMTP connection that appends messages to a file.
+
+        ...
+
+        Used when no SMTP host is configured, so runs without a server
+        still show what would have been sent.
+    """
+    lock = threading.Lock()
+
+    def __init__(self, path: str = "results/emails.txt") -> None:
+        self.path = path
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.utcnow()} - {msg['To']}{os.linesep}")
+            f.write(msg.as_string())
+            f.write(f"{os.linesep}{os.linesep}")
+
+    def quit(self) -> None:
+        pass
+
+
+def recipient(ad: Ad) -> Union[str, None]:
+    """Address to send the application for an ad to, None if the ad has none
+    """
+    found = [ad.application_details.email, ad.employer.email, *(ad.emails or [])]
+    return next((e.strip() for e in found if e and e.strip()), None)
+
+
+def is_transient(e: Exception) -> bool:
+    """Whether sending again later may succeed
+    """
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in e.recipients.values())
+    if isinstance(e, smtplib.SMTPConnectError):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+class Outbox():
+    """Sends applications concurrently over a small pool of reused connections.
+
+        ...
+
+        At most `connections` messages are sent at once, each over a
+        connection kept open for the whole run, and at most `rate` messages
+        are started per second. Transient failures (4xx replies, dropped
+        connections) are retried with jittered exponential backoff. Every
+        outcome is appended to `log_path` as a JSON line, ads with a sent
+        record there aren't sent again.
+
+        Attributes
+        ----------
+        settings : `SmtpSettings`
+            server to send through, messages go to `results/emails.txt` without a host
+        attachments : `Attachments`
+            CV and cover letter parts per language
+        connections : `int`
+            number of connections and concurrent sends
+        rate : `float`
+            messages started per second, 0 for no limit
+        retries : `int`
+            retries after the first attempt for transient failures
+        backoff : `float`
+            base delay in seconds between retries
+        log_path : `str`
+            delivery log, one JSON object per line
+
+        Methods
+        ----------
+        build : `(ad: Ad, to: str) => MIMEMultipart`
+            application message for an ad
+        send_all : `(ads: Iterable[Ad]) => List[Delivery]`
+            send an application to every ad with an email address
+        sent_ids : `() => Set[str]`
+            ids of ads already sent to according to the log
+    """
+    def __init__(
+            self,
+            settings: Union[SmtpSettings, None] = None,
+            attachments: Union[Attachments, None] = None, *,
+            connections: int = 4,
+            rate: float = 5.0,
+            retries: int = 3,
+            backoff: float = 1.0,
+            log_path: str = "results/outbox.ndjson",
+            connect: Union[Callable[[], Any], None] = None) -> None:
+        """
+        Parameters
+        ----------
+        connect : `() => connection | None`
+            opens a connection with `send_message` and `quit`, defaults to one from `settings`
+        """
+        self.settings = settings or SmtpSettings()
+        self.attachments = attachments or Attachments()
+        self.connections = connections
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.log_path = log_path
+        self.connect = connect or self.__connect
+        self.__next = 0.0
+
+    def build(self, ad: Ad, to: str) -> MIMEMultipart:
+        body = f"""
+        <h1>{ad.headline}</h1>
+        <p>{ad.description.text if ad.description else None}</p>
+        <p><a href="{ad.webpage_url}">{ad.webpage_url}</a></p>
+        """
+        msg = MIMEMultipart()
+        msg['Subject'] = f"Jobb: {ad.headline}"
+        msg['From'] = self.settings.sender
+        msg['To'] = to
+        msg.attach(MIMEText(body, 'html'))
+        for part in self.attachments.parts(ad.language):
+            msg.attach(part)
+        return msg
+
+    async def send_all(self, ads: Iterable[Ad]) -> List[Delivery]:
+        """Send an application to every ad with an email address .
+
+        Parameters
+        ----------
+        ads : `Iterable[Ad]`
+            ads to apply to
+
+        Returns
+        ----------
+        deliveries : `List[Delivery]`
+            outcome for every ad, in the order of `ads`
+        """
+        sent = self.sent_ids()
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(self.connections)
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.connections):
+            pool.put_nowait(None)
+        if os.path.dirname(self.log_path):
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                async def deliver(ad: Ad) -> Delivery:
+                    delivery = await self.__deliver(ad, sent, loop, executor, pool)
+                    log.write(json.dumps({**delivery._asdict(), 'time': delivery.time.isoformat()}) + "\n")
+                    log.flush()
+                    return delivery
+                return await asyncio.gather(*(deliver(ad) for ad in ads))
+        finally:
+            while not pool.empty():
+                conn = pool.get_nowait()
+                if conn is not None:
+                    await loop.run_in_executor(executor, self.__close, conn)
+            executor.shutdown()
+
+    def sent_ids(self) -> Set[str]:
+        if not os.path.isfile(self.log_path):
+            return set()
+        with open(self.log_path, encoding="utf-8") as f:
+            records = (json.loads(line) for line in f if line.strip())
+            return {r['ad_id'] for r in records if r['status'] == 'sent'}
+
+    async def __deliver(
+            self,
+            ad: Ad,
+            sent: Set[str],
+            loop: asyncio.AbstractEventLoop,
+            executor: ThreadPoolExecutor,
+            pool: asyncio.Queue) -> Delivery:
+        to = recipient(ad)
+        if ad.id in sent:
+            return Delivery(ad.id, to, 'skipped', 0, "already sent", datetime.now())
+        if to is None:
+            return Delivery(ad.id, None, 'skipped', 0, "no email address", datetime.now())
+        msg = self.build(ad, to)
+        error: Union[Exception, None] = None
+        attempts = 0
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            await self.__throttle(loop)
+            conn = await pool.get()
+            attempts += 1
+            try:
+                if conn is None:
+                    conn = await loop.run_in_executor(executor, self.connect)
+                await loop.run_in_executor(executor, conn.send_message, msg)
+                sent.add(ad.id)
+                return Delivery(ad.id, to, 'sent', attempts, None, datetime.now())
+            except Exception as e:
+                error = e
+                # replies leave the connection usable, anything else may have broken it
+                if conn is not None and not isinstance(e, smtplib.SMTPResponseException) and not isinstance(
+                        e, smtplib.SMTPRecipientsRefused):
+                    await loop.run_in_executor(executor, self.__close, conn)
+                    conn = None
+                if not is_transient(e):
+                    break
+            finally:
+                pool.put_nowait(conn)
+        return Delivery(ad.id, to, 'failed', attempts, repr(error), datetime.now())
+
+    async def __throttle(self, loop: asyncio.AbstractEventLoop) -> None:
+        if not self.rate:
+            return
+        now = loop.time()
+        slot = max(now, self.__next)
+        self.__next = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def __connect(self) -> Any:
+        s = self.settings
+        if s.host is None:
+            return FileConnection()
+        conn = smtplib.SMTP(s.host, s.port, timeout=s.timeout)
+        if s.starttls:
+            conn.starttls()
+        if s.username:
+            conn.login(s.username, s.password or '')
+        return conn
+
+    @staticmethod
+    def __close(conn: Any) -> None:
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            close = getattr(conn, "close", None)
+            if close:
+                close()
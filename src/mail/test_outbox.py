@@ -0,0 +1,106 @@
+import asyncio
+import socketserver
+import threading
+import pytest
+from .outbox import Attachments, Outbox
+from ..schemas.schemas import Ad, SmtpSettings
+from ..client.fake import make_ad
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib, RCPT replies are taken from server.replies first"""
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode().split(" ", 1)[0].strip().upper()
+            if verb == "RCPT":
+                with server.lock:
+                    self.reply(server.replies.pop(0) if server.replies else "250 ok")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += self.rfile.readline()
+                with server.lock:
+                    server.messages.append(data)
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SmtpHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.replies = []
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def outbox(smtp, tmp_path):
+    for name in ("CV_en.pdf", "CoverLetter_en.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4 " + name.encode())
+    settings = SmtpSettings(host="127.0.0.1", port=smtp.server_address[1], starttls=False, sender="me@example.com")
+    return Outbox(settings, Attachments(str(tmp_path)), connections=2, rate=0,
+                  backoff=0.01, log_path=str(tmp_path / "outbox.ndjson"))
+
+
+def ads(n: int, email: bool = True):
+    res = []
+    for i in range(n):
+        hit = make_ad(i)
+        if email:
+            hit['application_details'] = {'email': f"jobs{i}@example.com", 'via_af': False}
+        ad = Ad(**hit)
+        ad.language = "sv"
+        res.append(ad)
+    return res
+
+
+class TestOutbox:
+    def test_send_all(self, smtp, outbox):
+        deliveries = asyncio.run(outbox.send_all(ads(20)))
+        assert [d.status for d in deliveries] == ['sent'] * 20
+        assert len(smtp.messages) == 20
+        assert smtp.connections == 2
+        assert b'filename="CV_en.pdf"' in smtp.messages[0]
+        assert outbox.attachments.parts("sv") is outbox.attachments.parts("sv")
+
+    def test_retries_transient(self, smtp, outbox):
+        smtp.replies = ["451 try again later"]
+        [delivery] = asyncio.run(outbox.send_all(ads(1)))
+        assert delivery.status == 'sent'
+        assert delivery.attempts == 2
+
+    def test_permanent_failure(self, smtp, outbox):
+        smtp.replies = ["550 no such user"]
+        [delivery] = asyncio.run(outbox.send_all(ads(1)))
+        assert delivery.status == 'failed'
+        assert delivery.attempts == 1
+        assert smtp.messages == []
+
+    def test_skips_sent_and_without_email(self, smtp, outbox):
+        asyncio.run(outbox.send_all(ads(3)))
+        deliveries = asyncio.run(outbox.send_all(ads(3) + ads(1, email=False)))
+        assert [d.status for d in deliveries] == ['skipped'] * 4
+        assert len(smtp.messages) == 3
+        assert outbox.sent_ids() == {"0", "1", "2"}
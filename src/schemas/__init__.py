@@ -1 +1,2 @@
-from .schemas import *
\ No newline at end of file
+from .schemas import *
+from .compact import CompactAd, Interner
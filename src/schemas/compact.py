@@ -0,0 +1,217 @@
+""" Compact ad representation with lazy validation
+"""
+import json
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from .schemas import Ad
+
+
+class CompactConcept(NamedTuple):
+    concept_id: Optional[str]
+    label: Optional[str]
+    legacy_ams_taxonomy_id: Optional[str]
+
+
+class CompactDescription(NamedTuple):
+    text: str
+    text_formatted: Optional[str]
+
+
+class CompactDetails(NamedTuple):
+    email: Optional[str]
+    url: Optional[str]
+    via_af: bool
+
+
+class CompactEmployer(NamedTuple):
+    name: Optional[str]
+    email: Optional[str]
+    organisation_number: Optional[str]
+    url: Optional[str]
+
+
+class CompactContact(NamedTuple):
+    name: Optional[str]
+    email: Optional[str]
+
+
+class CompactWorkplace(NamedTuple):
+    municipality: Optional[str]
+    region: Optional[str]
+    city: Optional[str]
+    country: Optional[str]
+
+
+CONCEPT_FIELDS = (
+    'duration', 'employment_type', 'occupation', 'occupation_field',
+    'occupation_group', 'salary_type', 'working_hours_type',
+)
+
+
+class Interner:
+    """Shares one instance of every repeated string and record
+
+    Concepts, employers and workplaces repeat across thousands of ads,
+    interning them keeps a single copy of each
+
+    Attributes:
+    ----------
+    records: `Dict[tuple, tuple]`
+        Canonical instance of every record seen
+    raw: `Dict[tuple, dict]`
+        Canonical instance of every raw concept dict seen
+    """
+    def __init__(self) -> None:
+        self.records: Dict[tuple, tuple] = {}
+        self.raw: Dict[tuple, Dict[str, Any]] = {}
+
+    def string(self, value: Optional[str]) -> Optional[str]:
+        return sys.intern(value) if value is not None else None
+
+    def record(self, record: tuple) -> tuple:
+        record = type(record)(*(self.string(v) if isinstance(v, str) else v for v in record))
+        return self.records.setdefault(record, record)
+
+    def raw_concept(self, raw: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if raw is None:
+            return None
+        key = tuple(raw.items())
+        return self.raw.setdefault(key, raw)
+
+    def concept(self, raw: Optional[Dict[str, Any]]) -> Optional[CompactConcept]:
+        if raw is None:
+            return None
+        return self.record(CompactConcept(
+            raw.get('concept_id'), raw.get('label'), raw.get('legacy_ams_taxonomy_id')))
+
+
+class CompactAd:
+    """Slotted ad with the fields the filters, writers and store use
+
+    Built from a raw hit without pydantic validation. Nested fields are
+    interned named tuples with the same attribute names as `Ad`, so code
+    written for `Ad` reads them unchanged. Any other attribute validates
+    the raw hit into a full `Ad` on first use.
+
+    Attributes:
+    ----------
+    raw: `Dict[str, Any]`
+        The raw hit, kept for `full`, `dict` and `json`
+    language, matched_keywords, matched_queries, emails:
+        Derived fields, set by the filters and batches like on `Ad`
+    """
+    __slots__ = (
+        "id", "headline", "timestamp", "publication_date", "application_deadline",
+        "removed", "webpage_url", "description", "application_details", "employer",
+        "application_contacts", "workplace_address", "occupation", "occupation_field",
+        "occupation_group", "employment_type", "language", "matched_keywords", "matched_queries",
+        "emails", "raw", "__full",
+    )
+
+    def __init__(
+            self,
+            hit: Dict[str, Any], *,
+            interner: Union[Interner, None] = None,
+            drop_formatted: bool = False) -> None:
+        """Builds the compact ad from a raw hit
+
+        Parameters
+        ----------
+        hit : `Dict[str, Any]`
+            raw ad from the API
+        interner : `Interner | None`
+            interner shared between ads, a new one if None
+        drop_formatted : `bool`
+            drop `description.text_formatted` from the ad and the raw hit
+
+        Notes
+        ----------
+        Raw concept dicts are replaced by interned ones shared between ads,
+        they must not be modified
+
+        Raises
+        ----------
+        KeyError
+            if a required field is missing
+        """
+        i = interner or Interner()
+        hit = dict(hit)
+        for field in CONCEPT_FIELDS:
+            hit[field] = i.raw_concept(hit.get(field))
+        description = hit['description']
+        if drop_formatted:
+            description = {k: v for k, v in description.items() if k != 'text_formatted'}
+            hit['description'] = description
+        details = hit['application_details']
+        employer = hit['employer']
+        workplace = hit['workplace_address']
+        self.raw = hit
+        self.id: str = hit['id']
+        self.headline: str = hit['headline']
+        self.timestamp: int = hit['timestamp']
+        self.publication_date = datetime.fromisoformat(hit['publication_date'])
+        self.application_deadline = datetime.fromisoformat(hit['application_deadline'])
+        self.removed: bool = hit['removed']
+        self.webpage_url: str = hit['webpage_url']
+        self.description = CompactDescription(description['text'], description.get('text_formatted'))
+        self.application_details = CompactDetails(
+            details.get('email'), details.get('url'), details['via_af'])
+        self.employer = i.record(CompactEmployer(
+            employer.get('name'), employer.get('email'),
+            employer.get('organisation_number'), employer.get('url')))
+        self.application_contacts: Tuple[CompactContact, ...] = tuple(
+            CompactContact(c.get('name'), c.get('email')) for c in hit['application_contacts'])
+        self.workplace_address = i.record(CompactWorkplace(
+            workplace.get('municipality'), workplace.get('region'),
+            workplace.get('city'), workplace.get('country')))
+        self.occupation = i.concept(hit['occupation'])
+        self.occupation_field = i.concept(hit['occupation_field'])
+        self.occupation_group = i.concept(hit['occupation_group'])
+        self.employment_type = i.concept(hit['employment_type'])
+        self.language: Optional[str] = hit.get('language')
+        self.matched_keywords: Optional[List[str]] = hit.get('matched_keywords')
+        self.matched_queries: Optional[List[str]] = hit.get('matched_queries')
+        self.emails: Optional[List[str]] = hit.get('emails')
+        self.__full: Union[Ad, None] = None
+
+    def full(self) -> Ad:
+        """Validates the raw hit into a full `Ad`, once
+
+        Returns
+        ----------
+        ad : `Ad`
+            validated ad with the current derived fields
+
+        Raises
+        ----------
+        ValidationError
+            if the raw hit isn't a valid ad
+        """
+        if self.__full is None:
+            self.__full = Ad(**self.raw)
+        self.__full.language = self.language
+        self.__full.matched_keywords = self.matched_keywords
+        self.__full.matched_queries = self.matched_queries
+        self.__full.emails = self.emails
+        return self.__full
+
+    def dict(self) -> Dict[str, Any]:
+        """Raw hit with the derived fields, without validating
+        """
+        return {**self.raw, 'language': self.language,
+                'matched_keywords': self.matched_keywords, 'matched_queries': self.matched_queries,
+                'emails': self.emails}
+
+    def json(self, **kwargs: Any) -> str:
+        """Raw hit with the derived fields as JSON, takes the same arguments as `json.dumps`
+        """
+        return json.dumps(self.dict(), **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.full(), name)
+
+    def __repr__(self) -> str:
+        return f"CompactAd(id={self.id!r}, headline={self.headline!r})"
@@ -1,8 +1,8 @@
 """ Pydantic schemas for the app
 """
 from datetime import datetime
-from typing import Dict, List, Literal, Optional, Union, Callable, NamedTuple
-from pydantic import BaseModel
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union, Callable, NamedTuple
+from pydantic import BaseModel, BaseSettings, Field
 from collections import namedtuple
 
 class Args(BaseModel):
@@ -10,8 +10,25 @@ class Args(BaseModel):
     lang: Optional[List[str]]
     filter: Optional[List[str]]
     email: bool = False
+    email_text: bool = False
     send: bool = False
     write: bool = False
+    cache: bool = True
+    refresh: bool = False
+    compact: bool = False
+    compress: Literal['none', 'gzip', 'zstd'] = 'none'
+    report: bool = False
+    metrics: Optional[str]
+    facets: Optional[List[str]]
+    brief: bool = False
+    sync: bool = False
+    store: bool = False
+    whole_words: bool = False
+    fold_diacritics: bool = False
+    workers: Optional[int]
+    detector: Literal['ngram', 'langdetect'] = 'ngram'
+    daemon: Optional[str]
+    port: int = 8765
 
 # class Progress(BaseModel):
 #     progressbar: Callable
@@ -40,7 +57,7 @@ class Description(BaseModel):
     needs: Optional[str]
     requirements: Optional[str]
     text: str
-    text_formatted: str
+    text_formatted: Optional[str]
     
     
 class Concept(BaseModel):
@@ -111,6 +128,9 @@ class Ad(BaseModel):
     headline: str
     id: str
     language: Optional[str]
+    matched_keywords: Optional[List[str]]
+    matched_queries: Optional[List[str]]
+    emails: Optional[List[str]]
     last_publication_date: str
     logo_url: Optional[str]
     must_have: Preferences
@@ -143,6 +163,34 @@ class EmailParams(BaseModel):
     body: str
     attachments: EmailAttachments
 
+class SmtpSettings(BaseSettings):
+    """SMTP server used by the outbox, read from JOBGET_SMTP_* environment variables
+
+    Without a host, messages are appended to `results/emails.txt` instead of sent
+    """
+    host: Optional[str]
+    port: int = 587
+    username: Optional[str]
+    password: Optional[str]
+    starttls: bool = True
+    sender: str = ''
+    timeout: float = 30.0
+
+    class Config:
+        env_prefix = 'JOBGET_SMTP_'
+
+class Delivery(NamedTuple):
+    """Outcome of sending one application"""
+    ad_id: str
+    recipient: Optional[str]
+    status: Literal['sent', 'failed', 'skipped']
+    attempts: int
+    error: Optional[str]
+    time: datetime
+
+FacetDimension = Literal['occupation-name', 'occupation-group', 'occupation-field', 'country', 'municipality', 'region']
+FACET_DIMENSIONS: List[str] = list(FacetDimension.__args__)
+
 class SearchParams(BaseModel):
     q: str
     offset: Optional[int]
@@ -152,13 +200,19 @@ class SearchParams(BaseModel):
     relevance_threshold: Optional[float]
     resdet: Optional[Literal['full', 'brief']]
     sort: Optional[Literal['relevance', 'pubdate-desc', 'pubdate-asc', 'applydate-desc', 'applydate-asc', 'updated', 'id']]
-    stats: Optional[Literal['occupation-name', 'occupation-group', 'occupation-field', 'country', 'municipality', 'region']]
+    stats: Optional[FacetDimension]
+    stats_limit: Optional[int] = Field(None, alias='stats.limit')
     open_for_all: Optional[bool]
     country: Optional[List[str]]
     region: Optional[List[str]]
     municipality: Optional[List[str]]
     experience: Optional[bool]
     language: Optional[List[str]]
+    published_after: Optional[str] = Field(None, alias='published-after')
+    published_before: Optional[str] = Field(None, alias='published-before')
+
+    class Config:
+        allow_population_by_field_name = True
     
     
 class QueryParams(SearchParams):
@@ -186,12 +240,118 @@ class QueryResponse(BaseModel):
     freetext_concepts: Optional[Dict[str, List]]
     hits: List[Ad]
 
-class ClientHistory(BaseModel):
-    responses: Optional[List[QueryResponse]]
-    params: Optional[List[SearchParams]]
-    total_received: Optional[int]
-    args: Optional[List[Args]]
-    errors: Optional[List[str]]
+class HistoryEntry(BaseModel):
+    """Pydantic model for one entry of a client's history
+
+    Attributes:
+    ----------
+    kind: `'params' | 'args' | 'response' | 'error'`
+        What the entry records
+    time: `datetime`
+        When it was recorded
+    value: `Dict[str, Any] | None`
+        Params or args that were replaced, unset fields left out
+    key: `str | None`
+        `ResponseCache` key of the first page of a response, its hits aren't kept
+    total: `int | None`
+        Hits the API reported for a response
+    missing: `int | None`
+        Pages of a response that could not be fetched
+    error: `str | None`
+        Error message
+    """
+    kind: Literal['params', 'args', 'response', 'error']
+    time: datetime = Field(default_factory=datetime.now)
+    value: Optional[Dict[str, Any]]
+    key: Optional[str]
+    total: Optional[int]
+    missing: Optional[int]
+    error: Optional[str]
+
+class SyncState(BaseModel):
+    """Pydantic model for what an incremental sync remembers per query
+
+    Attributes:
+    ----------
+    params: `SearchParams`
+        Parameters of the synced query
+    newest_publication: `datetime | None`
+        Newest publication date seen
+    newest_timestamp: `int | None`
+        Newest ad timestamp seen
+    last_run: `datetime | None`
+        When the query was last synced
+    """
+    params: SearchParams
+    newest_publication: Optional[datetime]
+    newest_timestamp: Optional[int]
+    last_run: Optional[datetime]
+
+class SavedQuery(BaseModel):
+    """Pydantic model for a query the daemon runs on an interval
+
+    Attributes:
+    ----------
+    name: `str`
+        Name the query's state is kept under
+    queries: `List[str]`
+        Search queries, run as one batch if more than one
+    interval: `float`
+        Seconds between runs, before jitter
+    args: `Dict[str, Any]`
+        Command line options as parsed by `jobget-cli.py`, e.g. `{"lang": ["en"], "email": true}`
+    """
+    name: str
+    queries: List[str]
+    interval: float = Field(..., gt=0)
+    args: Dict[str, Any] = {}
+
+class JobState(BaseModel):
+    """Pydantic model for what the daemon remembers per saved query
+
+    Attributes:
+    ----------
+    last_run: `datetime | None`
+        When the query last started
+    next_run: `datetime | None`
+        When the query runs next
+    last_duration: `float | None`
+        Seconds the last run took
+    last_error: `str | None`
+        Error of the last run, None if it succeeded
+    runs: `int`
+        Runs so far
+    failures: `int`
+        Runs that raised
+    """
+    last_run: Optional[datetime]
+    next_run: Optional[datetime]
+    last_duration: Optional[float]
+    last_error: Optional[str]
+    runs: int = 0
+    failures: int = 0
+
+class DerivedFields(BaseModel):
+    """Pydantic model for values computed from an ad
+
+    Attributes:
+    ----------
+    language: `str | None`
+        Detected language
+    confidence: `float | None`
+        Probability of the detected language
+    emails: `List[str] | None`
+        Email addresses found in the ad
+    keyword_set: `str | None`
+        Key of the keywords and options `keywords` was matched with
+    keywords: `List[str] | None`
+        Keywords found in the ad
+    """
+    language: Optional[str]
+    confidence: Optional[float]
+    emails: Optional[List[str]]
+    keyword_set: Optional[str]
+    keywords: Optional[List[str]]
 
 class Progress(NamedTuple):
     received: int
@@ -201,6 +361,38 @@ class ClientError(NamedTuple):
     code: int
     err: str
 
+class FacetResult(NamedTuple):
+    """Counts per value of every facet of one query, without any hits
+
+    Attributes:
+    ----------
+    total: `int`
+        total number of hits reported by the API, 0 if every request failed
+    counts: `Dict[str, List[QStatDetail]]`
+        most common values per dimension, highest count first
+    missing: `List[str]`
+        dimensions that could not be fetched after all retries
+    """
+    total: int
+    counts: Dict[str, List[QStatDetail]]
+    missing: List[str]
+
+class PageResult(NamedTuple):
+    """Pages fetched for one query
+
+    Attributes:
+    ----------
+    total: `int`
+        total number of hits reported by the API, 0 if the first page failed
+    pages: `Dict[int, dict]`
+        raw JSON pages keyed by offset, in offset order
+    missing: `List[int]`
+        offsets that could not be fetched after all retries
+    """
+    total: int
+    pages: Dict[int, dict]
+    missing: List[int]
+
 class ClientStatus(BaseModel):
     """Pydantic model for client status
     
@@ -214,13 +406,68 @@ class ClientStatus(BaseModel):
         Returns list of errors as namedtuples with code and err
     progress:
         Async function yielding completed responses if expecting multiple responses
+    missing: `List[int]`
+        Page offsets that could not be fetched in the last run
+    missing_by_query: `Dict[str, List[int]]`
+        Page offsets that could not be fetched per query in the last batch
+    missing_ids: `List[str]`
+        Ids of ads that could not be hydrated in the last run
+    missing_shards: `List[Tuple[SearchParams, List[int]]]`
+        Shards of the last sharded run with pages that could not be fetched, and their offsets in the shard
+    truncated: `int`
+        Hits the last run couldn't reach past the API's offset limit
     
     """
     ok: bool
     message: str
     errors: List[ClientError]
     progress: Progress
+    missing: List[int] = []
+    missing_by_query: Dict[str, List[int]] = {}
+    missing_ids: List[str] = []
+    missing_shards: List[Tuple[SearchParams, List[int]]] = []
+    truncated: int = 0
+
 
+class RequestTiming(NamedTuple):
+    """One request attempt, durations in seconds, None if the transport didn't report them"""
+    offset: int
+    attempt: int
+    status: int
+    total: float
+    connect: Optional[float]
+    ttfb: Optional[float]
+    download: Optional[float]
+    bytes: int
+    query_ms: Optional[int]
+    result_ms: Optional[int]
+    cached: bool
+    time: datetime
+
+class StageTiming(NamedTuple):
+    """One timed run of a processing stage"""
+    name: str
+    items_in: int
+    items_out: int
+    cpu: float
+    wall: float
+    time: datetime
+
+class SyncResult(NamedTuple):
+    """Outcome of an incremental sync
+
+    Attributes:
+    ----------
+    new: `List[Ad]`
+        Ads not seen in earlier runs
+    removed: `List[str]`
+        Ids of stored ads the API now marks as removed
+    stored: `int`
+        Number of ads stored for the query after merging
+    """
+    new: List[Ad]
+    removed: List[str]
+    stored: int
 
 class DataStatus(NamedTuple):
     data: Optional[List[QueryResponse]]
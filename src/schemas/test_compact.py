@@ -0,0 +1,45 @@
+from .compact import CompactAd, Interner
+from .schemas import Ad
+from ..client.fake import make_ad
+
+
+class TestCompactAd:
+    def test_fields_match_ad(self):
+        hit = make_ad(1)
+        hit['application_contacts'] = [{'name': 'Anna', 'email': 'anna@example.com'}]
+        ad, compact = Ad(**hit), CompactAd(hit)
+        assert compact.id == ad.id
+        assert compact.headline == ad.headline
+        assert compact.application_deadline == ad.application_deadline
+        assert compact.description.text == ad.description.text
+        assert compact.employer.name == ad.employer.name
+        assert compact.application_contacts[0].email == ad.application_contacts[0].email
+        assert compact.occupation.label == ad.occupation.label
+
+    def test_interned(self):
+        interner = Interner()
+        a, b = CompactAd(make_ad(1), interner=interner), CompactAd(make_ad(2), interner=interner)
+        assert a.occupation is b.occupation
+        assert a.raw['occupation'] is b.raw['occupation']
+        assert a.employer is not b.employer
+
+    def test_full_is_lazy(self):
+        compact = CompactAd(make_ad(1))
+        assert compact._CompactAd__full is None
+        compact.language = "sv"
+        assert compact.driving_license_required is False
+        assert compact.full() is compact.full()
+        assert compact.full().language == "sv"
+
+    def test_drop_formatted(self):
+        hit = make_ad(1)
+        compact = CompactAd(hit, drop_formatted=True)
+        assert compact.description.text_formatted is None
+        assert 'text_formatted' not in compact.raw['description']
+        assert 'text_formatted' in hit['description']
+        assert compact.full().description.text == "ad 1"
+
+    def test_json_roundtrip(self):
+        compact = CompactAd(make_ad(1))
+        compact.emails = ["a@example.com"]
+        assert Ad.parse_raw(compact.json()).emails == ["a@example.com"]
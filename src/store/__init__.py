@@ -0,0 +1,12 @@
+from typing import TYPE_CHECKING
+from ..util.lazy import lazy_exports
+
+__all__ = ["AdStore", "DerivedCache"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "AdStore": ".store",
+    "DerivedCache": ".derived",
+})
+
+if TYPE_CHECKING:
+    from .store import AdStore
+    from .derived import DerivedCache
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from ..schemas.schemas import *
+from typing import Dict, Iterable, Tuple, Any, Union
+
+
+class DerivedCache():
+    """Persistent cache of values computed from ads.
+
+        ...
+
+        Entries are keyed by `Ad.id` and only valid for the `Ad.timestamp`
+        they were computed for, so edited ads are computed again.
+        Ads past their application deadline are evicted first.
+
+        Attributes
+        ----------
+        path : `str`
+            path to the SQLite file, ":memory:" for a temporary cache
+        max_entries : `int`
+            maximum number of cached ads, kept by `evict`
+
+        Methods
+        ----------
+        get : `(ads: Iterable[Ad]) => Dict[str, DerivedFields]`
+            cached fields of the ads that have a valid entry
+        update : `(items: Iterable[Tuple[Ad, Dict[str, Any]]]) => None`
+            store fields for ads
+        evict : `(now: datetime | None) => int`
+            remove expired entries and keep at most `max_entries`
+    """
+    FIELDS = ("language", "confidence", "emails", "keyword_set", "keywords")
+    JSON_FIELDS = ("emails", "keywords")
+
+    def __init__(self, path: str = "results/derived.sqlite", *, max_entries: int = 100_000) -> None:
+        """Opens or creates the cache file
+
+        Parameters
+        ----------
+        path : `str`
+            path to the SQLite file, parent directories are created
+        max_entries : `int`
+            maximum number of cached ads
+        """
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS derived (
+                id TEXT PRIMARY KEY,
+                timestamp INTEGER,
+                deadline TEXT,
+                language TEXT,
+                confidence REAL,
+                emails TEXT,
+                keyword_set TEXT,
+                keywords TEXT
+            );
+            CREATE INDEX IF NOT EXISTS derived_deadline ON derived (deadline);
+        """)
+        self.db.commit()
+
+    def get(self, ads: Iterable[Ad]) -> Dict[str, DerivedFields]:
+        """Cached fields of the ads that have an entry for their current timestamp .
+
+        Parameters
+        ----------
+        ads : `Iterable[Ad]`
+            ads to look up
+
+        Returns
+        ----------
+        fields : `Dict[str, DerivedFields]`
+            fields by ad id, ads without a valid entry are left out
+        """
+        res: Dict[str, DerivedFields] = {}
+        columns = ", ".join(self.FIELDS)
+        for ad in ads:
+            row = self.db.execute(
+                f"SELECT {columns} FROM derived WHERE id = ? AND timestamp = ?",
+                (ad.id, ad.timestamp)).fetchone()
+            if row is not None:
+                values = dict(zip(self.FIELDS, row))
+                for field in self.JSON_FIELDS:
+                    if values[field] is not None:
+                        values[field] = json.loads(values[field])
+                res[ad.id] = DerivedFields(**values)
+        return res
+
+    def update(self, items: Iterable[Tuple[Ad, Dict[str, Any]]]) -> None:
+        """Store fields for ads, keeping other cached fields of the same ad version .
+
+        Parameters
+        ----------
+        items : `Iterable[Tuple[Ad, Dict[str, Any]]]`
+            ads and the fields to store for them, keys from `DerivedFields`
+        """
+        with self.db:
+            for ad, fields in items:
+                fields = {k: json.dumps(v) if k in self.JSON_FIELDS and v is not None else v
+                          for k, v in fields.items() if k in self.FIELDS}
+                self.db.execute("DELETE FROM derived WHERE id = ? AND timestamp != ?",
+                                (ad.id, ad.timestamp))
+                columns = ["id", "timestamp", "deadline", *fields]
+                updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+                self.db.execute(
+                    f"INSERT INTO derived ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT (id) DO UPDATE SET {updates}",
+                    (ad.id, ad.timestamp, ad.application_deadline.isoformat(), *fields.values()))
+
+    def evict(self, now: Union[datetime, None] = None) -> int:
+        """Remove ads past their deadline, then the ones closest to it until at most `max_entries` are left .
+
+        Parameters
+        ----------
+        now : `datetime | None`
+            time to compare deadlines with, defaults to now
+
+        Returns
+        ----------
+        count : `int`
+            number of entries removed
+        """
+        now = now or datetime.now()
+        with self.db:
+            removed = self.db.execute(
+                "DELETE FROM derived WHERE deadline < ?", (now.isoformat(),)).rowcount
+            removed += self.db.execute(
+                "DELETE FROM derived WHERE id IN (SELECT id FROM derived "
+                "ORDER BY deadline LIMIT MAX(0, (SELECT COUNT(*) FROM derived) - ?))",
+                (self.max_entries,)).rowcount
+        return removed
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,204 @@
+import os
+import sqlite3
+from datetime import datetime
+from ..schemas.schemas import *
+from ..util.emails import extract_emails
+from typing import Iterable, Iterator, List, Tuple, Any, Union
+
+
+class AdStore():
+    """Local SQLite store for ads with a full-text index.
+
+        ...
+
+        Ads are upserted by `id`. Headline and description text are kept in
+        an FTS5 index, language, municipality, occupation, deadline and
+        whether the ad has an email are stored in indexed columns, so
+        filters run as queries over every ad ever stored.
+
+        Attributes
+        ----------
+        path : `str`
+            path to the SQLite file, ":memory:" for a temporary store
+
+        Methods
+        ----------
+        upsert : `(ads: Iterable[Ad]) => int`
+            insert or replace ads
+        get : `(id: str) => Ad | None`
+            ad with the given id
+        search : `(**filters) => Iterator[Ad]`
+            ads matching all given filters
+        count : `(**filters) => int`
+            number of ads matching all given filters
+    """
+    def __init__(self, path: str = "results/ads.sqlite") -> None:
+        """Opens or creates the store
+
+        Parameters
+        ----------
+        path : `str`
+            path to the SQLite file, parent directories are created
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS ads (
+                id TEXT PRIMARY KEY,
+                timestamp INTEGER,
+                language TEXT,
+                municipality TEXT,
+                occupation TEXT,
+                deadline TEXT,
+                has_email INTEGER,
+                removed INTEGER,
+                body TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ads_language ON ads (language);
+            CREATE INDEX IF NOT EXISTS ads_municipality ON ads (municipality);
+            CREATE INDEX IF NOT EXISTS ads_occupation ON ads (occupation);
+            CREATE INDEX IF NOT EXISTS ads_deadline ON ads (deadline);
+            CREATE INDEX IF NOT EXISTS ads_has_email ON ads (has_email);
+            CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+                headline, text,
+                tokenize = 'unicode61 remove_diacritics 0'
+            );
+        """)
+        self.db.commit()
+
+    def upsert(self, ads: Iterable[Ad]) -> int:
+        """Insert ads or replace stored ads with the same id .
+
+        Parameters
+        ----------
+        ads : `Iterable[Ad]`
+            ads to store, can be a list or a stream
+
+        Returns
+        ----------
+        count : `int`
+            number of ads written
+        """
+        count = 0
+        with self.db:
+            for ad in ads:
+                old = self.db.execute("SELECT rowid FROM ads WHERE id = ?", (ad.id,)).fetchone()
+                if old:
+                    self.db.execute("DELETE FROM ads_fts WHERE rowid = ?", old)
+                cur = self.db.execute(
+                    "INSERT OR REPLACE INTO ads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                        ad.id,
+                        ad.timestamp,
+                        ad.language,
+                        ad.workplace_address.municipality,
+                        ad.occupation.label,
+                        ad.application_deadline.isoformat(),
+                        bool(extract_emails(ad)),
+                        ad.removed,
+                        ad.json(),
+                    ))
+                self.db.execute(
+                    "INSERT INTO ads_fts (rowid, headline, text) VALUES (?, ?, ?)",
+                    (cur.lastrowid, ad.headline, ad.description.text))
+                count += 1
+        return count
+
+    def get(self, id: str) -> Union[Ad, None]:
+        """Ad with the given id .
+
+        Parameters
+        ----------
+        id : `str`
+            id of the ad
+
+        Returns
+        ----------
+        ad : `Ad | None`
+            stored ad, None if not stored
+        """
+        row = self.db.execute("SELECT body FROM ads WHERE id = ?", (id,)).fetchone()
+        return Ad.parse_raw(row[0]) if row else None
+
+    def search(
+            self, *,
+            keywords: Union[List[str], None] = None,
+            languages: Union[List[str], None] = None,
+            email: Union[bool, None] = None,
+            municipalities: Union[List[str], None] = None,
+            occupations: Union[List[str], None] = None,
+            open_at: Union[datetime, None] = None,
+            include_removed: bool = False
+            ) -> Iterator[Ad]:
+        """Ads matching all given filters, unset filters match everything .
+
+        Parameters
+        ----------
+        keywords : `List[str] | None`
+            ads whose headline or description has a word starting with any of the keywords, case insensitive
+        languages : `List[str] | None`
+            ads detected as one of the languages
+        email : `bool | None`
+            ads with (True) or without (False) an email address
+        municipalities : `List[str] | None`
+            ads in one of the municipalities
+        occupations : `List[str] | None`
+            ads with one of the occupation labels
+        open_at : `datetime | None`
+            ads whose application deadline is not before this time
+        include_removed : `bool`
+            include ads marked as removed
+
+        Yields
+        ----------
+        ad : `Ad`
+            matching ad
+        """
+        where, args = self.__where(keywords, languages, email, municipalities,
+                                   occupations, open_at, include_removed)
+        for (body,) in self.db.execute(f"SELECT body FROM ads WHERE {where}", args):
+            yield Ad.parse_raw(body)
+
+    def count(self, **filters: Any) -> int:
+        """Number of ads matching all given filters, takes the same filters as `search` .
+        """
+        where, args = self.__where(**filters)
+        return self.db.execute(f"SELECT COUNT(*) FROM ads WHERE {where}", args).fetchone()[0]
+
+    def close(self) -> None:
+        self.db.close()
+
+    @staticmethod
+    def __where(
+            keywords: Union[List[str], None] = None,
+            languages: Union[List[str], None] = None,
+            email: Union[bool, None] = None,
+            municipalities: Union[List[str], None] = None,
+            occupations: Union[List[str], None] = None,
+            open_at: Union[datetime, None] = None,
+            include_removed: bool = False
+            ) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        args: List[Any] = []
+        def one_of(column: str, values: List[Any]) -> None:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+        if keywords:
+            clauses.append("rowid IN (SELECT rowid FROM ads_fts WHERE ads_fts MATCH ?)")
+            args.append(" OR ".join('"' + k.replace('"', '""') + '"*' for k in keywords))
+        if languages:
+            one_of("language", languages)
+        if email is not None:
+            clauses.append("has_email = ?")
+            args.append(email)
+        if municipalities:
+            one_of("municipality", municipalities)
+        if occupations:
+            one_of("occupation", occupations)
+        if open_at is not None:
+            clauses.append("deadline >= ?")
+            args.append(open_at.isoformat())
+        if not include_removed:
+            clauses.append("NOT removed")
+        return " AND ".join(clauses) or "1", args
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+from .derived import DerivedCache
+from ..schemas.schemas import Ad
+from ..client.fake import make_ad
+from ..util.languages import detect_ad_languages
+
+
+def ad(i, **fields):
+    raw = make_ad(i)
+    raw.update(fields)
+    return Ad(**raw)
+
+
+class CountingDetector:
+    def __init__(self):
+        self.calls = 0
+
+    async def detect_scored(self, texts):
+        self.calls += len(texts)
+        return [("sv", 0.9) for _ in texts]
+
+
+class TestDerivedCache:
+    def test_timestamp_invalidates(self):
+        cache = DerivedCache(":memory:")
+        cache.update([(ad(1), {'language': "sv", 'confidence': 0.9})])
+        cache.update([(ad(1), {'emails': ["a@example.com"]})])
+        fields = cache.get([ad(1)])["1"]
+        assert (fields.language, fields.emails) == ("sv", ["a@example.com"])
+        assert cache.get([ad(1, timestamp=1)]) == {}
+        cache.update([(ad(1, timestamp=1), {'emails': []})])
+        assert cache.get([ad(1, timestamp=1)])["1"].language is None
+
+    def test_evict(self):
+        cache = DerivedCache(":memory:", max_entries=2)
+        cache.update([
+            (ad(1, application_deadline="2020-01-01T00:00:00"), {}),
+            (ad(2, application_deadline="2026-11-01T00:00:00"), {}),
+            (ad(3, application_deadline="2026-12-01T00:00:00"), {}),
+            (ad(4, application_deadline="2027-01-01T00:00:00"), {}),
+        ])
+        assert cache.evict(datetime(2026, 10, 1)) == 2
+        assert set(cache.get([ad(i) for i in range(1, 5)])) == {"3", "4"}
+
+    def test_detect_uses_cache(self):
+        cache = DerivedCache(":memory:")
+        detector = CountingDetector()
+        ads = [ad(i) for i in range(3)]
+        asyncio.run(detect_ad_languages(ads, detector, cache))
+        asyncio.run(detect_ad_languages([ad(i) for i in range(4)], detector, cache))
+        assert detector.calls == 4
+        assert cache.get(ads)["0"].confidence == 0.9
@@ -0,0 +1,44 @@
+from datetime import datetime
+from .store import AdStore
+from ..schemas.schemas import Ad
+from ..client.fake import make_ad
+
+
+def ad(i, **fields):
+    raw = make_ad(i)
+    for k, v in fields.items():
+        raw[k] = v
+    return Ad(**raw)
+
+
+class TestAdStore:
+    def test_upsert_replaces(self):
+        store = AdStore(":memory:")
+        store.upsert([ad(1, headline="Python utvecklare")])
+        store.upsert([ad(1, headline="Java utvecklare")])
+        assert store.count() == 1
+        assert store.get("1").headline == "Java utvecklare"
+        assert store.count(keywords=["python"]) == 0
+        assert store.count(keywords=["java"]) == 1
+
+    def test_search(self):
+        store = AdStore(":memory:")
+        store.upsert([
+            ad(1, headline="Backendutvecklare Python", language="sv",
+               application_details={'email': "jobb@example.com", 'via_af': False}),
+            ad(2, headline="Python developer", language="en",
+               description={'text': "Mejla jobb@example.com", 'text_formatted': ""}),
+            ad(3, headline="Lärare", language="sv",
+               application_deadline="2020-01-01T00:00:00"),
+            ad(4, headline="Python", removed=True),
+        ])
+        ids = lambda **f: sorted(a.id for a in store.search(**f))
+        assert ids(keywords=["python"]) == ["1", "2"]
+        assert ids(keywords=["backend", "developer"]) == ["1", "2"]
+        assert ids(keywords=["BACKEND"]) == ["1"]
+        assert ids(keywords=["lärare"]) == ["3"]
+        assert ids(languages=["sv"]) == ["1", "3"]
+        # same definition as the email filter, the description doesn't count
+        assert ids(email=True) == ["1"]
+        assert ids(open_at=datetime(2026, 1, 1)) == ["1", "2"]
+        assert ids(keywords=["python"], include_removed=True) == ["1", "2", "4"]
@@ -1 +1,23 @@
-from .help import print_all_opts
\ No newline at end of file
+from typing import TYPE_CHECKING
+from .lazy import lazy_exports
+
+__all__ = ["print_all_opts", "KeywordMatcher", "LanguageDetector", "extract_emails",
+           "NdjsonWriter", "iter_ndjson", "Pipeline", "Stage"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "print_all_opts": ".help",
+    "KeywordMatcher": ".keywords",
+    "LanguageDetector": ".languages",
+    "extract_emails": ".emails",
+    "NdjsonWriter": ".ndjson",
+    "iter_ndjson": ".ndjson",
+    "Pipeline": ".pipeline",
+    "Stage": ".pipeline",
+})
+
+if TYPE_CHECKING:
+    from .help import print_all_opts
+    from .keywords import KeywordMatcher
+    from .languages import LanguageDetector
+    from .emails import extract_emails
+    from .ndjson import NdjsonWriter, iter_ndjson
+    from .pipeline import Pipeline, Stage
@@ -0,0 +1,29 @@
+""" Email address extraction from ads
+"""
+import re
+from typing import List
+from ..schemas.schemas import Ad
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}")
+
+
+def extract_emails(ad: Ad, description: bool = False) -> List[str]:
+    """Finds the email addresses of an ad
+
+    Looks at the structured fields: the application details, the employer and
+    the application contacts. This is what "has an email" means everywhere,
+    in the email filter, `AdStore` and `JobGetClient.filter_emails`.
+    Addresses written in the description text are only scraped on request
+
+    Args:
+        ad (Ad): Ad to search
+        description (bool): Also scrape addresses from the description text
+
+    Returns:
+        List[str]: Unique addresses, structured fields first
+    """
+    found = [ad.application_details.email, ad.employer.email]
+    found += [c.email for c in ad.application_contacts]
+    if description:
+        found += EMAIL.findall(ad.description.text)
+    return list(dict.fromkeys(e.strip() for e in found if e and e.strip()))
@@ -82,12 +82,30 @@ def print_all_opts():
 
     \033[1;35m---short-------long--------------description----\033[0;0m
     -h         | --help            | print this help
-    -q \033[1;32m<query>\033[0m | --query=\033[1;32m<query>\033[0m   | search for \033[1;32m<query>\033[0m \033[0;31m(required)\033[0;0m
+    -q \033[1;32m<query>\033[0m | --query=\033[1;32m<query>\033[0m   | search for \033[1;32m<query>\033[0m \033[0;31m(required)\033[0;0m, repeat for a batch
     -l \033[1;32m<lang>\033[0m  | --lang=\033[1;32m<lang>\033[0m     | search for \033[1;32m<lang>\033[0m  \033[0;33m(sv, en)\033[0;0m
-    -f \033[1;32m<csv>\033[0m   | --filter=\033[1;32m<csv>\033[0m    | filter results by \033[1;32m<csv>\033[0;0m
+    -f \033[1;32m<csv>\033[0m   | --filter=\033[1;32m<csv>\033[0m    | filter results by \033[1;32m<csv>\033[0;0m, -word excludes
     -e         | --email           | search for ads with email
     -r         | --remote          | search for remote jobs
     -s         | --send            | send applications to ads with email
     -w         | --write           | write results from different stages to separate files
+    -j \033[1;32m<n>\033[0m     | --workers=\033[1;32m<n>\033[0m     | detect languages in \033[1;32m<n>\033[0m processes (default: all cores)
+               | --queries=\033[1;32m<file>\033[0m | add the queries in \033[1;32m<file>\033[0m, one per line, to the batch
+               | --no-cache        | don't read or write the caches
+               | --refresh         | ignore cached responses and fetch again
+               | --sync            | only fetch ads published since the last --sync run
+               | --store           | save fetched ads to the local ad store
+               | --whole-words     | only match whole words with --filter
+               | --fold-diacritics | ignore diacritics with --filter, "e" matches "é"
+               | --email-text      | like -e, also counting addresses in the description text
+               | --detector=\033[1;32m<name>\033[0m | language detector, ngram (default) or langdetect
+               | --compact         | keep fetched ads compact, uses less memory on big queries
+               | --compress=\033[1;32m<c>\033[0m    | compress result files with \033[1;32m<c>\033[0m, gzip or zstd (needs zstandard)
+               | --metrics=\033[1;32m<file>\033[0m | write request and stage timings to \033[1;32m<file>\033[0m, JSON lines or Prometheus text for .prom
+               | --brief           | fetch brief hits, then full ads only for those not excluded by -keywords
+               | --facets=\033[1;32m<csv>\033[0m  | only count ads per region, municipality, country, occupation-name/-group/-field or all
+               | --report          | write a searchable HTML report to results/report_\033[1;32m<query>\033[0m/
+               | --daemon=\033[1;32m<file>\033[0m  | run the saved queries in \033[1;32m<file>\033[0m on their intervals until interrupted
+               | --port=\033[1;32m<n>\033[0m     | serve the daemon's /health and /status on port \033[1;32m<n>\033[0m (default 8765)
     \033[0;35m------------------------------------------------\033[0;0m
     """)
\ No newline at end of file
@@ -0,0 +1,208 @@
+""" Multi-keyword matching for ad texts
+"""
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Set, Union
+
+_WORD = re.compile(r"\w")
+
+
+def normalize(text: str, fold_diacritics: bool = False) -> str:
+    """Normalizes text for matching
+
+    Args:
+        text (str): Text to normalize
+        fold_diacritics (bool): Also strip diacritics, so "å", "ä" and "é" match "a" and "e"
+
+    Returns:
+        str: Case folded text in composed (NFC) form, or without diacritics if folded
+    """
+    text = text.casefold()
+    if not fold_diacritics:
+        return unicodedata.normalize("NFC", text)
+    return "".join(c for c in unicodedata.normalize("NFD", text)
+                   if not unicodedata.combining(c))
+
+
+class _Trie:
+    """Trie of keywords, compiled to a regex and walked as an Aho-Corasick automaton
+
+    Args:
+        keywords (Iterable[str]): Keywords, already normalized
+    """
+    def __init__(self, keywords: Iterable[str]) -> None:
+        # node 0 is the root, a node is the keyword ending there, if any, and its children
+        self.children: List[Dict[str, int]] = [{}]
+        self.keyword: List[Union[str, None]] = [None]
+        for keyword in keywords:
+            node = 0
+            for char in keyword:
+                child = self.children[node].get(char)
+                if child is None:
+                    child = len(self.children)
+                    self.children[node][char] = child
+                    self.children.append({})
+                    self.keyword.append(None)
+                node = child
+            self.keyword[node] = keyword
+
+    def pattern(self, node: int = 0) -> str:
+        """Regex matching the keywords below a node, longest first
+
+        Every branch starts with a different character, so the regex engine
+        follows one of them per position instead of trying every keyword.
+        """
+        branches = []
+        for char, child in self.children[node].items():
+            literal = char
+            # a chain of single children is one literal, keeping the regex shallow
+            while self.keyword[child] is None and len(self.children[child]) == 1:
+                (char, child), = self.children[child].items()
+                literal += char
+            branches.append(re.escape(literal) + self.pattern(child))
+        if not branches:
+            return ""
+        if self.keyword[node] is not None:
+            # greedy, the longer keywords are tried first
+            return f"(?:{'|'.join(branches)})?"
+        return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+
+    def contained(self, whole_words: bool) -> Dict[str, List[str]]:
+        """Keywords found inside each keyword, from the automaton's output links
+
+        Args:
+            whole_words (bool): Only count keywords at word boundaries of the outer one
+
+        Returns:
+            Dict[str, List[str]]: Other keywords occurring in every keyword
+        """
+        # fail links point to the longest proper suffix that is in the trie, output links
+        # to the longest such suffix that is a keyword, built breadth first in linear time
+        fail = [0] * len(self.children)
+        output = [0] * len(self.children)
+        queue = deque(self.children[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.children[node].items():
+                state = fail[node]
+                while state and char not in self.children[state]:
+                    state = fail[state]
+                target = self.children[state].get(char, 0)
+                fail[child] = target
+                output[child] = fail[child] if self.keyword[fail[child]] is not None else output[fail[child]]
+                queue.append(child)
+        contained: Dict[str, List[str]] = {}
+        for node, keyword in enumerate(self.keyword):
+            if keyword is None:
+                continue
+            found: Dict[str, None] = {}
+            state = 0
+            for end, char in enumerate(keyword, 1):
+                # the path of a keyword is in the trie, no fail links are needed to walk it
+                state = self.children[state][char]
+                inner = state if self.keyword[state] is not None else output[state]
+                while inner:
+                    other = self.keyword[inner]
+                    start = end - len(other)
+                    if other != keyword and (not whole_words or (
+                            (start == 0 or not _WORD.match(keyword[start - 1]))
+                            and (end == len(keyword) or not _WORD.match(keyword[end])))):
+                        found[other] = None
+                    inner = output[inner]
+            contained[keyword] = list(found)
+        return contained
+
+
+class KeywordMatcher:
+    """Matches many keywords at once with compiled regexes
+
+    The keywords are compiled into a trie shaped regex, at every position of
+    a text the regex engine follows the one branch the next characters lead
+    to, so matching cost grows with the length of the text and of the
+    keywords found rather than with how many keywords are given. Matches
+    may overlap, "machine learning engineer" finds both "machine learning"
+    and "learning engineer", and "javascript" finds "java" as well.
+    Keywords starting with "-" are negative: texts containing them never match.
+
+    Args:
+        keywords (Iterable[str]): Keywords, "-" prefixed ones are negative
+        whole_words (bool): Only match keywords at word boundaries
+        fold_diacritics (bool): Ignore diacritics when matching
+    """
+    # part of the key of cached matches, bump it when what matches changes
+    VERSION = 2
+
+    def __init__(
+        self,
+        keywords: Iterable[str],
+        whole_words: bool = False,
+        fold_diacritics: bool = False) -> None:
+        self.whole_words = whole_words
+        self.fold_diacritics = fold_diacritics
+        self.positive: List[str] = []
+        self.negative: List[str] = []
+        for keyword in keywords:
+            keyword = keyword.strip()
+            if keyword.startswith("-") and keyword[1:]:
+                self.negative.append(keyword[1:])
+            elif keyword and not keyword.startswith("-"):
+                self.positive.append(keyword)
+        self.__originals: Dict[str, Set[str]] = {}
+        for keyword in self.positive:
+            self.__originals.setdefault(self.__norm(keyword), set()).add(keyword)
+        # tried at every position, so keywords overlapping an earlier match are found too;
+        # the longest keyword starting there is matched, the others are added back from __contained
+        positive = _Trie(self.__originals)
+        self.__contained = positive.contained(whole_words)
+        self.__positive = self.__compile(positive, overlapping=True) if self.positive else None
+        self.__negative = self.__compile(
+            _Trie(self.__norm(k) for k in self.negative)) if self.negative else None
+
+    def find(self, text: str) -> Set[str]:
+        """Finds every positive keyword in the text
+
+        Args:
+            text (str): Text to search
+
+        Returns:
+            Set[str]: Keywords found as they were given
+        """
+        return self.__find(self.__norm(text))
+
+    def match(self, text: str) -> Union[Set[str], None]:
+        """Checks a text against the keywords
+
+        Args:
+            text (str): Text to search
+
+        Returns:
+            Union[Set[str], None]: None if a negative keyword is found or positive keywords
+            are given and none is found, otherwise the positive keywords found
+        """
+        text = self.__norm(text)
+        if self.__negative is not None and self.__negative.search(text):
+            return None
+        found = self.__find(text)
+        if self.positive and not found:
+            return None
+        return found
+
+    def __find(self, text: str) -> Set[str]:
+        if self.__positive is None:
+            return set()
+        found: Set[str] = set()
+        for m in set(self.__positive.findall(text)):
+            for p in (m, *self.__contained[m]):
+                found |= self.__originals[p]
+        return found
+
+    def __norm(self, text: str) -> str:
+        return normalize(text, self.fold_diacritics)
+
+    def __compile(self, trie: _Trie, overlapping: bool = False) -> "re.Pattern[str]":
+        alternation = trie.pattern()
+        if self.whole_words:
+            alternation = rf"(?<!\w)(?:{alternation})(?!\w)"
+        # a lookahead consumes nothing, findall then captures a match at every position
+        return re.compile(rf"(?=({alternation}))" if overlapping else alternation)
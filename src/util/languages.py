@@ -0,0 +1,242 @@
+""" Language detection spread over a process pool
+"""
+import asyncio
+import os
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple, Union
+from ..schemas.schemas import Ad
+from ..store.derived import DerivedCache
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# languages commonly seen in Swedish job ads, loaded next to the requested
+# ones so e.g. a Danish ad isn't forced into "sv" when only sv/en are wanted
+NEIGHBOURS = ("sv", "en", "da", "no", "de", "fi")
+
+
+class LangdetectBackend:
+    """langdetect, slow to load and to run but covers 55 languages
+
+    Args:
+        seed (int): Seed for langdetect so results are reproducible
+    """
+    def __init__(self, seed: int = 0) -> None:
+        self.seed = seed
+
+    def load(self) -> None:
+        from langdetect.detector_factory import init_factory
+        init_factory()
+
+    def detect_scored(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        from langdetect import DetectorFactory, detect_langs
+        from langdetect.lang_detect_exception import LangDetectException
+        DetectorFactory.seed = self.seed
+        res = []
+        for text in texts:
+            try:
+                best = detect_langs(text)[0]
+                res.append((str(best.lang), best.prob))
+            except LangDetectException:
+                res.append(("unknown", 0.0))
+        return res
+
+
+class NgramBackend:
+    """Character n-gram model restricted to a few languages, langdetect as fallback
+
+    Texts without any known n-gram are passed to the fallback
+
+    Args:
+        languages (Union[Sequence[str], None]): Candidate languages, `NEIGHBOURS` are always added
+        seed (int): Seed for the langdetect fallback
+    """
+    def __init__(self, languages: Union[Sequence[str], None] = None, seed: int = 0) -> None:
+        self.languages = sorted(set(languages or ()) | set(NEIGHBOURS))
+        self.fallback = LangdetectBackend(seed)
+        self.__model = None
+
+    def load(self) -> None:
+        from .ngram import NgramModel
+        if self.__model is None:
+            self.__model = NgramModel(self.languages)
+
+    def detect_scored(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        self.load()
+        res: List[Union[Tuple[str, float], None]] = [self.__model.detect(t) for t in texts]
+        missing = [i for i, r in enumerate(res) if r is None]
+        if missing:
+            for i, r in zip(missing, self.fallback.detect_scored([texts[i] for i in missing])):
+                res[i] = r
+        return res
+
+
+BACKENDS = ("ngram", "langdetect")
+
+
+def unknown_languages(languages: Sequence[str]) -> List[str]:
+    """Languages neither backend can detect, e.g. misspelled codes
+
+    Args:
+        languages (Sequence[str]): Language codes
+
+    Returns:
+        List[str]: Codes without a profile, sorted
+    """
+    from .ngram import profile_languages
+    return sorted(set(languages) - set(profile_languages()))
+
+# one backend per process and configuration, so models load once per worker
+_backends: Dict[Tuple, Union[NgramBackend, LangdetectBackend]] = {}
+
+
+def _backend(name: str, languages: Tuple[str, ...], seed: int) -> Union[NgramBackend, LangdetectBackend]:
+    key = (name, languages, seed)
+    if key not in _backends:
+        if name == "ngram":
+            _backends[key] = NgramBackend(languages, seed)
+        else:
+            _backends[key] = LangdetectBackend(seed)
+    return _backends[key]
+
+
+def _init_worker(name: str, languages: Tuple[str, ...], seed: int) -> None:
+    _backend(name, languages, seed).load()
+
+
+def _detect_chunk(texts: List[str], name: str, languages: Tuple[str, ...], seed: int) -> List[Tuple[str, float]]:
+    return _backend(name, languages, seed).detect_scored(texts)
+
+
+def ad_text(ad: Ad, max_chars: int = 2000) -> str:
+    """Text used to detect the language of an ad
+
+    Uses the headline and the start of the description rather than a few words,
+    so bilingual ads are classified by their main language
+
+    Args:
+        ad (Ad): Ad to get the text of
+        max_chars (int): Maximum length of the text
+
+    Returns:
+        str: Text to detect
+    """
+    return f"{ad.headline}\n{ad.description.text}"[:max_chars]
+
+
+class LanguageDetector:
+    """Detects languages of many texts in parallel
+
+    Texts are split into chunks which are detected in a process pool,
+    so detection uses every core and doesn't block the event loop.
+    Every worker loads its backend once and seeds langdetect so results
+    are reproducible. Batches no bigger than one chunk are detected in a
+    thread instead, which avoids starting the pool for small runs.
+
+    Args:
+        workers (Union[int, None]): Number of worker processes, defaults to the number of cores
+        chunk_size (int): Number of texts sent to a worker at a time
+        seed (int): Seed for langdetect
+        backend (str): "ngram" (default) or "langdetect"
+        languages (Union[Sequence[str], None]): Candidate languages for the ngram backend
+
+    Raises:
+        ValueError: If the backend is unknown or a language has no profile
+    """
+    def __init__(
+        self,
+        workers: Union[int, None] = None,
+        chunk_size: int = 100,
+        seed: int = 0,
+        backend: str = "ngram",
+        languages: Union[Sequence[str], None] = None) -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown language backend {backend}, use one of {BACKENDS}")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.backend = backend
+        self.languages = tuple(sorted(languages or ()))
+        unknown = unknown_languages(self.languages)
+        if unknown:
+            # checked here, a worker failing to load its model would end the whole run
+            raise ValueError(f"Unknown languages {unknown}, use codes like sv or en")
+        self.__pool: Union["ProcessPoolExecutor", None] = None
+
+    async def detect(self, texts: Sequence[str]) -> List[str]:
+        """Detects the language of every text
+
+        Args:
+            texts (Sequence[str]): Texts to detect
+
+        Returns:
+            List[str]: Language codes in the same order as texts, "unknown" if undetectable
+        """
+        return [lang for lang, _ in await self.detect_scored(texts)]
+
+    async def detect_scored(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Detects the language of every text with its probability
+
+        Args:
+            texts (Sequence[str]): Texts to detect
+
+        Returns:
+            List[Tuple[str, float]]: Language codes and probabilities in the same order as texts,
+            ("unknown", 0.0) if undetectable
+        """
+        loop = asyncio.get_running_loop()
+        texts = list(texts)
+        config = (self.backend, self.languages, self.seed)
+        if len(texts) <= self.chunk_size or self.workers == 1:
+            return await loop.run_in_executor(None, _detect_chunk, texts, *config)
+        if self.__pool is None:
+            # multiprocessing is only imported when a pool is needed
+            from concurrent.futures import ProcessPoolExecutor
+            self.__pool = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker, initargs=config)
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(self.__pool, _detect_chunk,
+                                 texts[i:i + self.chunk_size], *config)
+            for i in range(0, len(texts), self.chunk_size)))
+        return [lang for chunk in chunks for lang in chunk]
+
+    def close(self) -> None:
+        """Shuts down the worker processes
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+    def __enter__(self) -> "LanguageDetector":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+async def detect_ad_languages(
+    ads: Sequence[Ad],
+    detector: LanguageDetector,
+    cache: Union[DerivedCache, None] = None) -> None:
+    """Sets ad.language on every ad, detecting only ads without a cached language
+
+    Args:
+        ads (Sequence[Ad]): Ads to detect
+        detector (LanguageDetector): Detector for ads that aren't cached
+        cache (Union[DerivedCache, None]): Cache to read from and fill
+    """
+    cached = cache.get(ads) if cache else {}
+    todo = []
+    for ad in ads:
+        fields = cached.get(ad.id)
+        if fields is not None and fields.language is not None:
+            ad.language = fields.language
+        else:
+            todo.append(ad)
+    if not todo:
+        return
+    detected = await detector.detect_scored([ad_text(ad) for ad in todo])
+    for ad, (lang, _) in zip(todo, detected):
+        ad.language = lang
+    if cache:
+        cache.update((ad, {"language": lang, "confidence": confidence})
+                     for ad, (lang, confidence) in zip(todo, detected))
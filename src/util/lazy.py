@@ -0,0 +1,35 @@
+""" Package exports imported on first use
+"""
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Module `__getattr__` and `__dir__` importing each export from its submodule when first used
+
+    Keeps `import src.util` and `from src.util import X` from importing every
+    submodule, and with them pydantic, httpx and the email modules, when
+    only one export is used
+
+    Args:
+        package (str): `__name__` of the package
+        exports (Dict[str, str]): Submodule of every export, relative to the package
+
+    Returns:
+        Tuple[Callable[[str], Any], Callable[[], List[str]]]: `__getattr__` and `__dir__` for the package
+
+    Usage:
+        __getattr__, __dir__ = lazy_exports(__name__, {"AdStore": ".store"})
+    """
+    namespace = import_module(package).__dict__
+
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(import_module(exports[name], package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(exports))
+    return __getattr__, __dir__
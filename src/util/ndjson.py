@@ -0,0 +1,149 @@
+""" Streaming NDJSON result files, optionally compressed
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, Union
+
+# only reading needs pydantic, writing takes anything with .json()
+if TYPE_CHECKING:
+    from ..schemas.schemas import Ad
+    from ..schemas.compact import CompactAd
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+SUFFIXES = {"none": ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def compression_of(path: str) -> str:
+    """Compression of a result file from its suffix
+
+    Args:
+        path (str): Path ending in .gz, .zst or anything else for none
+
+    Returns:
+        str: One of `COMPRESSIONS`
+    """
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compression needs the zstandard package") from e
+    return zstandard
+
+
+def _open_binary(path: str, mode: str, compression: str, level: Union[int, None]) -> IO[bytes]:
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=level or 6)
+    if compression == "zstd":
+        zstandard = _zstd()
+        f = open(path, mode)
+        if mode == "wb":
+            return zstandard.ZstdCompressor(level=level or 3).stream_writer(f)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+    return open(path, mode)
+
+
+class NdjsonWriter:
+    """Writes ads one JSON object per line as they arrive
+
+    Lines go to a temporary file next to `path`, which replaces `path` only
+    when the writer is closed without an error, so readers never see a
+    half written file.
+
+    Args:
+        path (str): File to write
+        compression (Union[str, None]): One of `COMPRESSIONS`, guessed from the suffix if None
+        level (Union[int, None]): Compression level, the library default if None
+
+    Usage:
+        with NdjsonWriter("results/res_final.ndjson.gz") as writer:
+            writer.write_all(ads)
+    """
+    def __init__(self, path: str, compression: Union[str, None] = None, level: Union[int, None] = None) -> None:
+        compression = compression or compression_of(path)
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}, use one of {COMPRESSIONS}")
+        self.path = path
+        self.compression = compression
+        self.count = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__tmp = f"{path}.tmp-{os.getpid()}"
+        self.__file = _open_binary(self.__tmp, "wb", compression, level)
+
+    def write(self, ad: Union[Ad, CompactAd]) -> None:
+        self.__file.write(ad.json(ensure_ascii=False).encode("utf-8"))
+        self.__file.write(b"\n")
+        self.count += 1
+
+    def write_all(self, ads: Iterable[Union[Ad, CompactAd]]) -> int:
+        """Writes every ad, consuming `ads` lazily
+
+        Returns:
+            int: Number of ads written by this call
+        """
+        start = self.count
+        for ad in ads:
+            self.write(ad)
+        return self.count - start
+
+    def close(self) -> None:
+        """Finishes the file and moves it to `path`
+        """
+        if self.__file.closed:
+            return
+        self.__file.close()
+        os.replace(self.__tmp, self.path)
+
+    def discard(self) -> None:
+        """Drops everything written, `path` is left as it was
+        """
+        if not self.__file.closed:
+            self.__file.close()
+        if os.path.exists(self.__tmp):
+            os.remove(self.__tmp)
+
+    def __enter__(self) -> "NdjsonWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def iter_ndjson(
+    path: str,
+    compression: Union[str, None] = None,
+    compact: bool = False) -> Iterator[Union[Ad, CompactAd]]:
+    """Reads ads written by `NdjsonWriter` one line at a time
+
+    Args:
+        path (str): File to read
+        compression (Union[str, None]): One of `COMPRESSIONS`, guessed from the suffix if None
+        compact (bool): Yield `CompactAd`s sharing one `Interner` instead of validated ads
+
+    Yields:
+        Union[Ad, CompactAd]: Ads in file order, blank lines are skipped
+    """
+    compression = compression or compression_of(path)
+    from ..schemas.schemas import Ad
+    from ..schemas.compact import CompactAd, Interner
+    interner = Interner() if compact else None
+    with _open_binary(path, "rb", compression, None) as f:
+        for line in io.TextIOWrapper(f, encoding="utf-8"):
+            if not line.strip():
+                continue
+            hit = json.loads(line)
+            yield CompactAd(hit, interner=interner) if interner else Ad(**hit)
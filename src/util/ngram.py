@@ -0,0 +1,130 @@
+""" Compact character n-gram language model
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple, Union
+
+NON_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def profile_dir() -> str:
+    """Directory of the n-gram profiles shipped with langdetect
+    """
+    import langdetect
+    return os.path.join(os.path.dirname(langdetect.__file__), "profiles")
+
+
+def profile_languages(path: Union[str, None] = None) -> List[str]:
+    """Languages that have a profile
+
+    Args:
+        path (Union[str, None]): Directory with profiles, langdetect's if None
+
+    Returns:
+        List[str]: Language codes, sorted
+    """
+    return sorted(os.listdir(path or profile_dir()))
+
+
+def ngrams(text: str, n: int = 3) -> Counter:
+    """Counts the 1 to n character grams of every word, padded with spaces like langdetect profiles
+
+    Args:
+        text (str): Text to split
+        n (int): Longest gram
+
+    Returns:
+        Counter: Counts of every gram
+    """
+    counts: Counter = Counter()
+    for word in NON_LETTERS.sub(" ", text).split():
+        padded = f" {word} "
+        for size in range(1, n + 1):
+            for i in range(len(padded) - size + 1):
+                gram = padded[i:i + size]
+                if gram.strip():
+                    counts[gram] += 1
+    return counts
+
+
+class NgramModel:
+    """Naive Bayes language classifier over character n-grams
+
+    Only the profiles of the given languages are loaded, which keeps the model
+    small and loading fast. Scores are softmaxed log likelihoods, so the
+    probabilities sum to one over the loaded languages.
+
+    Args:
+        languages (Union[Iterable[str], None]): Languages to load, all shipped profiles if None
+        path (Union[str, None]): Directory with profiles in langdetect's format
+
+    Raises:
+        ValueError: If a language has no profile
+    """
+    def __init__(
+        self,
+        languages: Union[Iterable[str], None] = None,
+        path: Union[str, None] = None) -> None:
+        path = path or profile_dir()
+        known = profile_languages(path)
+        self.languages: List[str] = sorted(languages) if languages else known
+        unknown = sorted(set(self.languages) - set(known))
+        if unknown:
+            raise ValueError(f"No profile for languages {unknown}, use one of {known}")
+        # gram -> log probability per language, grams no language has are never scored
+        self.__logprobs: Dict[str, Tuple[float, ...]] = {}
+        unseen: List[List[float]] = []
+        profiles = []
+        for lang in self.languages:
+            with open(os.path.join(path, lang), encoding="utf-8") as f:
+                profile = json.load(f)
+            profiles.append(profile)
+            unseen.append([math.log(0.5 / (total + 1)) for total in profile["n_words"]])
+        grams = set().union(*(p["freq"] for p in profiles)) if profiles else set()
+        for gram in grams:
+            size = min(len(gram), 3) - 1
+            self.__logprobs[gram] = tuple(
+                math.log((p["freq"][gram] + 0.5) / (p["n_words"][size] + 1))
+                if gram in p["freq"] else unseen[i][size]
+                for i, p in enumerate(profiles))
+
+    def scores(self, text: str) -> List[Tuple[str, float]]:
+        """Probability of every loaded language, most probable first
+
+        Args:
+            text (str): Text to classify
+
+        Returns:
+            List[Tuple[str, float]]: Languages and probabilities, empty if no known gram is found
+        """
+        totals = [0.0] * len(self.languages)
+        found = False
+        for gram, count in ngrams(text).items():
+            logprobs = self.__logprobs.get(gram)
+            if logprobs is None:
+                continue
+            found = True
+            for i, logprob in enumerate(logprobs):
+                totals[i] += count * logprob
+        if not found:
+            return []
+        top = max(totals)
+        weights = [math.exp(t - top) for t in totals]
+        norm = sum(weights)
+        return sorted(((lang, w / norm) for lang, w in zip(self.languages, weights)),
+                      key=lambda s: s[1], reverse=True)
+
+    def detect(self, text: str) -> Union[Tuple[str, float], None]:
+        """Most probable language
+
+        Args:
+            text (str): Text to classify
+
+        Returns:
+            Union[Tuple[str, float], None]: Language and probability, None if no known gram is found
+        """
+        scores = self.scores(text)
+        return scores[0] if scores else None
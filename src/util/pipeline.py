@@ -0,0 +1,246 @@
+""" Lazy filter pipeline with cost based stage ordering
+"""
+import inspect
+import json
+from typing import (
+    Any, AsyncGenerator, AsyncIterable, Awaitable, Callable, Iterable, List, Sequence, Tuple, Union)
+from ..schemas.schemas import Ad
+from ..store.derived import DerivedCache
+from ..client.metrics import Metrics
+from .emails import extract_emails
+from .keywords import KeywordMatcher
+from .languages import LanguageDetector, detect_ad_languages
+
+BatchFunc = Callable[[List[Ad]], Union[List[Ad], Awaitable[List[Ad]]]]
+
+
+class Stage:
+    """One filter of a `Pipeline`, applied to a batch of ads at a time
+
+    Stages are ordered by `rank`, the cost paid per ad removed, so cheap
+    selective stages run first. Until `min_seen` ads have passed through,
+    `selectivity` is the given estimate, after that the observed one.
+
+    Args:
+        name (str): Name shown in the summary
+        func (BatchFunc): Takes a batch and returns the ads that pass, may be async
+        cost (float): Relative cost per ad
+        selectivity (float): Estimated share of ads that pass
+        sinks (Sequence[Callable[[List[Ad]], Any]]): Called with every batch that passed
+        min_seen (int): Ads to see before the observed selectivity is used
+    """
+    def __init__(
+        self,
+        name: str,
+        func: BatchFunc,
+        *,
+        cost: float = 1.0,
+        selectivity: float = 0.5,
+        sinks: Sequence[Callable[[List[Ad]], Any]] = (),
+        min_seen: int = 100) -> None:
+        self.name = name
+        self.func = func
+        self.cost = cost
+        self.estimate = selectivity
+        self.sinks = list(sinks)
+        self.min_seen = min_seen
+        self.seen = 0
+        self.passed = 0
+
+    @property
+    def selectivity(self) -> float:
+        if self.seen < self.min_seen:
+            return self.estimate
+        return self.passed / self.seen
+
+    @property
+    def rank(self) -> float:
+        return self.cost / max(1.0 - self.selectivity, 1e-9)
+
+    async def __call__(self, batch: List[Ad]) -> List[Ad]:
+        res = self.func(batch)
+        if inspect.isawaitable(res):
+            res = await res
+        self.seen += len(batch)
+        self.passed += len(res)
+        if res:
+            for sink in self.sinks:
+                sink(res)
+        return res
+
+
+def predicate_stage(
+    name: str,
+    predicate: Callable[[Ad], bool],
+    *,
+    cost: float = 1.0,
+    selectivity: float = 0.5) -> Stage:
+    """Stage keeping the ads `predicate` is true for
+    """
+    return Stage(name, lambda batch: [ad for ad in batch if predicate(ad)],
+                 cost=cost, selectivity=selectivity)
+
+
+def email_stage(cache: Union[DerivedCache, None] = None, description: bool = False) -> Stage:
+    """Stage keeping ads with an email address, found addresses are added to ad.emails
+
+    Args:
+        cache (Union[DerivedCache, None]): Cache of addresses scraped from descriptions
+        description (bool): Also count addresses in the description text, see `extract_emails`
+    """
+    # reading the structured fields is cheaper than a cache lookup, only scraped addresses are cached
+    cache = cache if description else None
+
+    def run(batch: List[Ad]) -> List[Ad]:
+        cached = cache.get(batch) if cache else {}
+        extracted = []
+        for ad in batch:
+            fields = cached.get(ad.id)
+            if fields is not None and fields.emails is not None:
+                ad.emails = fields.emails
+            else:
+                ad.emails = extract_emails(ad, description)
+                extracted.append((ad, {'emails': ad.emails}))
+        if cache:
+            cache.update(extracted)
+        return [ad for ad in batch if ad.emails]
+    return Stage("email", run, cost=1.0, selectivity=0.3)
+
+
+def keyword_stage(
+    keywords: List[str],
+    whole_words: bool = False,
+    cache: Union[DerivedCache, None] = None,
+    fold_diacritics: bool = False) -> Stage:
+    """Stage keeping ads matching the keywords, matches are added to ad.matched_keywords
+
+    Matching is case insensitive, keywords prefixed with "-" exclude ads
+
+    Args:
+        keywords (List[str]): List of keywords
+        whole_words (bool): Only match whole words
+        cache (Union[DerivedCache, None]): Cache of keyword matches
+        fold_diacritics (bool): Ignore diacritics, so "e" matches "é"
+    """
+    matcher = KeywordMatcher(keywords, whole_words, fold_diacritics)
+    keyword_set = json.dumps([sorted(keywords), whole_words, fold_diacritics, KeywordMatcher.VERSION])
+
+    def run(batch: List[Ad]) -> List[Ad]:
+        cached = cache.get(batch) if cache else {}
+        matched = []
+        res = []
+        for ad in batch:
+            fields = cached.get(ad.id)
+            if fields is not None and fields.keyword_set == keyword_set:
+                found = fields.keywords
+            else:
+                found = matcher.match(f"{ad.headline}\n{ad.description.text}")
+                found = sorted(found) if found is not None else None
+                matched.append((ad, {'keyword_set': keyword_set, 'keywords': found}))
+            if found is not None:
+                ad.matched_keywords = found
+                res.append(ad)
+        if cache:
+            cache.update(matched)
+        return res
+    return Stage("keywords", run, cost=2.0, selectivity=0.2)
+
+
+def language_stage(
+    langs: List[str],
+    detector: LanguageDetector,
+    cache: Union[DerivedCache, None] = None) -> Stage:
+    """Stage keeping ads in one of the languages, the language is added to ad.language
+
+    Args:
+        langs (List[str]): Languages to keep
+        detector (LanguageDetector): Detector for ads without a cached language
+        cache (Union[DerivedCache, None]): Cache of detected languages
+    """
+    async def run(batch: List[Ad]) -> List[Ad]:
+        await detect_ad_languages(batch, detector, cache)
+        return [ad for ad in batch if ad.language in langs]
+    return Stage("language", run, cost=50.0, selectivity=0.7)
+
+
+async def _batches(
+    ads: Union[Iterable[Ad], AsyncIterable[Ad]],
+    size: int) -> AsyncGenerator[List[Ad], None]:
+    batch: List[Ad] = []
+    if isinstance(ads, AsyncIterable):
+        async for ad in ads:
+            batch.append(ad)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    else:
+        for ad in ads:
+            batch.append(ad)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class Pipeline:
+    """Runs ads through stages lazily, cheapest per removed ad first
+
+    Ads are read in batches, every batch goes through the stages in `rank`
+    order and stops at the first stage that removes all of it, so expensive
+    stages only see the ads that survived the cheap ones. Stages are ordered
+    again before every batch, using the selectivity observed so far.
+
+    Args:
+        stages (Iterable[Stage]): Stages to run
+        batch_size (int): Ads read at a time
+        metrics (Union[Metrics, None]): Receives the time of every stage run as "filter:{name}"
+
+    Usage:
+        pipeline = Pipeline([email_stage(), language_stage(["sv"], detector)])
+        async for ad in pipeline.run(client.iter_ads()):
+            #do stuff with ad
+    """
+    def __init__(
+        self,
+        stages: Iterable[Stage] = (),
+        *,
+        batch_size: int = 1000,
+        metrics: Union[Metrics, None] = None) -> None:
+        self.stages = list(stages)
+        self.batch_size = batch_size
+        self.metrics = metrics
+
+    def add(self, stage: Stage) -> "Pipeline":
+        self.stages.append(stage)
+        return self
+
+    def ordered(self) -> List[Stage]:
+        return sorted(self.stages, key=lambda stage: stage.rank)
+
+    async def run(self, ads: Union[Iterable[Ad], AsyncIterable[Ad]]) -> AsyncGenerator[Ad, None]:
+        """Yields the ads passing every stage
+
+        Args:
+            ads (Union[Iterable[Ad], AsyncIterable[Ad]]): Ads, can be a list or a stream
+
+        Yields:
+            Ad: Ads in input order within a batch
+        """
+        async for batch in _batches(ads, self.batch_size):
+            for stage in self.ordered():
+                if self.metrics:
+                    with self.metrics.stage(f"filter:{stage.name}", len(batch)) as out:
+                        batch = await stage(batch)
+                        out.append(len(batch))
+                else:
+                    batch = await stage(batch)
+                if not batch:
+                    break
+            for ad in batch:
+                yield ad
+
+    def summary(self) -> List[Tuple[str, int, int]]:
+        """Name, ads seen and ads passed of every stage, in the current order
+        """
+        return [(stage.name, stage.seen, stage.passed) for stage in self.ordered()]
@@ -0,0 +1,199 @@
+""" Streaming HTML report split into pages, with a search index
+"""
+import html
+import json
+import os
+from typing import IO, Iterable, Union
+from ..schemas.schemas import Ad
+
+STYLE = """
+body { font-family: sans-serif; max-width: 60em; margin: auto; padding: 1em; }
+article { border-bottom: 1px solid #ccc; padding: .5em 0; }
+.meta { color: #555; font-size: .9em; }
+nav a { margin-right: 1em; }
+input { width: 100%; font-size: 1.1em; padding: .3em; }
+"""
+
+# loads the full descriptions of a page on the first "Show more",
+# script tags work for reports opened from disk where fetch doesn't
+PAGE_SCRIPT = """
+function more(id, src) {
+    var show = function () {
+        var el = document.getElementById("text-" + id);
+        el.textContent = window.jobgetTexts[id];
+    };
+    if (window.jobgetTexts) { show(); return; }
+    var s = document.createElement("script");
+    s.src = src;
+    s.onload = show;
+    document.head.appendChild(s);
+}
+"""
+
+INDEX_SCRIPT = """
+var input = document.getElementById("search");
+var list = document.getElementById("results");
+var count = document.getElementById("count");
+function render() {
+    var words = input.value.toLowerCase().split(/\\s+/).filter(Boolean);
+    var shown = 0, total = 0;
+    list.textContent = "";
+    window.jobgetIndex.forEach(function (row) {
+        var text = row.slice(2).join(" ").toLowerCase();
+        if (!words.every(function (w) { return text.indexOf(w) >= 0; })) return;
+        total++;
+        if (shown >= 200) return;
+        shown++;
+        var li = document.createElement("li");
+        var a = document.createElement("a");
+        a.href = row[1] + "#ad-" + row[0];
+        a.textContent = row[2];
+        li.appendChild(a);
+        li.appendChild(document.createTextNode(" " + row.slice(3).filter(Boolean).join(", ")));
+        list.appendChild(li);
+    });
+    count.textContent = total + " ads" + (total > shown ? ", showing " + shown : "");
+}
+input.addEventListener("input", render);
+render();
+"""
+
+
+def page_name(number: int) -> str:
+    return f"page-{number:04d}.html"
+
+
+def texts_name(number: int) -> str:
+    return f"page-{number:04d}.texts.js"
+
+
+class HtmlReport:
+    """Writes ads to a directory of HTML pages as they arrive
+
+    Every page holds `page_size` ads with escaped fields and descriptions cut
+    to `excerpt` characters. The full descriptions of a page are in a script
+    next to it that is only loaded when one is expanded. `index.html` searches
+    `index.js`, one row per ad, and links to the page of every match. Only
+    the open page is kept in memory, so reports of any size render in
+    constant memory.
+
+    Args:
+        directory (str): Directory to write to, created if missing
+        title (str): Title of every page
+        page_size (int): Ads per page
+        excerpt (int): Characters of the description shown before "Show more"
+
+    Usage:
+        with HtmlReport("results/report_python") as report:
+            report.write_all(ads)
+    """
+    def __init__(self, directory: str, title: str = "Jobs", page_size: int = 200, excerpt: int = 300) -> None:
+        self.directory = directory
+        self.title = title
+        self.page_size = page_size
+        self.excerpt = excerpt
+        self.count = 0
+        self.pages = 0
+        os.makedirs(directory, exist_ok=True)
+        self.__page: Union[IO[str], None] = None
+        self.__texts: Union[IO[str], None] = None
+        self.__texts_written = 0
+        self.__index = self.__open("index.js")
+        self.__index.write("window.jobgetIndex = [\n")
+
+    def write(self, ad: Ad) -> None:
+        if self.count % self.page_size == 0:
+            if self.__page is not None:
+                self.__close_page(last=False)
+            self.__open_page()
+        number = self.pages
+        text = ad.description.text if ad.description else ""
+        employer = ad.employer.name if ad.employer else None
+        municipality = ad.workplace_address.municipality if ad.workplace_address else None
+        meta = [employer, municipality, ad.language, ", ".join(ad.matched_keywords or [])]
+        e = html.escape
+        out = self.__page
+        out.write(f'<article id="ad-{e(ad.id)}">\n<h2>{e(ad.headline)}</h2>\n')
+        out.write(f'<p class="meta">{e(" · ".join(m for m in meta if m))}</p>\n')
+        if len(text) > self.excerpt:
+            self.__texts.write(f"{',' if self.__texts_written else ''}{json.dumps(ad.id)}: {json.dumps(text)}\n")
+            self.__texts_written += 1
+            call = e(f"more({json.dumps(ad.id)}, {json.dumps(texts_name(number))})")
+            out.write(f'<p class="text" id="text-{e(ad.id)}">{e(text[:self.excerpt])}… '
+                      f'<button onclick="{call}">Show more</button></p>\n')
+        else:
+            out.write(f'<p class="text">{e(text)}</p>\n')
+        if ad.webpage_url:
+            out.write(f'<p><a href="{e(ad.webpage_url)}">{e(ad.webpage_url)}</a></p>\n')
+        out.write("</article>\n")
+        row = [ad.id, page_name(number), ad.headline, employer, municipality, ad.language]
+        self.__index.write(f"{json.dumps(row, ensure_ascii=False)},\n")
+        self.count += 1
+
+    def write_all(self, ads: Iterable[Ad]) -> int:
+        """Writes every ad, consuming `ads` lazily
+
+        Returns:
+            int: Number of ads written by this call
+        """
+        start = self.count
+        for ad in ads:
+            self.write(ad)
+        return self.count - start
+
+    def close(self) -> None:
+        """Finishes the last page and writes index.html
+        """
+        if self.__index.closed:
+            return
+        if self.__page is not None:
+            self.__close_page(last=True)
+        self.__index.write("];\n")
+        self.__index.close()
+        with self.__open("index.html") as f:
+            f.write(self.__header(self.title))
+            f.write(f'<h1>{html.escape(self.title)}</h1>\n<input id="search" placeholder="Search" autofocus>\n'
+                    f'<p id="count"></p>\n<ol id="results"></ol>\n'
+                    f'<nav>{" ".join(self.__link(n) for n in range(1, self.pages + 1))}</nav>\n'
+                    f'<script src="index.js"></script>\n<script>{INDEX_SCRIPT}</script>\n</body>\n</html>\n')
+
+    def __enter__(self) -> "HtmlReport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __open(self, name: str) -> IO[str]:
+        return open(os.path.join(self.directory, name), "w", encoding="utf-8")
+
+    def __header(self, title: str) -> str:
+        return (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                f'<title>{html.escape(title)}</title>\n<style>{STYLE}</style>\n</head>\n<body>\n')
+
+    @staticmethod
+    def __link(number: int, label: Union[str, None] = None) -> str:
+        return f'<a href="{page_name(number)}">{html.escape(label or str(number))}</a>'
+
+    def __open_page(self) -> None:
+        self.pages += 1
+        number = self.pages
+        self.__page = self.__open(page_name(number))
+        self.__texts = self.__open(texts_name(number))
+        self.__texts.write("window.jobgetTexts = {\n")
+        self.__texts_written = 0
+        title = f"{self.title} - page {number}"
+        self.__page.write(self.__header(title))
+        self.__page.write(f'<nav><a href="index.html">Search</a>'
+                          f'{self.__link(number - 1, "Previous") if number > 1 else ""}</nav>\n'
+                          f'<h1>{html.escape(title)}</h1>\n')
+
+    def __close_page(self, last: bool) -> None:
+        number = self.pages
+        self.__page.write(f'<nav><a href="index.html">Search</a>'
+                          f'{self.__link(number - 1, "Previous") if number > 1 else ""}'
+                          f'{"" if last else self.__link(number + 1, "Next")}</nav>\n'
+                          f'<script>{PAGE_SCRIPT}</script>\n</body>\n</html>\n')
+        self.__page.close()
+        self.__texts.write("};\n")
+        self.__texts.close()
+        self.__page = self.__texts = None
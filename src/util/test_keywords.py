@@ -0,0 +1,59 @@
+import random
+import re
+from .keywords import KeywordMatcher, normalize
+
+
+class TestKeywordMatcher:
+    def test_case_and_overlap(self):
+        matcher = KeywordMatcher(["java", "JavaScript", "python"])
+        assert matcher.match("Vi söker en JAVASCRIPT-utvecklare") == {"java", "JavaScript"}
+        assert matcher.match("Rust") is None
+
+    def test_overlapping(self):
+        matcher = KeywordMatcher(["machine learning", "learning engineer", "javascript", "script"])
+        assert matcher.match("Machine Learning Engineer") == {"machine learning", "learning engineer"}
+        assert matcher.match("JavaScript") == {"javascript", "script"}
+        words = KeywordMatcher(["machine learning", "learning engineer"], whole_words=True)
+        assert words.match("machine learning engineers") == {"machine learning"}
+        # a negative keyword overlapping a positive one still excludes the ad
+        assert KeywordMatcher(["machine learning", "-learning engineer"]).match("Machine Learning Engineer") is None
+
+    def test_negative(self):
+        matcher = KeywordMatcher(["python", "-senior"])
+        assert matcher.match("Python developer") == {"python"}
+        assert matcher.match("Senior Python developer") is None
+        assert KeywordMatcher(["-senior"]).match("Junior") == set()
+
+    def test_whole_words(self):
+        matcher = KeywordMatcher(["java"], whole_words=True)
+        assert matcher.match("Java, Kotlin") == {"java"}
+        assert matcher.match("JavaScript") is None
+
+    def test_diacritics(self):
+        decomposed = "la\u0308rare"
+        assert KeywordMatcher(["lärare"]).match(decomposed) == {"lärare"}
+        assert KeywordMatcher(["lärare"]).match("larare") is None
+        assert KeywordMatcher(["lärare"], fold_diacritics=True).match("LARARE") == {"lärare"}
+        assert normalize("Café", fold_diacritics=True) == "cafe"
+
+    def test_same_as_naive_scan(self):
+        rng = random.Random(7)
+        alphabet = "ab cé-"
+        for _ in range(500):
+            keywords = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))).strip("- ")
+                        for _ in range(rng.randint(1, 10))} - {""}
+            text = "".join(rng.choice(alphabet + "AÉ") for _ in range(rng.randint(0, 40)))
+            for fold in (False, True):
+                folded = normalize(text, fold)
+                found = {k for k in keywords if normalize(k, fold) in folded}
+                assert KeywordMatcher(keywords, fold_diacritics=fold).find(text) == found
+                words = {k for k in keywords
+                         if re.search(rf"(?<!\w){re.escape(normalize(k, fold))}(?!\w)", folded)}
+                assert KeywordMatcher(keywords, whole_words=True, fold_diacritics=fold).find(text) == words
+
+    def test_many_keywords(self):
+        rng = random.Random(7)
+        keywords = ["".join(rng.choice("abcdefghij") for _ in range(8)) for _ in range(5000)]
+        matcher = KeywordMatcher(keywords)
+        text = " ".join(keywords[::97])
+        assert matcher.find(text) == {k for k in keywords if k in text}
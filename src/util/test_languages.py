@@ -0,0 +1,38 @@
+import asyncio
+import json
+import os
+import pytest
+from .languages import LanguageDetector, NgramBackend
+from .ngram import NgramModel
+
+
+TEXTS = [
+    "Vi söker en erfaren utvecklare till vårt team i Stockholm",
+    "We are looking for an experienced developer to join our team",
+    "1234 5678",
+] * 5
+
+
+class TestLanguageDetector:
+    def test_pool_matches_serial(self):
+        with LanguageDetector(workers=1) as serial:
+            expected = asyncio.run(serial.detect(TEXTS))
+        with LanguageDetector(workers=2, chunk_size=4) as pooled:
+            assert asyncio.run(pooled.detect(TEXTS)) == expected
+        assert expected[:3] == ["sv", "en", "unknown"]
+
+    def test_ngram_fixture_accuracy(self):
+        fixture = os.path.join(os.path.dirname(__file__), "..", "..", "bench", "fixtures", "ads_sv_en.json")
+        with open(fixture, encoding="utf-8") as f:
+            corpus = json.load(f)
+        detected = NgramBackend(["sv", "en"]).detect_scored([ad["text"] for ad in corpus])
+        correct = sum(lang == ad["language"] for (lang, _), ad in zip(detected, corpus))
+        assert correct / len(corpus) >= 0.95
+        assert all(0.5 < p <= 1 for _, p in detected)
+
+    def test_unknown_language(self):
+        with pytest.raises(ValueError, match="se"):
+            LanguageDetector(languages=["sv", "se"])
+        with pytest.raises(ValueError, match="se"):
+            NgramModel(["se"])
+        assert NgramModel(["sv"]).languages == ["sv"]
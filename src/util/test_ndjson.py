@@ -0,0 +1,56 @@
+import gzip
+import os
+import pytest
+from .ndjson import NdjsonWriter, iter_ndjson
+from ..schemas.schemas import Ad
+from ..schemas.compact import CompactAd
+from ..client.fake import make_ad
+
+
+def ads(n: int):
+    for i in range(n):
+        ad = Ad(**make_ad(i))
+        ad.language = "sv"
+        yield ad
+
+
+class TestNdjson:
+    @pytest.mark.parametrize("name", ["res.ndjson", "res.ndjson.gz"])
+    def test_roundtrip(self, tmp_path, name):
+        path = str(tmp_path / name)
+        with NdjsonWriter(path) as writer:
+            assert writer.write_all(ads(50)) == 50
+        read = list(iter_ndjson(path))
+        assert [ad.id for ad in read] == [str(i) for i in range(50)]
+        assert read[0] == next(ads(1))
+
+    def test_gzip_is_compressed(self, tmp_path):
+        path = str(tmp_path / "res.ndjson.gz")
+        with NdjsonWriter(path) as writer:
+            writer.write_all(ads(10))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            assert len(f.readlines()) == 10
+
+    def test_compact(self, tmp_path):
+        path = str(tmp_path / "res.ndjson")
+        with NdjsonWriter(path) as writer:
+            writer.write_all(ads(3))
+        read = list(iter_ndjson(path, compact=True))
+        assert all(isinstance(ad, CompactAd) for ad in read)
+        assert read[0].occupation is read[2].occupation
+        assert read[1].language == "sv"
+
+    def test_atomic(self, tmp_path):
+        path = str(tmp_path / "res.ndjson")
+        with NdjsonWriter(path) as writer:
+            writer.write_all(ads(2))
+        with pytest.raises(RuntimeError):
+            with NdjsonWriter(path) as writer:
+                writer.write_all(ads(5))
+                raise RuntimeError
+        assert len(list(iter_ndjson(path))) == 2
+        assert os.listdir(tmp_path) == ["res.ndjson"]
+
+    def test_unknown_compression(self, tmp_path):
+        with pytest.raises(ValueError):
+            NdjsonWriter(str(tmp_path / "res"), "bz2")
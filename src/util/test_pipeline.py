@@ -0,0 +1,77 @@
+import asyncio
+from .pipeline import Pipeline, Stage, email_stage, keyword_stage, predicate_stage
+from ..schemas.schemas import Ad
+from ..client.fake import make_ad
+
+
+def ads(n: int):
+    res = []
+    for i in range(n):
+        hit = make_ad(i)
+        if i % 4 == 0:
+            hit['application_details'] = {'email': f"jobs{i}@example.com", 'via_af': False}
+        if i % 2 == 0:
+            hit['headline'] = f"Python developer {i}"
+        res.append(Ad(**hit))
+    return res
+
+
+def run(pipeline, source):
+    async def collect():
+        return [ad async for ad in pipeline.run(source)]
+    return asyncio.run(collect())
+
+
+class TestPipeline:
+    def test_filters(self):
+        res = run(Pipeline([email_stage(), keyword_stage(["python"])]), ads(20))
+        assert [ad.id for ad in res] == [str(i) for i in range(0, 20, 4)]
+        assert res[0].emails == ["jobs0@example.com"]
+        assert res[0].matched_keywords == ["python"]
+
+    def test_email_in_description_is_opt_in(self):
+        hit = make_ad(1)
+        hit['description'] = {'text': "Mejla cv till jobb@example.com", 'text_formatted': ""}
+        hit['application_contacts'] = []
+        batch = [Ad(**hit), Ad(**make_ad(2))]
+        assert run(Pipeline([email_stage()]), batch) == []
+        assert [ad.emails for ad in run(Pipeline([email_stage(description=True)]), batch)] == [["jobb@example.com"]]
+
+    def test_expensive_stage_sees_survivors(self):
+        seen = []
+        async def expensive(batch):
+            seen.extend(batch)
+            return batch
+        stages = [Stage("expensive", expensive, cost=50.0, selectivity=0.9), email_stage()]
+        run(Pipeline(stages, batch_size=8), ads(40))
+        assert len(seen) == 10
+        assert all(ad.emails for ad in seen)
+
+    def test_short_circuit(self):
+        calls = []
+        def never(batch):
+            calls.append(len(batch))
+            return []
+        stages = [predicate_stage("none", lambda ad: False, cost=0.1), Stage("never", never, cost=10.0)]
+        assert run(Pipeline(stages, batch_size=5), ads(20)) == []
+        assert calls == []
+
+    def test_reorders_by_observed_selectivity(self):
+        # estimated selective but actually keeps everything
+        stage = predicate_stage("all", lambda ad: True, cost=1.0, selectivity=0.1)
+        emails = email_stage()
+        pipeline = Pipeline([stage, emails], batch_size=50)
+        assert pipeline.ordered()[0] is stage
+        run(pipeline, ads(200))
+        assert pipeline.ordered()[0] is emails
+        assert stage.seen < 200
+
+    def test_async_source_and_sinks(self):
+        written = []
+        stage = email_stage()
+        stage.sinks.append(written.extend)
+        async def source():
+            for ad in ads(10):
+                yield ad
+        res = run(Pipeline([stage], batch_size=3), source())
+        assert [ad.id for ad in written] == [ad.id for ad in res] == ["0", "4", "8"]
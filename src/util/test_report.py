@@ -0,0 +1,57 @@
+import json
+import os
+from .report import HtmlReport
+from ..schemas.schemas import Ad
+from ..client.fake import make_ad
+
+
+def ads(n: int):
+    for i in range(n):
+        hit = make_ad(i)
+        hit['headline'] = f"<script>alert({i})</script> & co"
+        hit['description'] = {'text': f"ad {i} " + "x" * (50 if i % 2 else 5), 'text_formatted': None}
+        yield Ad(**hit)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class TestHtmlReport:
+    def test_pages(self, tmp_path):
+        with HtmlReport(str(tmp_path), page_size=2, excerpt=20) as report:
+            assert report.write_all(ads(5)) == 5
+        assert report.pages == 3
+        assert sorted(os.listdir(tmp_path)) == [
+            "index.html", "index.js",
+            "page-0001.html", "page-0001.texts.js", "page-0002.html", "page-0002.texts.js",
+            "page-0003.html", "page-0003.texts.js"]
+        first, last = read(tmp_path / "page-0001.html"), read(tmp_path / "page-0003.html")
+        assert 'href="page-0002.html">Next' in first
+        assert "Next" not in last and 'href="page-0002.html">Previous' in last
+
+    def test_escaped(self, tmp_path):
+        with HtmlReport(str(tmp_path)) as report:
+            report.write_all(ads(1))
+        page = read(tmp_path / "page-0001.html")
+        assert "<script>alert" not in page
+        assert "&lt;script&gt;alert(0)&lt;/script&gt; &amp; co" in page
+
+    def test_lazy_descriptions(self, tmp_path):
+        with HtmlReport(str(tmp_path), excerpt=20) as report:
+            report.write_all(ads(2))
+        page = read(tmp_path / "page-0001.html")
+        texts = read(tmp_path / "page-0001.texts.js")
+        full = "ad 1 " + "x" * 50
+        assert full not in page and "Show more" in page
+        assert json.loads(texts[texts.index("{"):texts.rindex("}") + 1]) == {"1": full}
+
+    def test_index(self, tmp_path):
+        with HtmlReport(str(tmp_path), page_size=2) as report:
+            report.write_all(ads(3))
+        index = read(tmp_path / "index.js")
+        rows = json.loads(index[index.index("["):index.rindex(",")] + "]")
+        assert [(row[0], row[1]) for row in rows] == [
+            ("0", "page-0001.html"), ("1", "page-0001.html"), ("2", "page-0002.html")]
+        assert '<script src="index.js"></script>' in read(tmp_path / "index.html")
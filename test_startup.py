@@ -0,0 +1,52 @@
+""" Import time budget of jobget-cli.py, run with `python -m pytest test_startup.py`
+"""
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# seconds of imports on top of the interpreter's own, generous for slow machines
+HELP_BUDGET = 0.1
+QUERY_BUDGET = 0.5
+HEAVY = ["pydantic", "httpx", "tqdm", "langdetect", "asyncio", "sqlite3", "email.mime", "multiprocessing"]
+
+
+def imports(*args: str) -> Dict[str, float]:
+    """Seconds every top level import took in a fresh interpreter, by module
+    """
+    res = subprocess.run([sys.executable, "-X", "importtime", *args],
+                         cwd=ROOT, capture_output=True, text=True)
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.rstrip()] = int(cumulative) / 1e6
+    return times
+
+
+def own(times: Dict[str, float]) -> float:
+    baseline = imports("-c", "pass")
+    return sum(t for name, t in times.items() if not name.startswith(" ") and name not in baseline)
+
+
+def loaded(times: Dict[str, float], modules: List[str]) -> List[str]:
+    names = {name.strip() for name in times}
+    return [m for m in modules if m in names]
+
+
+def test_help_imports_nothing_heavy():
+    times = imports("jobget-cli.py", "-h")
+    assert loaded(times, HEAVY) == []
+    assert own(times) < HELP_BUDGET
+
+
+def test_query_imports_only_what_it_uses():
+    code = ("import importlib.util as u; s = u.spec_from_file_location('cli', 'jobget-cli.py'); "
+            "m = u.module_from_spec(s); s.loader.exec_module(m); "
+            "from src.client import JobGetClient, ResponseCache, SyncStore; "
+            "from src.client.metrics import Metrics; from src.store import AdStore, DerivedCache; import tqdm")
+    times = imports("-c", code)
+    assert loaded(times, ["langdetect", "email.mime", "src.util.pipeline", "src.mail", "multiprocessing"]) == []
+    assert own(times) < QUERY_BUDGET